@@ -0,0 +1,172 @@
+# artefactos.py
+# -*- coding: utf-8 -*-
+"""
+Lectura/escritura de los splits (train/val/test) que el preproceso le pasa al entrenamiento.
+
+Formatos:
+  - "csv": un demanda_preprocesada_<segmento>_<parte>.csv por split (formato original).
+  - "npy": matrices NumPy por tipo de dato + un esquema JSON, sin dependencias extra:
+        demanda_preprocesada_<segmento>_<parte>.float32.npy   features numéricas (n, k)
+        demanda_preprocesada_<segmento>_<parte>.int8.npy      one-hot / flags (n, k)
+        demanda_preprocesada_<segmento>_<parte>.fecha.npy     datetime64[ns] (n,)
+        demanda_preprocesada_<segmento>_<parte>.texto.npy     columnas de texto (n, k)
+        demanda_preprocesada_<segmento>_<parte>.schema.json   qué columna va en cada bloque
+    Al cargar, los bloques numéricos se abren con memmap (no se copian ni se parsean).
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+FORMATO_CSV = "csv"
+FORMATO_NPY = "npy"
+FORMATOS = (FORMATO_NPY, FORMATO_CSV)
+
+PARTES = ("train", "val", "test")
+VERSION_ESQUEMA = 1
+
+BLOQUES_NPY = ("float32", "int8", "fecha", "texto")
+
+
+def formato_por_defecto() -> str:
+    return getattr(settings, "FORECAST_FORMATO_ARTEFACTOS", FORMATO_NPY)
+
+
+def _base(ruta_segmento: str, segmento: str, parte: str) -> str:
+    return os.path.join(ruta_segmento, f"demanda_preprocesada_{segmento}_{parte}")
+
+
+def rutas_split(ruta_segmento: str, segmento: str, parte: str, formato: str) -> List[str]:
+    """
+    Archivos que componen un split en el formato indicado.
+    """
+    base = _base(ruta_segmento, segmento, parte)
+    if formato == FORMATO_CSV:
+        return [f"{base}.csv"]
+    if formato == FORMATO_NPY:
+        return [f"{base}.{bloque}.npy" for bloque in BLOQUES_NPY] + [f"{base}.schema.json"]
+    raise ValueError(f"Formato de artefacto desconocido: '{formato}'. Opciones: {FORMATOS}")
+
+
+def existe_split(ruta_segmento: str, segmento: str, parte: str, formato: str) -> bool:
+    return all(os.path.isfile(r) for r in rutas_split(ruta_segmento, segmento, parte, formato))
+
+
+def detectar_formato(ruta_segmento: str, segmento: str, preferido: Optional[str] = None) -> Optional[str]:
+    """
+    Formato en el que están guardados los tres splits del segmento (prioriza `preferido`).
+    """
+    preferido = preferido or formato_por_defecto()
+    for formato in [preferido] + [f for f in FORMATOS if f != preferido]:
+        if all(existe_split(ruta_segmento, segmento, parte, formato) for parte in PARTES):
+            return formato
+    return None
+
+
+def _es_flag_int8(serie: pd.Series) -> bool:
+    if not (pd.api.types.is_integer_dtype(serie) or pd.api.types.is_bool_dtype(serie)):
+        return False
+    return serie.empty or (serie.min() >= np.iinfo(np.int8).min and serie.max() <= np.iinfo(np.int8).max)
+
+
+def _guardar_npy(df: pd.DataFrame, base: str):
+    columnas: Dict[str, List[str]] = {"float32": [], "int8": [], "fecha": [], "texto": []}
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            columnas["fecha"].append(col)
+        elif _es_flag_int8(serie):
+            columnas["int8"].append(col)
+        elif pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_bool_dtype(serie):
+            columnas["float32"].append(col)
+        else:
+            columnas["texto"].append(col)
+
+    n = len(df)
+    bloques = {
+        "float32": np.ascontiguousarray(df[columnas["float32"]].to_numpy(dtype=np.float32, na_value=np.nan))
+        if columnas["float32"] else np.empty((n, 0), dtype=np.float32),
+        "int8": np.ascontiguousarray(df[columnas["int8"]].to_numpy(dtype=np.int8))
+        if columnas["int8"] else np.empty((n, 0), dtype=np.int8),
+        "fecha": df[columnas["fecha"]].to_numpy(dtype="datetime64[ns]")
+        if columnas["fecha"] else np.empty((n, 0), dtype="datetime64[ns]"),
+        "texto": df[columnas["texto"]].astype(str).to_numpy(dtype=str)
+        if columnas["texto"] else np.empty((n, 0), dtype=str),
+    }
+    for bloque, matriz in bloques.items():
+        np.save(f"{base}.{bloque}.npy", matriz, allow_pickle=False)
+
+    esquema = {
+        "version": VERSION_ESQUEMA,
+        "filas": n,
+        "columnas": list(df.columns),
+        "bloques": columnas,
+    }
+    with open(f"{base}.schema.json", "w", encoding="utf-8") as f:
+        json.dump(esquema, f, indent=2)
+
+
+def _cargar_npy(base: str, mmap: bool = True) -> pd.DataFrame:
+    with open(f"{base}.schema.json", "r", encoding="utf-8") as f:
+        esquema = json.load(f)
+    if esquema.get("version") != VERSION_ESQUEMA:
+        raise ValueError(f"Versión de esquema no soportada en '{base}.schema.json'.")
+
+    modo = "r" if mmap else None
+    partes: List[pd.DataFrame] = []
+    for bloque in BLOQUES_NPY:
+        nombres = esquema["bloques"][bloque]
+        if not nombres:
+            continue
+        # Los bloques numéricos se mapean desde disco; fechas y texto son chicos y se leen completos
+        matriz = np.load(f"{base}.{bloque}.npy", mmap_mode=modo if bloque in ("float32", "int8") else None,
+                         allow_pickle=False)
+        partes.append(pd.DataFrame(matriz, columns=nombres, copy=False))
+
+    if not partes:
+        return pd.DataFrame(columns=esquema["columnas"])
+    # Sin reordenar columnas para no copiar los bloques (el entrenamiento selecciona por nombre)
+    return pd.concat(partes, axis=1, copy=False)
+
+
+def guardar_split(df: pd.DataFrame, ruta_segmento: str, segmento: str, parte: str,
+                  formato: Optional[str] = None) -> str:
+    """
+    Guarda un split del segmento y devuelve la ruta principal escrita.
+    """
+    formato = formato or formato_por_defecto()
+    base = _base(ruta_segmento, segmento, parte)
+    if formato == FORMATO_CSV:
+        df.to_csv(f"{base}.csv", index=False)
+        return f"{base}.csv"
+    if formato == FORMATO_NPY:
+        _guardar_npy(df, base)
+        return f"{base}.float32.npy"
+    raise ValueError(f"Formato de artefacto desconocido: '{formato}'. Opciones: {FORMATOS}")
+
+
+def cargar_split(ruta_segmento: str, segmento: str, parte: str, formato: str, mmap: bool = True) -> pd.DataFrame:
+    base = _base(ruta_segmento, segmento, parte)
+    if formato == FORMATO_CSV:
+        df = pd.read_csv(f"{base}.csv")
+        df["fecha"] = pd.to_datetime(df["fecha"])
+        return df
+    if formato == FORMATO_NPY:
+        return _cargar_npy(base, mmap=mmap)
+    raise ValueError(f"Formato de artefacto desconocido: '{formato}'. Opciones: {FORMATOS}")
+
+
+def borrar_split(ruta_segmento: str, segmento: str, parte: str, formato: str):
+    for ruta in rutas_split(ruta_segmento, segmento, parte, formato):
+        try:
+            os.remove(ruta)
+            print(f"Archivo '{ruta}' eliminado correctamente.")
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            print(f"No se pudo eliminar '{ruta}': {e}")
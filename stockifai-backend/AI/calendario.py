@@ -0,0 +1,94 @@
+# calendario.py
+# -*- coding: utf-8 -*-
+"""
+Variables de calendario por semana (lunes de inicio), compartidas por el preproceso y la inferencia.
+
+La tabla se calcula una sola vez por rango de años y queda cacheada en el proceso:
+one-hot de mes / semana ISO / trimestre (int8), si la semana tiene feriado y los días
+hasta el próximo feriado argentino.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+import holidays
+import numpy as np
+import pandas as pd
+
+COLUMNAS_MES = [f"mes_{i}" for i in range(1, 13)]
+COLUMNAS_SEMANA = [f"semana_{i}" for i in range(1, 54)]
+COLUMNAS_TRIMESTRE = [f"trimestre_{i}" for i in range(1, 5)]
+COLUMNAS_CALENDARIO = COLUMNAS_MES + COLUMNAS_SEMANA + COLUMNAS_TRIMESTRE + ["es_semana_feriado", "dias_hasta_feriado"]
+
+# Valor de dias_hasta_feriado cuando no queda ningún feriado conocido
+DIAS_SIN_FERIADO = 365
+
+
+@lru_cache(maxsize=8)
+def tabla_calendario(anio_desde: int, anio_hasta: int) -> pd.DataFrame:
+    """
+    Tabla indexada por el lunes de cada semana entre anio_desde y anio_hasta.
+    Los feriados se toman hasta anio_hasta + 1 para que las últimas semanas tengan próximo feriado.
+    No modificar el DataFrame devuelto: es compartido.
+    """
+    semanas = pd.date_range(
+        start=pd.Timestamp(anio_desde, 1, 1).to_period("W").start_time,
+        end=pd.Timestamp(anio_hasta, 12, 31),
+        freq="W-MON",
+    )
+    n = len(semanas)
+
+    def _one_hot(valores: np.ndarray, cantidad: int) -> np.ndarray:
+        matriz = np.zeros((n, cantidad), dtype=np.int8)
+        matriz[np.arange(n), valores - 1] = 1
+        return matriz
+
+    one_hots = np.hstack([
+        _one_hot(semanas.month.to_numpy(), 12),
+        _one_hot(semanas.isocalendar().week.to_numpy(dtype=np.int64), 53),
+        _one_hot(semanas.quarter.to_numpy(), 4),
+    ])
+    tabla = pd.DataFrame(
+        one_hots,
+        index=semanas.rename("fecha"),
+        columns=COLUMNAS_MES + COLUMNAS_SEMANA + COLUMNAS_TRIMESTRE,
+    )
+
+    feriados = pd.DatetimeIndex(sorted(holidays.AR(years=range(anio_desde, anio_hasta + 2)).keys()))
+    semanas_con_feriado = feriados.to_period("W").start_time
+    tabla["es_semana_feriado"] = semanas.isin(semanas_con_feriado).astype(np.int8)
+
+    # Próximo feriado estrictamente posterior al lunes de la semana
+    siguiente = np.searchsorted(feriados.values, semanas.values, side="right")
+    hay_siguiente = siguiente < len(feriados)
+    dias = np.full(n, DIAS_SIN_FERIADO, dtype=np.int16)
+    dias[hay_siguiente] = (feriados.values[siguiente[hay_siguiente]] - semanas.values[hay_siguiente]) // np.timedelta64(1, "D")
+    tabla["dias_hasta_feriado"] = dias
+
+    return tabla
+
+
+def calendario_para_fechas(fechas) -> pd.DataFrame:
+    """
+    Filas de la tabla de calendario para cada fecha (deben ser lunes de inicio de semana),
+    en el mismo orden y con un índice posicional.
+    """
+    fechas = pd.DatetimeIndex(pd.to_datetime(fechas))
+    if fechas.empty:
+        return pd.DataFrame(columns=COLUMNAS_CALENDARIO)
+
+    tabla = tabla_calendario(int(fechas.year.min()), int(fechas.year.max()))
+    posiciones = tabla.index.get_indexer(fechas)
+    if (posiciones < 0).any():
+        invalidas = fechas[posiciones < 0].unique()[:5]
+        raise ValueError(f"Fechas que no son inicio de semana (lunes): {list(invalidas.date)}")
+
+    return tabla.iloc[posiciones].reset_index(drop=True)
+
+
+def features_calendario(fecha: pd.Timestamp) -> dict:
+    """
+    Variables de calendario de una semana como diccionario columna -> valor.
+    """
+    fila = calendario_para_fechas([fecha]).iloc[0]
+    return {col: int(valor) for col, valor in fila.items()}
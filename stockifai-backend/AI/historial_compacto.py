@@ -0,0 +1,122 @@
+# historial_compacto.py
+# -*- coding: utf-8 -*-
+"""
+Historia que usa la inferencia, empaquetada por taller y segmento (modelo HistorialCompacto).
+
+En lugar de una fila de ~150 columnas por SKU se guarda:
+  - skus: el orden de las filas
+  - ventas: float32 (n_skus, SEMANAS_HISTORIAL), la última columna es la semana `fecha_fin`
+  - externos: float32 (n_skus, n_externas), último valor conocido de cada variable externa
+
+Al cargar, las matrices se leen con np.frombuffer sobre el blob (sin copiar ni parsear).
+"""
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from d_externo.repositories.dataexterna import guardar_historial_compacto, obtener_historiales_compactos
+
+SEMANAS_HISTORIAL = 52
+
+
+def construir_historial(df_ventas: pd.DataFrame, ultimo: pd.DataFrame, segmento: str,
+                        columnas_externas: List[str], semanas: int = SEMANAS_HISTORIAL) -> dict:
+    """
+    Arma el historial de un segmento.
+    `df_ventas` tiene numero_pieza, fecha y la cantidad semanal (columna 'cantidad', sin importar mayúsculas);
+    `ultimo` es el último registro por SKU (ver ultimo_registro_por_sku) y define los SKUs y los externos.
+    """
+    df_ventas = df_ventas.rename(columns=str.lower)
+    skus = pd.Index(ultimo['numero_pieza'].astype(str).unique())
+
+    fechas = pd.to_datetime(df_ventas['fecha'])
+    fecha_fin = fechas.max()
+    inicio = fecha_fin - pd.Timedelta(weeks=semanas - 1)
+
+    filas = skus.get_indexer(df_ventas['numero_pieza'].astype(str))
+    en_ventana = ((fechas >= inicio) & (filas >= 0)).to_numpy()
+    columnas = ((fechas[en_ventana] - inicio) // pd.Timedelta(weeks=1)).to_numpy()
+
+    ventas = np.full((len(skus), semanas), np.nan, dtype=np.float32)
+    ventas[filas[en_ventana], columnas] = pd.to_numeric(
+        df_ventas.loc[en_ventana, 'cantidad'], errors='coerce'
+    ).to_numpy(dtype=np.float32)
+
+    ultimo = ultimo.drop_duplicates(subset=['numero_pieza'], keep='last')
+    ultimo = ultimo.set_axis(ultimo['numero_pieza'].astype(str).to_numpy(), axis=0).reindex(skus)
+    externos = np.empty((len(skus), len(columnas_externas)), dtype=np.float32)
+    for j, col in enumerate(columnas_externas):
+        externos[:, j] = pd.to_numeric(ultimo[col], errors='coerce').to_numpy(dtype=np.float32)
+
+    return {
+        "segmento": segmento,
+        "skus": skus.to_numpy(dtype=object),
+        "fecha_fin": pd.Timestamp(fecha_fin),
+        "ventas": ventas,
+        "columnas_externas": list(columnas_externas),
+        "externos": externos,
+    }
+
+
+def guardar_historial(taller_id: int, segmento: str, historial: dict):
+    guardar_historial_compacto(taller_id, segmento, {
+        "fecha_fin": historial["fecha_fin"].date(),
+        "semanas": historial["ventas"].shape[1],
+        "skus": [str(sku) for sku in historial["skus"]],
+        "ventas": np.ascontiguousarray(historial["ventas"], dtype=np.float32).tobytes(),
+        "columnas_externas": historial["columnas_externas"],
+        "externos": np.ascontiguousarray(historial["externos"], dtype=np.float32).tobytes(),
+    })
+    print(f"Historial compacto de '{segmento}' guardado ({len(historial['skus'])} SKUs x "
+          f"{historial['ventas'].shape[1]} semanas).")
+
+
+def _matriz(blob, filas: int, columnas: int) -> np.ndarray:
+    # Vista de solo lectura sobre el blob (bytes o memoryview según el motor de DB)
+    if filas == 0 or columnas == 0:
+        return np.empty((filas, columnas), dtype=np.float32)
+    return np.frombuffer(blob, dtype=np.float32).reshape(filas, columnas)
+
+
+def cargar_historiales(taller_id: int) -> Dict[str, dict]:
+    """
+    Historiales compactos del taller como {segmento: historial} (mismo formato que construir_historial).
+    """
+    historiales = {}
+    for registro in obtener_historiales_compactos(taller_id):
+        n = len(registro.skus)
+        historiales[registro.segmento_demanda] = {
+            "segmento": registro.segmento_demanda,
+            "skus": np.asarray(registro.skus, dtype=object),
+            "fecha_fin": pd.Timestamp(registro.fecha_fin),
+            "ventas": _matriz(registro.ventas, n, registro.semanas),
+            "columnas_externas": list(registro.columnas_externas),
+            "externos": _matriz(registro.externos, n, len(registro.columnas_externas)),
+        }
+    return historiales
+
+
+def historia_desde_historiales(historiales: Dict[str, dict]) -> pd.DataFrame:
+    """
+    Historia en formato largo (una fila por SKU y semana de la ventana) para la inferencia SKU por SKU.
+    Los externos se repiten en todas las filas del SKU.
+    """
+    partes = []
+    for segmento, historial in historiales.items():
+        n, semanas = historial["ventas"].shape
+        fechas = pd.date_range(end=historial["fecha_fin"], periods=semanas, freq="7D")
+        parte = pd.DataFrame({
+            "numero_pieza": np.repeat(historial["skus"], semanas),
+            "fecha": np.tile(fechas.to_numpy(), n),
+            "cantidad": historial["ventas"].reshape(-1).astype(float),
+            "segmento_demanda": segmento,
+        })
+        for j, col in enumerate(historial["columnas_externas"]):
+            parte[col] = np.repeat(historial["externos"][:, j].astype(float), semanas)
+        partes.append(parte)
+    if not partes:
+        return pd.DataFrame()
+    return pd.concat(partes, ignore_index=True)
@@ -3,22 +3,32 @@
 
 from __future__ import annotations
 
+import hashlib
+import json
 import os
+import threading
 import warnings
-from typing import Dict, List
+from itertools import islice
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, List, Optional
 
 import django
 import numpy as np
 import pandas as pd
-import holidays
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 
+from AI.artefactos import guardar_split
+from AI.calendario import calendario_para_fechas
 from d_externo.repositories.dataexterna import obtener_todas_las_inflaciones, obtener_todos_los_patentamientos, \
-    obtener_todos_los_ipsa, obtener_todas_las_prendas, obtener_todas_las_tasas_interes, obtener_todos_los_tipos_cambio
+    obtener_todos_los_ipsa, obtener_todas_las_prendas, obtener_todas_las_tasas_interes, obtener_todos_los_tipos_cambio, \
+    huellas_datos_externos
 
 warnings.simplefilter(action="ignore", category=FutureWarning)
 
 from inventario.repositories.movimiento_repo import MovimientoRepo
+from inventario.repositories.demanda_semanal_repo import DemandaSemanalRepo
 from catalogo.models import Repuesto
 from inventario.repositories.repuesto_taller_repo import RepuestoTallerRepo
 from user.api.models.models import Taller
@@ -26,12 +36,18 @@ from catalogo.models import RepuestoTaller
 
 CHUNK_SIZE = 1000
 
-def _obtener_movimientos_df(taller_id: int) -> pd.DataFrame:
+def _obtener_movimientos_df(taller_id: int, desde_dt=None) -> pd.DataFrame:
     repo = MovimientoRepo()
-    qs = repo.get_egresos_ultimos_5_anios(taller_id=taller_id)
+    if desde_dt is None:
+        qs = repo.get_egresos_ultimos_5_anios(taller_id=taller_id)
+    else:
+        qs = repo.get_egresos_entre(taller_id=taller_id, desde_dt=desde_dt, hasta_dt=repo.fin_ventana_egresos())
     df = pd.DataFrame(list(qs))
 
     if df.empty:
+        if desde_dt is not None:
+            # En modo incremental puede no haber movimientos nuevos
+            return pd.DataFrame(columns=["numero_pieza", "Descripcion", "Fecha", "Cantidad"])
         raise ValueError(f"No se encontraron movimientos de EGRESO para el taller_id={taller_id}.")
 
     df = df.rename(
@@ -54,8 +70,103 @@ def _obtener_movimientos_df(taller_id: int) -> pd.DataFrame:
     return df
 
 
-def cargar_y_limpiar_datos_desde_repo(taller_id: int) -> pd.DataFrame:
-    df = _obtener_movimientos_df(taller_id)
+# Filas de EGRESO que se leen (y agregan) por vez en la extracción por streaming
+FILAS_POR_LOTE_EGRESOS = 20000
+# Cada cuántos lotes se combinan los parciales semanales (acota la memoria a SKUs x semanas)
+LOTES_POR_COMBINACION = 8
+
+
+def _inicio_semana(fechas: pd.Series) -> pd.Series:
+    # Lunes de la semana, igual que .dt.to_period("W").start_time pero vectorizado
+    dias = fechas.dt.normalize()
+    return dias - pd.to_timedelta(dias.dt.weekday, unit="D")
+
+
+def _sumar_parciales(parciales: List[pd.DataFrame]) -> pd.DataFrame:
+    if len(parciales) == 1:
+        return parciales[0]
+    return pd.concat(parciales, ignore_index=True).groupby(["numero_pieza", "fecha"], as_index=False)["Cantidad"].sum()
+
+
+def _demanda_semanal_streaming(taller_id: int, desde_dt=None,
+                               filas_por_lote: int = FILAS_POR_LOTE_EGRESOS) -> pd.DataFrame:
+    """
+    Demanda semanal por SKU leyendo los EGRESOS de a lotes (paginados por id) y agregando cada lote
+    a medida que llega: en memoria solo hay un lote de movimientos y los totales SKU-semana.
+    Mismo resultado que _obtener_movimientos_df + la agregación de cargar_y_limpiar_datos_desde_repo.
+    """
+    repo = MovimientoRepo()
+    desde = desde_dt if desde_dt is not None else repo.inicio_ventana_egresos()
+    filas = repo.iterar_egresos(taller_id, desde, repo.fin_ventana_egresos(), chunk_size=filas_por_lote)
+
+    parciales: List[pd.DataFrame] = []
+    leidas = 0
+    while True:
+        lote = list(islice(filas, filas_por_lote))
+        if not lote:
+            break
+        leidas += len(lote)
+
+        df = pd.DataFrame(lote, columns=["numero_pieza", "Fecha", "Cantidad"])
+        df["Fecha"] = pd.to_datetime(df["Fecha"], utc=True).dt.tz_localize(None)
+        df = df.dropna(subset=["Fecha"])
+        df["Cantidad"] = pd.to_numeric(df["Cantidad"], errors="coerce").fillna(0).astype(int)
+        # Seguridad: nos quedamos con cantidades >= 0 para EGRESO
+        df = df[df["Cantidad"] >= 0]
+        df = pd.DataFrame({
+            "numero_pieza": df["numero_pieza"].astype(str),
+            "fecha": _inicio_semana(df["Fecha"]),
+            "Cantidad": df["Cantidad"],
+        })
+        parciales.append(df.groupby(["numero_pieza", "fecha"], as_index=False)["Cantidad"].sum())
+
+        if len(parciales) >= LOTES_POR_COMBINACION:
+            parciales = [_sumar_parciales(parciales)]
+
+    if leidas == 0:
+        if desde_dt is not None:
+            # En modo incremental puede no haber movimientos nuevos
+            return pd.DataFrame(columns=["numero_pieza", "fecha", "Cantidad"])
+        raise ValueError(f"No se encontraron movimientos de EGRESO para el taller_id={taller_id}.")
+
+    demanda_semanal = _sumar_parciales(parciales)
+    print(f"Extracción por streaming: {leidas} egresos -> {len(demanda_semanal)} filas SKU-semana.")
+    return demanda_semanal.sort_values(["numero_pieza", "fecha"], ignore_index=True)
+
+
+def _demanda_semanal_agregada(taller_id: int, desde_dt=None) -> pd.DataFrame:
+    """
+    Demanda semanal por SKU leída de la tabla agregada (DemandaSemanal); solo las semanas
+    parciales de los bordes de la ventana se suman desde los movimientos.
+    Mismo resultado que _demanda_semanal_streaming.
+    """
+    repo = MovimientoRepo()
+    desde = desde_dt if desde_dt is not None else repo.inicio_ventana_egresos()
+    filas = DemandaSemanalRepo().demanda_semanal_taller(taller_id, desde, repo.fin_ventana_egresos())
+
+    if not filas:
+        if desde_dt is not None:
+            # En modo incremental puede no haber movimientos nuevos
+            return pd.DataFrame(columns=["numero_pieza", "fecha", "Cantidad"])
+        raise ValueError(f"No se encontraron movimientos de EGRESO para el taller_id={taller_id}.")
+
+    demanda_semanal = pd.DataFrame(filas, columns=["numero_pieza", "fecha", "Cantidad"])
+    demanda_semanal["numero_pieza"] = demanda_semanal["numero_pieza"].astype(str)
+    demanda_semanal["fecha"] = pd.to_datetime(demanda_semanal["fecha"])
+    demanda_semanal["Cantidad"] = demanda_semanal["Cantidad"].astype(int)
+    print(f"Demanda semanal agregada: {len(demanda_semanal)} filas SKU-semana.")
+    return demanda_semanal.sort_values(["numero_pieza", "fecha"], ignore_index=True)
+
+
+def cargar_y_limpiar_datos_desde_repo(taller_id: int, desde_dt=None) -> pd.DataFrame:
+    if getattr(settings, "FORECAST_DEMANDA_SEMANAL_AGREGADA", True):
+        return _demanda_semanal_agregada(taller_id, desde_dt)
+    if getattr(settings, "FORECAST_EXTRACCION_STREAMING", True):
+        return _demanda_semanal_streaming(taller_id, desde_dt)
+
+    df = _obtener_movimientos_df(taller_id, desde_dt)
+    if df.empty:
+        return pd.DataFrame(columns=["numero_pieza", "fecha", "Cantidad"])
 
     # Setteo de índice temporal
     df = df.sort_values("Fecha").reset_index(drop=True)
@@ -72,22 +183,12 @@ def cargar_y_limpiar_datos_desde_repo(taller_id: int) -> pd.DataFrame:
     return demanda_semanal
 
 
-def clasificar_demanda(demanda_semanal: pd.DataFrame) -> pd.DataFrame:
+def _clasificar_demanda_por_sku(demanda_semanal: pd.DataFrame, fecha_final: pd.Timestamp):
     """
-    Genera un dataset completo (todas las semanas entre primera y última por SKU),
+    Versión original (loop por SKU + apply por fila). Se mantiene como referencia
+    para validar que la versión vectorizada produce las mismas etiquetas.
     """
-    print("\n--- PASO 2: CLASIFICACIÓN DE DEMANDA DE SKUs ---")
-
-    if demanda_semanal.empty:
-        raise ValueError("demanda_semanal está vacío.")
-
-    # Aseguro tipos
-    demanda_semanal = demanda_semanal.copy()
-    demanda_semanal["fecha"] = pd.to_datetime(demanda_semanal["fecha"])
-    demanda_semanal["numero_pieza"] = demanda_semanal["numero_pieza"].astype(str)
-
     primeras_fechas = demanda_semanal.groupby("numero_pieza")["fecha"].min()
-    fecha_final = demanda_semanal["fecha"].max()
 
     full_list: List[pd.DataFrame] = []
     for sku in demanda_semanal["numero_pieza"].unique():
@@ -186,6 +287,118 @@ def clasificar_demanda(demanda_semanal: pd.DataFrame) -> pd.DataFrame:
     volumen_historico["frecuencia_rotacion"] = volumen_historico.apply(
         lambda row: frecuencia_rotacion_ajustada(row, fecha_final), axis=1
     )
+    return df_full, volumen_historico
+
+
+def _clasificar_demanda_vectorizado(demanda_semanal: pd.DataFrame, fecha_final: pd.Timestamp):
+    """
+    Misma clasificación que _clasificar_demanda_por_sku, pero armando la grilla SKU x semana
+    de una sola vez con NumPy y etiquetando con np.select (sin apply por fila).
+    """
+    semana = pd.Timedelta(weeks=1)
+    fecha_base = demanda_semanal["fecha"].min()
+
+    # Índices enteros: SKU (en orden de aparición, como el loop original) y semana
+    codigos, skus = pd.factorize(demanda_semanal["numero_pieza"])
+    idx_semana = ((demanda_semanal["fecha"] - fecha_base) // semana).to_numpy(dtype=np.int64)
+    idx_final = int((fecha_final - fecha_base) // semana)
+    n_skus = len(skus)
+
+    primera = np.full(n_skus, idx_final, dtype=np.int64)
+    np.minimum.at(primera, codigos, idx_semana)
+    largos = idx_final - primera + 1
+    offsets = np.concatenate(([0], np.cumsum(largos)[:-1]))
+    total = int(largos.sum())
+
+    # Grilla densa: cada SKU desde su primera semana hasta la semana final
+    codigo_fila = np.repeat(np.arange(n_skus), largos)
+    semana_fila = np.arange(total) - np.repeat(offsets, largos) + np.repeat(primera, largos)
+
+    cantidad = np.zeros(total, dtype=np.float64)
+    posiciones = offsets[codigos] + (idx_semana - primera[codigos])
+    np.add.at(cantidad, posiciones, demanda_semanal["Cantidad"].to_numpy(dtype=np.float64))
+
+    df_full = pd.DataFrame({
+        "numero_pieza": skus.take(codigo_fila),
+        "fecha": fecha_base + pd.to_timedelta(semana_fila * 7, unit="D"),
+        "Cantidad": cantidad,
+    })
+
+    # Estadísticas por SKU
+    con_venta = cantidad > 0
+    ultima_venta = np.full(n_skus, -1, dtype=np.int64)
+    np.maximum.at(ultima_venta, codigo_fila[con_venta], semana_fila[con_venta])
+
+    volumen_total = np.bincount(codigo_fila, weights=cantidad, minlength=n_skus)
+    semanas_con_venta = np.bincount(codigo_fila[con_venta], minlength=n_skus)
+    intermitencia = 1 - semanas_con_venta / largos
+
+    fecha_inicio = fecha_base + pd.to_timedelta(primera * 7, unit="D")
+    fecha_ultima_venta = pd.Series(fecha_base + pd.to_timedelta(ultima_venta * 7, unit="D"))
+    fecha_ultima_venta[ultima_venta < 0] = pd.NaT
+
+    segmento = np.select(
+        [
+            (volumen_total == 0) & (largos < 26),
+            volumen_total == 0,
+            intermitencia >= 0.75,
+        ],
+        ["nuevo", "sin_venta", "intermitente"],
+        default="frecuencia_alta",
+    )
+
+    # Días sin movimiento: desde la última venta, o desde el alta si nunca vendió
+    semana_referencia = np.where(ultima_venta >= 0, ultima_venta, primera)
+    dias_sin_movimiento = (idx_final - semana_referencia) * 7
+    es_intermitente = segmento == "intermitente"
+    frecuencia_rotacion = np.select(
+        [
+            dias_sin_movimiento > 730,
+            dias_sin_movimiento > 365,
+            dias_sin_movimiento > 180,
+            (dias_sin_movimiento > 60) & es_intermitente,
+            dias_sin_movimiento > 60,
+            es_intermitente,
+        ],
+        ["MUERTO", "OBSOLETO", "LENTO", "LENTO", "INTERMEDIO", "INTERMEDIO"],
+        default="ALTA_ROTACION",
+    )
+
+    volumen_historico = pd.DataFrame({
+        "numero_pieza": skus,
+        "fecha_inicio_registro": fecha_inicio,
+        "volumen_total": volumen_total,
+        "semanas_con_venta": semanas_con_venta,
+        "total_semanas_registradas": largos,
+        "fecha_ultima_venta": fecha_ultima_venta,
+        "intermitencia": intermitencia,
+        "segmento_demanda": segmento,
+        "frecuencia_rotacion": frecuencia_rotacion,
+    }).sort_values("numero_pieza").reset_index(drop=True)
+
+    return df_full, volumen_historico
+
+
+def clasificar_demanda(demanda_semanal: pd.DataFrame, vectorizado: bool = True) -> pd.DataFrame:
+    """
+    Genera un dataset completo (todas las semanas entre primera y última por SKU),
+    """
+    print("\n--- PASO 2: CLASIFICACIÓN DE DEMANDA DE SKUs ---")
+
+    if demanda_semanal.empty:
+        raise ValueError("demanda_semanal está vacío.")
+
+    # Aseguro tipos
+    demanda_semanal = demanda_semanal.copy()
+    demanda_semanal["fecha"] = pd.to_datetime(demanda_semanal["fecha"])
+    demanda_semanal["numero_pieza"] = demanda_semanal["numero_pieza"].astype(str)
+
+    fecha_final = demanda_semanal["fecha"].max()
+
+    if vectorizado:
+        df_full, volumen_historico = _clasificar_demanda_vectorizado(demanda_semanal, fecha_final)
+    else:
+        df_full, volumen_historico = _clasificar_demanda_por_sku(demanda_semanal, fecha_final)
 
     df_full = df_full.merge(
         volumen_historico[["numero_pieza", "segmento_demanda"]],
@@ -310,35 +523,12 @@ def generar_caracteristicas(df_segment: pd.DataFrame) -> pd.DataFrame:
     segmento = df_s["segmento_demanda"].iloc[0]
     print(f"Procesando características para segmento: '{segmento}'")
 
-    # Fechas y feriados
-    ar_holidays = holidays.AR(
-        years=np.arange(df_s["fecha"].dt.year.min(), df_s["fecha"].dt.year.max() + 2)
-    )
-    fechas_feriados = sorted(list(ar_holidays.keys()))
-    feriados_semana = {pd.Timestamp(fecha).to_period("W").start_time for fecha in fechas_feriados}
-
-    def dias_hasta_feriado(fecha: pd.Timestamp) -> int:
-        proximos_feriados = [f for f in fechas_feriados if f > fecha.date()]
-        if not proximos_feriados:
-            return 365
-        return (proximos_feriados[0] - fecha.date()).days
+    # Calendario y feriados (tabla precalculada por semana, la misma que usa la inferencia)
+    df_s = df_s.reset_index(drop=True)
+    df_s = pd.concat([df_s, calendario_para_fechas(df_s["fecha"])], axis=1)
 
-    # Dummies de calendario
-    df_s["mes"] = df_s["fecha"].dt.month
-    df_s["semana_anio"] = df_s["fecha"].dt.isocalendar().week.astype(int)
-    df_s["trimestre"] = df_s["fecha"].dt.quarter
-
-    mes_dummies = pd.get_dummies(df_s["mes"], prefix="mes", dtype=int)
-    semana_dummies = pd.get_dummies(df_s["semana_anio"], prefix="semana", dtype=int)
-    trimestre_dummies = pd.get_dummies(df_s["trimestre"], prefix="trimestre", dtype=int)
-
-    df_s = pd.concat([df_s, mes_dummies, semana_dummies, trimestre_dummies], axis=1)
-    df_s = df_s.drop(columns=["mes", "semana_anio", "trimestre"])
-
-    # Feriados y ventas
-    df_s["es_semana_feriado"] = df_s["fecha"].isin(feriados_semana).astype(int)
+    # Ventas
     df_s["hubo_venta"] = (df_s["Cantidad"] > 0).astype(int)
-    df_s["dias_hasta_feriado"] = df_s["fecha"].apply(dias_hasta_feriado)
 
     # Configuración de lags y rolling stats por segmento
     if segmento == "frecuencia_alta":
@@ -358,10 +548,12 @@ def generar_caracteristicas(df_segment: pd.DataFrame) -> pd.DataFrame:
         df_s[f"ventas_t_{lag}"] = df_s.groupby("numero_pieza")["Cantidad"].shift(lag)
 
     # Rolling stats
+    ventas_previas = df_s.groupby("numero_pieza")["Cantidad"].shift(1)
     for window in windows:
-        rolling_series = df_s.groupby("numero_pieza")["Cantidad"].shift(1).rolling(window, min_periods=2)
-        df_s[f"media_ultimas_{window}"] = rolling_series.mean()
-        df_s[f"std_pasada_{window}_semanas"] = rolling_series.std()
+        # La ventana se calcula dentro de cada SKU (igual que en inferencia)
+        rolling_series = ventas_previas.groupby(df_s["numero_pieza"]).rolling(window, min_periods=2)
+        df_s[f"media_ultimas_{window}"] = rolling_series.mean().reset_index(level=0, drop=True)
+        df_s[f"std_pasada_{window}_semanas"] = rolling_series.std().reset_index(level=0, drop=True)
 
         mean_col = f"media_ultimas_{window}"
         std_col = f"std_pasada_{window}_semanas"
@@ -447,6 +639,61 @@ def integrar_datos_externos_base() -> pd.DataFrame:
     return df_final
 
 
+# Cache de datos externos: en el proceso y en disco (compartido por los workers de una corrida)
+DIRECTORIO_CACHE = "_cache"
+VERSION_CACHE_EXTERNOS = 1
+_cache_externos: Dict[str, pd.DataFrame] = {}
+_lock_externos = threading.Lock()
+
+
+def _clave_externos() -> str:
+    huellas = huellas_datos_externos()
+    contenido = json.dumps({"version": VERSION_CACHE_EXTERNOS, "huellas": huellas}, sort_keys=True)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()[:16]
+
+
+def datos_externos_cacheados(output_dir_base: str = "models") -> pd.DataFrame:
+    """
+    Igual que integrar_datos_externos_base, pero las series son globales: se calculan una vez
+    y se reutilizan mientras no cambie ninguna tabla externa (huella por cantidad, max(id) y max(fecha)).
+    Se busca primero en el proceso, después en <output_dir_base>/_cache/externos_<clave>.pkl.
+    """
+    clave = _clave_externos()
+    with _lock_externos:
+        df = _cache_externos.get(clave)
+        if df is not None:
+            print(f"Datos externos desde la cache del proceso ({clave}).")
+            return df.copy()
+
+        ruta_cache = os.path.join(output_dir_base, DIRECTORIO_CACHE)
+        ruta = os.path.join(ruta_cache, f"externos_{clave}.pkl")
+        if os.path.isfile(ruta):
+            try:
+                df = pd.read_pickle(ruta)
+                print(f"Datos externos desde la cache en disco '{ruta}'.")
+            except Exception as e:
+                print(f"No se pudo leer la cache de datos externos '{ruta}': {e}")
+                df = None
+
+        if df is None:
+            df = integrar_datos_externos_base()
+            os.makedirs(ruta_cache, exist_ok=True)
+            # Escritura atómica: otro worker puede estar leyendo la misma clave
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            df.to_pickle(temporal)
+            os.replace(temporal, ruta)
+            for archivo in os.listdir(ruta_cache):
+                if archivo.startswith("externos_") and archivo.endswith(".pkl") and archivo != os.path.basename(ruta):
+                    try:
+                        os.remove(os.path.join(ruta_cache, archivo))
+                    except OSError:
+                        pass
+
+        _cache_externos.clear()
+        _cache_externos[clave] = df
+        return df.copy()
+
+
 def dividir_datos(
         df: pd.DataFrame, n_semanas_val: int = 4, n_semanas_test: int = 4
 ) -> Dict[str, pd.DataFrame]:
@@ -486,15 +733,178 @@ def dividir_datos(
     return {"train": train_df, "val": val_df, "test": test_df}
 
 
+# ---------------------------------------------------------------------------
+# Preproceso incremental
+#
+# Se persiste por taller la demanda semanal (models/<taller>/demanda_semanal.pkl),
+# las características de cada segmento (models/<taller>/<segmento>/caracteristicas_<segmento>.pkl)
+# y un estado con la semana de corte y una huella de los egresos anteriores al corte.
+# En cada corrida solo se leen los movimientos desde la semana de corte (que puede haber
+# quedado incompleta) y se recalculan las características de las últimas semanas.
+# Si la huella no coincide (alguien editó historia vieja) se hace la reconstrucción completa.
+# ---------------------------------------------------------------------------
+
+ARCHIVO_ESTADO_PREPROCESO = "preproceso_estado.json"
+ARCHIVO_DEMANDA_SEMANAL = "demanda_semanal.pkl"
+VERSION_ESTADO_PREPROCESO = 1
+
+# Semanas de historia previa que necesitan los lags/rolling más largos (52)
+SEMANAS_CONTEXTO_CARACTERISTICAS = 52
+
+PREFIJOS_DUMMIES_CALENDARIO = ("mes_", "semana_", "trimestre_")
+
+
+def _ruta_caracteristicas(output_dir_base: str, taller_id: int, segmento: str) -> str:
+    return os.path.join(output_dir_base, str(taller_id), segmento, f"caracteristicas_{segmento}.pkl")
+
+
+def _semana_a_datetime_utc(semana: pd.Timestamp) -> datetime:
+    # Las semanas se arman sobre fechas UTC sin tz (ver _obtener_movimientos_df)
+    return timezone.make_aware(semana.to_pydatetime(), dt_timezone.utc)
+
+
+def _cargar_estado_preproceso(output_dir_base: str, taller_id: int) -> Optional[dict]:
+    ruta_taller = os.path.join(output_dir_base, str(taller_id))
+    ruta_estado = os.path.join(ruta_taller, ARCHIVO_ESTADO_PREPROCESO)
+    if not os.path.isfile(ruta_estado) or not os.path.isfile(os.path.join(ruta_taller, ARCHIVO_DEMANDA_SEMANAL)):
+        return None
+    with open(ruta_estado, "r", encoding="utf-8") as f:
+        estado = json.load(f)
+    if estado.get("version") != VERSION_ESTADO_PREPROCESO:
+        return None
+    return estado
+
+
+def _guardar_estado_preproceso(output_dir_base: str, taller_id: int, demanda_semanal: pd.DataFrame,
+                               df_externos: pd.DataFrame):
+    ruta_taller = os.path.join(output_dir_base, str(taller_id))
+    os.makedirs(ruta_taller, exist_ok=True)
+
+    semana_corte = pd.Timestamp(demanda_semanal["fecha"].max())
+    huella = MovimientoRepo().resumen_egresos_hasta(taller_id, _semana_a_datetime_utc(semana_corte))
+    fecha_max_externos = None
+    if not df_externos.empty:
+        fecha_max_externos = pd.Timestamp(df_externos["fecha"].max()).date().isoformat()
+
+    demanda_semanal.to_pickle(os.path.join(ruta_taller, ARCHIVO_DEMANDA_SEMANAL))
+    estado = {
+        "version": VERSION_ESTADO_PREPROCESO,
+        "semana_corte": semana_corte.date().isoformat(),
+        "huella_egresos": huella,
+        "fecha_max_externos": fecha_max_externos,
+    }
+    with open(os.path.join(ruta_taller, ARCHIVO_ESTADO_PREPROCESO), "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2)
+
+
+def _demanda_semanal_incremental(taller_id: int, output_dir_base: str, estado: dict) -> Optional[pd.DataFrame]:
+    """
+    Actualiza la demanda semanal persistida con los movimientos desde la semana de corte.
+    Devuelve None si la historia anterior al corte cambió y hay que reconstruir todo.
+    """
+    semana_corte = pd.Timestamp(estado["semana_corte"])
+    corte_dt = _semana_a_datetime_utc(semana_corte)
+
+    huella_actual = MovimientoRepo().resumen_egresos_hasta(taller_id, corte_dt)
+    if huella_actual != estado.get("huella_egresos"):
+        print(f"La historia de egresos anterior a {semana_corte.date()} cambió "
+              f"({estado.get('huella_egresos')} -> {huella_actual}). Se reconstruye completo.")
+        if getattr(settings, "FORECAST_DEMANDA_SEMANAL_AGREGADA", True):
+            # El cambio pudo venir de un camino que no actualiza el agregado (update/SQL directo)
+            filas = DemandaSemanalRepo().reconstruir(taller_id)
+            print(f"Demanda semanal agregada reconstruida: {filas} filas.")
+        return None
+
+    ruta_demanda = os.path.join(output_dir_base, str(taller_id), ARCHIVO_DEMANDA_SEMANAL)
+    demanda_guardada = pd.read_pickle(ruta_demanda)
+    demanda_nueva = cargar_y_limpiar_datos_desde_repo(taller_id, desde_dt=corte_dt)
+    print(f"Incremental: {len(demanda_nueva)} filas SKU-semana nuevas desde {semana_corte.date()}.")
+
+    # La semana de corte se reemplaza completa (pudo haber quedado a medio cargar)
+    demanda_semanal = pd.concat(
+        [demanda_guardada[demanda_guardada["fecha"] < semana_corte], demanda_nueva],
+        ignore_index=True,
+    )
+
+    # Se mantiene la misma ventana de años que la reconstrucción completa
+    inicio_ventana = pd.Timestamp(MovimientoRepo().inicio_ventana_egresos().date()).to_period("W").start_time
+    return demanda_semanal[demanda_semanal["fecha"] >= inicio_ventana].reset_index(drop=True)
+
+
+def _caracteristicas_incrementales(df_segmento: pd.DataFrame, df_externos: pd.DataFrame,
+                                   previas: Optional[pd.DataFrame], desde: pd.Timestamp) -> pd.DataFrame:
+    """
+    Calcula las características del segmento reutilizando las filas ya calculadas
+    anteriores a `desde`. Solo los SKUs nuevos en el segmento se calculan completos.
+    """
+
+    def _con_externos(df: pd.DataFrame) -> pd.DataFrame:
+        return pd.merge_asof(df.sort_values("fecha"), df_externos.sort_values("fecha"),
+                             on="fecha", direction="backward")
+
+    skus_previos = set(previas["numero_pieza"].unique()) if previas is not None else set()
+    es_previo = df_segmento["numero_pieza"].isin(skus_previos)
+    partes: List[pd.DataFrame] = []
+
+    # SKUs que ya estaban en el segmento: filas viejas + cola recalculada con contexto
+    if es_previo.any():
+        df_previos = df_segmento[es_previo]
+        primera_fecha = df_previos.groupby("numero_pieza")["fecha"].min()
+        viejas = previas[previas["numero_pieza"].isin(primera_fecha.index)]
+        viejas = viejas[
+            (viejas["fecha"] < desde)
+            & (viejas["fecha"] >= viejas["numero_pieza"].map(primera_fecha))
+        ]
+
+        inicio_contexto = desde - pd.Timedelta(weeks=SEMANAS_CONTEXTO_CARACTERISTICAS)
+        cola = df_previos[df_previos["fecha"] >= inicio_contexto]
+        if not cola.empty:
+            cola = generar_caracteristicas(_con_externos(cola))
+            cola = cola[cola["fecha"] >= desde]
+        partes.extend([viejas, cola])
+
+    # SKUs nuevos en el segmento (o que cambiaron de segmento): cálculo completo
+    if (~es_previo).any():
+        partes.append(generar_caracteristicas(_con_externos(df_segmento[~es_previo])))
+
+    df_modelo = pd.concat([p for p in partes if not p.empty], ignore_index=True)
+
+    # Las dummies de calendario que no aparecían en alguna de las partes quedan en 0
+    dummies = [c for c in df_modelo.columns if c.startswith(PREFIJOS_DUMMIES_CALENDARIO)]
+    df_modelo[dummies] = df_modelo[dummies].fillna(0).astype(int)
+    return df_modelo.sort_values(["fecha", "numero_pieza"]).reset_index(drop=True)
+
+
 def ejecutar_preproceso(
         taller_id: int,
         output_dir_base: str = "models",
+        incremental: Optional[bool] = None,
+        formato: Optional[str] = None,
+        escritor=None,
 ) -> Dict[str, Dict[str, pd.DataFrame]]:
+    """
+    Extrae, clasifica y genera las características de cada segmento del taller.
+    Devuelve {segmento: {"train", "val", "test"}}. Los splits se guardan en disco;
+    si se pasa un `escritor` (EscritorAsincrono) se guardan en segundo plano.
+    """
     print(f"\n--- INICIANDO PIPELINE DE PREPROCESAMIENTO PARA EL TALLER: (id={taller_id}) ---")
 
-    # 1) Extraer y agregar semanal
+    if incremental is None:
+        incremental = getattr(settings, "FORECAST_PREPROCESO_INCREMENTAL", True)
+
+    estado = _cargar_estado_preproceso(output_dir_base, taller_id) if incremental else None
+
+    # 1) Extraer y agregar semanal (solo lo nuevo si hay estado previo válido)
+    demanda_semanal = None
+    if estado is not None:
+        demanda_semanal = _demanda_semanal_incremental(taller_id, output_dir_base, estado)
+        if demanda_semanal is None:
+            estado = None
+
     try:
-        demanda_semanal = cargar_y_limpiar_datos_desde_repo(taller_id)
+        if demanda_semanal is None:
+            print("Preproceso completo (sin estado incremental válido).")
+            demanda_semanal = cargar_y_limpiar_datos_desde_repo(taller_id)
         if demanda_semanal.empty:
             raise ValueError("No hay datos de demanda semanal.")
     except ValueError as e:
@@ -507,8 +917,20 @@ def ejecutar_preproceso(
     # 3) Guardar la clasificación de rotación en la DB
     guardar_clasificacion_rotacion_en_db(taller_id, clasificacion_rotacion_df)
 
-    # 4) Obtener y preprocesar los datos externos una sola vez
-    df_externos = integrar_datos_externos_base()
+    # 4) Obtener y preprocesar los datos externos una sola vez (compartidos entre talleres)
+    if getattr(settings, "FORECAST_CACHE_EXTERNOS", True):
+        df_externos = datos_externos_cacheados(output_dir_base)
+    else:
+        df_externos = integrar_datos_externos_base()
+
+    # Desde qué semana hay que recalcular características: la semana de corte,
+    # o antes si llegaron datos externos nuevos para meses que ya estaban procesados
+    desde = None
+    if estado is not None:
+        desde = pd.Timestamp(estado["semana_corte"])
+        if estado.get("fecha_max_externos"):
+            desde = min(desde, pd.Timestamp(estado["fecha_max_externos"]).to_period("W").start_time)
+        print(f"Preproceso incremental: se recalculan características desde {desde.date()}.")
 
     # 5) Bucle por cada segmento (ML: frecuencia_alta, intermitente)
     print("\n--- PASO 3: PROCESANDO DATOS Y GUARDANDO EN CARPETAS POR SEGMENTO ---")
@@ -522,27 +944,37 @@ def ejecutar_preproceso(
 
         ruta_segmento = os.path.join(output_dir_base, str(taller_id), segmento)
         os.makedirs(ruta_segmento, exist_ok=True)
+        ruta_caracteristicas = _ruta_caracteristicas(output_dir_base, taller_id, segmento)
 
         try:
-            # Integra los datos externos al segmento actual
-            df_segmento = pd.merge_asof(
-                df_segmento.sort_values("fecha"),
-                df_externos.sort_values("fecha"),
-                on="fecha",
-                direction="backward"
-            )
+            if desde is not None:
+                previas = pd.read_pickle(ruta_caracteristicas) if os.path.isfile(ruta_caracteristicas) else None
+                df_modelo_segmento = _caracteristicas_incrementales(df_segmento, df_externos, previas, desde)
+            else:
+                # Integra los datos externos al segmento actual
+                df_segmento = pd.merge_asof(
+                    df_segmento.sort_values("fecha"),
+                    df_externos.sort_values("fecha"),
+                    on="fecha",
+                    direction="backward"
+                )
+
+                # Genera las características específicas del segmento
+                df_modelo_segmento = generar_caracteristicas(df_segmento)
 
-            # Genera las características específicas del segmento
-            df_modelo_segmento = generar_caracteristicas(df_segmento)
+            df_modelo_segmento.to_pickle(ruta_caracteristicas)
 
             # Divide y guarda el resultado
             split_data = dividir_datos(df_modelo_segmento)
             resultados[segmento] = split_data
 
             for part_name, part_df in split_data.items():
-                nombre_archivo = f"demanda_preprocesada_{segmento}_{part_name}.csv"
-                ruta_guardado = os.path.join(ruta_segmento, nombre_archivo)
-                part_df.to_csv(ruta_guardado, index=False)
+                if escritor is not None:
+                    # Modo en memoria: el entrenamiento usa split_data; el archivo queda para auditoría
+                    escritor.enviar(f"split {segmento}/{part_name}", guardar_split,
+                                    part_df, ruta_segmento, segmento, part_name, formato)
+                    continue
+                ruta_guardado = guardar_split(part_df, ruta_segmento, segmento, part_name, formato)
                 print(
                     f"Segmento '{segmento}' ({part_name}) guardado en '{ruta_guardado}' "
                     f"con {part_df.shape[0]} filas."
@@ -551,6 +983,9 @@ def ejecutar_preproceso(
             print(f"Advertencia: No se pudo procesar el segmento '{segmento}': {e}")
             continue
 
+    # 6) Estado para la próxima corrida incremental
+    _guardar_estado_preproceso(output_dir_base, taller_id, demanda_semanal, df_externos)
+
     print("\n--- PROCESO COMPLETADO ---")
     return resultados
 
@@ -4,18 +4,18 @@
 import os
 import warnings
 
-import joblib
 import numpy as np
 import pandas as pd
-import holidays
 import django
-from django.db import transaction
+from django.conf import settings
 # --- Configuración de Django (si es necesario para los repositorios) ---
 
-from catalogo.models import RepuestoTaller
 CHUNK_SIZE = 1000
 
 from catalogo.models import Repuesto
+from AI.calendario import calendario_para_fechas, features_calendario
+from AI.historial_compacto import cargar_historiales, historia_desde_historiales
+from AI.registro_modelos import TALLER_MODELO_GLOBAL, modelo_global_activo, registro_modelos
 from d_externo.repositories.dataexterna import obtener_registroentrenamiento_intermitente, \
     obtener_registroentrenamiento_frecuencia_alta
 from inventario.repositories.repuesto_taller_repo import RepuestoTallerRepo
@@ -60,8 +60,21 @@ def get_features_for_segment(segmento: str, df_columns: list) -> list:
     return final_features
 
 
-def generar_features_futuras(df_historia: pd.DataFrame, fecha_a_predecir: pd.Timestamp,
-                             ar_holidays: holidays.HolidayBase) -> pd.DataFrame:
+# Lags y ventanas de rolling que se calculan en inferencia para cada segmento
+CONFIG_LAGS_SEGMENTO = {
+    "frecuencia_alta": (list(range(1, 53)), [4, 8, 12, 26, 52]),
+    "intermitente": (list(range(1, 29)), [4, 8, 12]),
+}
+
+# Prefijos de las columnas de datos externos (el preproceso las genera en minúsculas)
+PREFIJOS_EXTERNOS = ('inflacion', 'ipsa', 'patentamientos', 'prenda', 'tasa_de_interes', 'tipo_de_cambio')
+
+
+def es_columna_externa(col: str) -> bool:
+    return col.lower().startswith(PREFIJOS_EXTERNOS)
+
+
+def generar_features_futuras(df_historia: pd.DataFrame, fecha_a_predecir: pd.Timestamp) -> pd.DataFrame:
     """
     Genera las características para una única fecha futura, basándose en el historial.
     """
@@ -69,38 +82,18 @@ def generar_features_futuras(df_historia: pd.DataFrame, fecha_a_predecir: pd.Tim
     nuevo_registro = pd.DataFrame([{'fecha': fecha_a_predecir}])
 
     # 1. Características de calendario
-    fechas_feriados = sorted(list(ar_holidays.keys()))
-    feriados_semana = {pd.Timestamp(fecha).to_period("W").start_time for fecha in fechas_feriados}
-
-    nuevo_registro["mes"] = nuevo_registro["fecha"].dt.month
-    nuevo_registro["semana_anio"] = nuevo_registro["fecha"].dt.isocalendar().week.astype(int)
-    nuevo_registro["trimestre"] = nuevo_registro["fecha"].dt.quarter
-
-    for i in range(1, 13): nuevo_registro[f'mes_{i}'] = int(nuevo_registro['mes'] == i)
-    for i in range(1, 53): nuevo_registro[f'semana_{i}'] = int(nuevo_registro['semana_anio'] == i)
-    for i in range(1, 5): nuevo_registro[f'trimestre_{i}'] = int(nuevo_registro['trimestre'] == i)
-
-    nuevo_registro["es_semana_feriado"] = nuevo_registro["fecha"].isin(feriados_semana).astype(int)
-
-    proximos_feriados = [f for f in fechas_feriados if f > fecha_a_predecir.date()]
-    nuevo_registro["dias_hasta_feriado"] = (
-                proximos_feriados[0] - fecha_a_predecir.date()).days if proximos_feriados else 365
+    for col, valor in features_calendario(fecha_a_predecir).items():
+        nuevo_registro[col] = valor
 
     # 2. Lags y Rolling Stats
     # Se concatenan temporalmente para calcular lags y rolling stats
-    historia_combinada = pd.concat([df_historia, nuevo_registro[['fecha']]], ignore_index=True)
+    historia_combinada = pd.concat([df_historia, nuevo_registro], ignore_index=True)
     historia_combinada = historia_combinada.sort_values("fecha").reset_index(drop=True)
 
     segmento = df_historia['segmento_demanda'].iloc[0]
 
     # Config por segmento
-    lags_to_generate, windows = [], []
-    if segmento == "frecuencia_alta":
-        lags_to_generate = list(range(1, 53))
-        windows = [4, 8, 12, 26, 52]
-    elif segmento == "intermitente":
-        lags_to_generate = list(range(1, 29))
-        windows = [4, 8, 12]
+    lags_to_generate, windows = CONFIG_LAGS_SEGMENTO.get(segmento, ([], []))
 
     # Lags
     for lag in lags_to_generate:
@@ -121,9 +114,7 @@ def generar_features_futuras(df_historia: pd.DataFrame, fecha_a_predecir: pd.Tim
         historia_combinada[coef_var_col] = historia_combinada[std_col] / mean_val
 
     # 3. Datos Externos (se propagan desde el último valor conocido)
-    cols_externas = [c for c in df_historia.columns if any(c.startswith(prefix) for prefix in
-                                                           ['Inflacion', 'Ipsa', 'Patentamientos', 'Prenda',
-                                                            'Tasa_de_interes_de_prestamos', 'Tipo_de_cambio'])]
+    cols_externas = [c for c in df_historia.columns if es_columna_externa(c)]
 
     ultimo_registro_externo = df_historia[cols_externas].iloc[-1]
     for col in cols_externas:
@@ -133,151 +124,206 @@ def generar_features_futuras(df_historia: pd.DataFrame, fecha_a_predecir: pd.Tim
     return historia_combinada.iloc[[-1]]
 
 
+def _buffer_ventas(df_segmento: pd.DataFrame, ancho: int):
+    """
+    Arma, para todos los SKUs del segmento, una matriz (n_skus, ancho) con las últimas
+    `ancho` cantidades de cada SKU alineadas a la derecha (la última columna es t-1).
+    Las posiciones sin historia quedan en NaN, igual que el shift de pandas.
+    Devuelve (skus, buffer, ultimo_registro_por_sku).
+    """
+    df = df_segmento.sort_values(["numero_pieza", "fecha"], kind="stable")
+    codigos, skus = pd.factorize(df["numero_pieza"], sort=True)
+    pos_desde_fin = df.groupby("numero_pieza", sort=False).cumcount(ascending=False).to_numpy()
+
+    buffer = np.full((len(skus), ancho), np.nan)
+    mask = pos_desde_fin < ancho
+    cantidades = pd.to_numeric(df["cantidad"], errors="coerce").to_numpy(dtype=float)
+    buffer[codigos[mask], ancho - 1 - pos_desde_fin[mask]] = cantidades[mask]
+
+    ultimos = df.groupby("numero_pieza", sort=False).tail(1)
+    return np.asarray(skus), buffer, ultimos
+
+
+def _features_desde_buffer(buffer: np.ndarray, lags: list, windows: list) -> dict:
+    """
+    Lags y rolling stats (media, std, coef. de variación) para la próxima semana,
+    con la misma semántica que shift(1).rolling(window, min_periods=2) de pandas.
+    """
+    ancho = buffer.shape[1]
+    features = {f"ventas_t_{lag}": buffer[:, ancho - lag] for lag in lags if lag <= ancho}
+
+    for window in windows:
+        ventana = buffer[:, -window:]
+        validos = ~np.isnan(ventana)
+        n = validos.sum(axis=1)
+        suma = np.where(validos, ventana, 0.0).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            media = suma / n
+            desvios = np.where(validos, ventana - media[:, None], 0.0)
+            std = np.sqrt((desvios ** 2).sum(axis=1) / (n - 1))
+        media[n < 2] = np.nan
+        std[n < 2] = np.nan
+
+        features[f"media_ultimas_{window}"] = media
+        features[f"std_pasada_{window}_semanas"] = std
+        features[f"coef_var_{window}"] = std / (np.where(media == 0, 1e-6, media) + 1e-6)
+    return features
+
+
+def _features_del_modelo(modelo) -> list:
+    # LGBMRegressor (motor "sklearn") expone feature_name_; un lgb.Booster (motor "dataset"), feature_name()
+    nombres = getattr(modelo, "feature_name_", None)
+    return list(nombres if nombres is not None else modelo.feature_name())
+
+
+def _features_taller(taller_id) -> dict:
+    # Features a nivel taller del modelo global (ver model_training.FEATURES_TALLER)
+    return {"taller_id": taller_id} if taller_id is not None else {}
+
+
+def _predecir_desde_buffer(skus: np.ndarray, buffer: np.ndarray, externos: dict, modelo, segmento: str,
+                          fechas_a_predecir: pd.DatetimeIndex, taller_id: int = None) -> np.ndarray:
+    """
+    Predicción recursiva de todas las semanas futuras a partir del buffer de ventas
+    (n_skus, ancho) y de los externos de cada SKU. Devuelve la matriz (n_skus, n_semanas).
+    """
+    lags, windows = CONFIG_LAGS_SEGMENTO.get(segmento, ([], []))
+    features_del_modelo = _features_del_modelo(modelo)
+    calendario_semanas = calendario_para_fechas(fechas_a_predecir)
+    constantes = _features_taller(taller_id)
+
+    predicciones = np.zeros((len(skus), len(fechas_a_predecir)), dtype=int)
+    for i, fecha_futura in enumerate(fechas_a_predecir):
+        calendario = calendario_semanas.iloc[i].to_dict()
+        dinamicas = _features_desde_buffer(buffer, lags, windows)
+
+        X = np.full((len(skus), len(features_del_modelo)), np.nan)
+        for j, col in enumerate(features_del_modelo):
+            if col in calendario:
+                X[:, j] = calendario[col]
+            elif col in dinamicas:
+                X[:, j] = dinamicas[col]
+            elif col in externos:
+                X[:, j] = externos[col]
+            elif col in constantes:
+                X[:, j] = constantes[col]
+
+        prediccion = np.maximum(0, modelo.predict(X)).round().astype(int)
+        predicciones[:, i] = prediccion
+
+        # La predicción pasa a ser la venta más reciente para la semana siguiente
+        buffer = np.concatenate([buffer[:, 1:], prediccion[:, None].astype(float)], axis=1)
+
+    return predicciones
+
+
+def _ancho_buffer(segmento: str) -> int:
+    lags, windows = CONFIG_LAGS_SEGMENTO.get(segmento, ([], []))
+    return max(lags + windows + [1])
+
+
+def predecir_segmento_vectorizado(df_segmento: pd.DataFrame, modelo, segmento: str,
+                                  fechas_a_predecir: pd.DatetimeIndex, taller_id: int = None):
+    """
+    Predicción recursiva de todas las semanas futuras para todos los SKUs de un segmento:
+    una sola llamada a `modelo.predict` por semana. Cada predicción se agrega al
+    buffer de ventas para calcular los lags de la semana siguiente.
+    Devuelve (skus, matriz de predicciones enteras (n_skus, n_semanas)).
+    """
+    skus, buffer, ultimos = _buffer_ventas(df_segmento, _ancho_buffer(segmento))
+
+    # Los datos externos se propagan desde el último registro conocido de cada SKU
+    externos = {
+        col: pd.to_numeric(ultimos[col], errors="coerce").to_numpy(dtype=float)
+        for col in ultimos.columns if es_columna_externa(col)
+    }
+    return skus, _predecir_desde_buffer(skus, buffer, externos, modelo, segmento, fechas_a_predecir, taller_id)
+
+
+def predecir_historial_compacto(historial: dict, modelo, segmento: str, fechas_a_predecir: pd.DatetimeIndex,
+                                taller_id: int = None):
+    """
+    Igual que predecir_segmento_vectorizado pero desde un historial compacto (ver AI/historial_compacto.py):
+    el buffer es directamente la cola de la matriz de ventas.
+    """
+    ancho = _ancho_buffer(segmento)
+    ventas = historial["ventas"]
+    if ventas.shape[1] >= ancho:
+        buffer = ventas[:, -ancho:].astype(float)
+    else:
+        buffer = np.full((ventas.shape[0], ancho), np.nan)
+        buffer[:, ancho - ventas.shape[1]:] = ventas
+
+    externos = {
+        col: historial["externos"][:, j].astype(float)
+        for j, col in enumerate(historial["columnas_externas"])
+    }
+    skus = historial["skus"]
+    return skus, _predecir_desde_buffer(skus, buffer, externos, modelo, segmento, fechas_a_predecir, taller_id)
+
+
 def guardar_predicciones_db(taller_id: int, predicciones: list):
     """
-    Guarda las predicciones usando bulk_update para registros existentes
-    y bulk_create para registros nuevos de RepuestoTaller.
+    Guarda las predicciones de RepuestoTaller por lotes (solo ids, sin
+    cargar Repuesto ni RepuestoTaller). Ver RepuestoTallerRepo.upsert_predicciones.
     """
     if not predicciones:
         print("No hay predicciones para guardar.")
         return
 
-    try:
-        taller = Taller.objects.get(id=taller_id)
-    except Taller.DoesNotExist:
+    if not Taller.objects.filter(id=taller_id).exists():
         print(f"No se encontró un Taller con id={taller_id}")
         return
 
-    print("\n--- Preparando listas para Bulk Update y Bulk Create ---")
-
     # 1. Obtener todos los SKUs a procesar
-    skus_a_procesar = [p['numero_pieza'] for p in predicciones if 'numero_pieza' in p]
+    skus_a_procesar = list({p['numero_pieza'] for p in predicciones if 'numero_pieza' in p})
     if not skus_a_procesar:
         print("Advertencia: La lista de predicciones no contiene 'numero_pieza' válidos.")
         return
 
-    # 2. Obtener mapeo Repuesto (SKU -> ID)
-    repuestos_qs = Repuesto.objects.filter(numero_pieza__in=skus_a_procesar).values("id", "numero_pieza")
-    sku_to_repuesto_id = {r["numero_pieza"]: r["id"] for r in repuestos_qs}
+    # 2. Obtener mapeo Repuesto (SKU -> ID), por lotes para no armar un IN gigante
+    sku_to_repuesto_id = {}
+    for i in range(0, len(skus_a_procesar), CHUNK_SIZE):
+        sku_to_repuesto_id.update(
+            Repuesto.objects.filter(numero_pieza__in=skus_a_procesar[i:i + CHUNK_SIZE])
+            .values_list("numero_pieza", "id")
+        )
 
-    # Mapeo de predicciones por repuesto_id
+    # 3. Mapeo de predicciones por repuesto_id
     predicciones_por_id = {}
     for pred in predicciones:
-        repuesto_id = sku_to_repuesto_id.get(pred['numero_pieza'])
+        repuesto_id = sku_to_repuesto_id.get(pred.get('numero_pieza'))
         if repuesto_id:
             predicciones_por_id[repuesto_id] = {
                 f'pred_{i}': pred.get(f'pred_semana_{i}') for i in range(1, 5)
             }
 
-    # 3. Obtener RepuestoTaller existentes para este taller y SKUs
-    repuesto_ids_a_procesar = list(predicciones_por_id.keys())
-    rt_existentes = RepuestoTaller.objects.filter(
-        taller=taller,
-        repuesto_id__in=repuesto_ids_a_procesar
-    )
-    # Mapeo: {repuesto_id: RepuestoTaller_objeto}
-    rt_map = {rt.repuesto_id: rt for rt in rt_existentes}
-
-    a_crear = []
-    a_actualizar = []
-    fields_to_update = ['pred_1', 'pred_2', 'pred_3', 'pred_4']
-
-    # 4. Clasificar en listas de creación y actualización
-    for repuesto_id, preds in predicciones_por_id.items():
-        rt_obj = rt_map.get(repuesto_id)
-
-        # Obtener el objeto Repuesto (necesario solo si vamos a crear)
-        repuesto_obj = Repuesto.objects.get(id=repuesto_id)
-
-        # Rellenar con None si falta alguna predicción, aunque no debería ocurrir si el dict se construyó correctamente
-        for field in fields_to_update:
-            preds[field] = preds.get(field, None)
-
-        if rt_obj:
-            # 4a. Actualizar existente
-            for field in fields_to_update:
-                setattr(rt_obj, field, preds[field])
-            a_actualizar.append(rt_obj)
-        else:
-            # 4b. Crear nuevo
-            a_crear.append(
-                RepuestoTaller(
-                    taller=taller,
-                    repuesto=repuesto_obj,
-                    **preds  # Desempacar las predicciones
-                )
-            )
-
-    # 5. Ejecutar Bulk Operations
-    with transaction.atomic():
-        total_actualizados = 0
-        total_creados = 0
-
-        # Bulk Update (Actualiza existentes)
-        if a_actualizar:
-            print(f"-> Ejecutando bulk_update para {len(a_actualizar)} registros existentes.")
-            # chunking
-            for i in range(0, len(a_actualizar), CHUNK_SIZE):
-                chunk = a_actualizar[i:i + CHUNK_SIZE]
-                RepuestoTaller.objects.bulk_update(
-                    chunk,
-                    fields=fields_to_update,
-                    batch_size=CHUNK_SIZE
-                )
-                total_actualizados += len(chunk)
-
-        # Bulk Create (Crea nuevos)
-        if a_crear:
-            print(f"-> Ejecutando bulk_create para {len(a_crear)} registros nuevos.")
-            # chunking
-            for i in range(0, len(a_crear), CHUNK_SIZE):
-                chunk = a_crear[i:i + CHUNK_SIZE]
-                RepuestoTaller.objects.bulk_create(
-                    chunk,
-                    batch_size=CHUNK_SIZE
-                )
-                total_creados += len(chunk)
-
-    total_guardados = total_actualizados + total_creados
-    print(
-        f"Predicciones guardadas en DB (Bulk) para {total_guardados} repuestos/taller. ({total_actualizados} act, {total_creados} cre)")
-
-
-def ejecutar_inferencia(taller_id: int, fecha_prediccion_str: str):
-    print(f"\n--- INICIANDO PIPELINE DE INFERENCIA PARA TALLER ID: {taller_id} ---")
-    print(f"Fecha de inicio de predicción: {fecha_prediccion_str}")
-
-    # --- 1. Cargar el último registro de cada SKU desde Django ---
-    registros_frecuencia_alta = obtener_registroentrenamiento_frecuencia_alta(taller_id)
-    registros_intermitente = obtener_registroentrenamiento_intermitente(taller_id)
+    # 4. Guardado por lotes (bulk_update de los existentes, bulk_create de los nuevos)
+    print(f"\n--- Guardando predicciones de {len(predicciones_por_id)} repuestos (por lotes) ---")
+    resultado = RepuestoTallerRepo().upsert_predicciones(taller_id, predicciones_por_id, batch_size=CHUNK_SIZE)
 
-    # Convertir a DataFrame
-    df_frecuencia_alta = pd.DataFrame(registros_frecuencia_alta)
-    df_intermitente = pd.DataFrame(registros_intermitente)
-    #formateo boolean
-    if 'es_semana_feriado' in df_frecuencia_alta:
-        df_frecuencia_alta['es_semana_feriado'] = df_frecuencia_alta['es_semana_feriado'].astype(int)
-    if 'es_semana_feriado' in df_intermitente:
-        df_intermitente['es_semana_feriado'] = df_intermitente['es_semana_feriado'].astype(int)
+    print(f"Predicciones guardadas en DB (Bulk) para {resultado['guardados']} repuestos/taller. "
+          f"({resultado['actualizados']} act, {resultado['creados']} cre)")
 
-    # Concatenar todos los registros
-    df_ultimos_registros = pd.concat([df_frecuencia_alta, df_intermitente], ignore_index=True)
-    if df_ultimos_registros.empty:
-        print(f"No se encontraron registros para el taller_id={taller_id}.")
-        return
 
-    # Convertir columna fecha a datetime
-    df_ultimos_registros['fecha'] = pd.to_datetime(df_ultimos_registros['fecha'])
+def _obtener_modelo(taller_id: int, segmento: str, modelos: dict = None):
+    # Modelos recién entrenados en memoria (pipeline en memoria) o los del registro en disco
+    if modelos and segmento in modelos:
+        return modelos[segmento]
+    if modelo_global_activo():
+        # El modelo global tiene prioridad; el del taller queda para segmentos sin modelo global
+        modelo = registro_modelos.obtener(TALLER_MODELO_GLOBAL, segmento)
+        if modelo is not None:
+            return modelo
+    return registro_modelos.obtener(taller_id, segmento)
 
-    print(f"Se cargaron los últimos registros de {df_ultimos_registros['numero_pieza'].nunique()} SKUs.")
-
-    # Definir las 4 semanas futuras para la predicción
-    fecha_inicio = pd.to_datetime(fecha_prediccion_str)
-    fechas_a_predecir = pd.date_range(start=fecha_inicio, periods=4, freq='W-MON')
-
-    # Feriados de Argentina
-    ar_holidays = holidays.AR(years=np.arange(fecha_inicio.year, fecha_inicio.year + 2))
 
+def _inferir_por_sku(df_ultimos_registros: pd.DataFrame, taller_id: int,
+                     fechas_a_predecir: pd.DatetimeIndex, modelos: dict = None) -> list:
+    """
+    Inferencia SKU por SKU (una predicción por fila). Se mantiene como referencia
+    del motor vectorizado y para depurar un SKU puntual.
+    """
     resultados_finales = []
 
     for sku in df_ultimos_registros['numero_pieza'].unique():
@@ -288,21 +334,21 @@ def ejecutar_inferencia(taller_id: int, fecha_prediccion_str: str):
             print(f"SKU {sku} pertenece al segmento '{segmento}', se omite predicción.")
             continue
 
-        # Cargar el modelo correspondiente
-        ruta_modelo = os.path.join(RUTA_BASE_MODELOS, str(taller_id), segmento, f"modelo_lightgbm_{segmento}_final.pkl")
-        if not os.path.exists(ruta_modelo):
+        # Cargar el modelo correspondiente (el registro lo deserializa una sola vez)
+        modelo = _obtener_modelo(taller_id, segmento, modelos)
+        if modelo is None:
             print(f"Advertencia: No se encontró el modelo para el segmento '{segmento}'. Se omite SKU {sku}.")
             continue
 
-        modelo = joblib.load(ruta_modelo)
-        features_del_modelo = modelo.feature_name_
+        features_del_modelo = _features_del_modelo(modelo)
 
         print(f"\nProcesando SKU: {sku} (Segmento: {segmento})")
         predicciones_sku = {'numero_pieza': sku}
         historia_temporal = historia_sku.copy()
 
         for i, fecha_futura in enumerate(fechas_a_predecir):
-            features_para_predecir_df = generar_features_futuras(historia_temporal, fecha_futura, ar_holidays)
+            features_para_predecir_df = generar_features_futuras(historia_temporal, fecha_futura)
+            features_para_predecir_df = features_para_predecir_df.assign(**_features_taller(taller_id))
             features_para_predecir_df = features_para_predecir_df[features_del_modelo]
             prediccion_raw = modelo.predict(features_para_predecir_df)
             prediccion_final = np.maximum(0, prediccion_raw).round().astype(int)[0]
@@ -320,6 +366,131 @@ def ejecutar_inferencia(taller_id: int, fecha_prediccion_str: str):
 
         resultados_finales.append(predicciones_sku)
 
+    return resultados_finales
+
+
+def _inferir_vectorizado(df_ultimos_registros: pd.DataFrame, taller_id: int,
+                         fechas_a_predecir: pd.DatetimeIndex, modelos: dict = None) -> list:
+    """
+    Inferencia por lotes: un predict por segmento y semana futura para todos los SKUs.
+    """
+    resultados_finales = []
+
+    for segmento, df_segmento in df_ultimos_registros.groupby('segmento_demanda', sort=False):
+        if segmento in ['sin_venta', 'nuevo']:
+            print(f"Segmento '{segmento}' ({df_segmento['numero_pieza'].nunique()} SKUs) se omite predicción.")
+            continue
+
+        modelo = _obtener_modelo(taller_id, segmento, modelos)
+        if modelo is None:
+            print(f"Advertencia: No se encontró el modelo para el segmento '{segmento}'. "
+                  f"Se omiten {df_segmento['numero_pieza'].nunique()} SKUs.")
+            continue
+
+        skus, predicciones = predecir_segmento_vectorizado(
+            df_segmento, modelo, segmento, fechas_a_predecir, taller_id
+        )
+        print(f"Segmento '{segmento}': {len(skus)} SKUs predichos en {len(fechas_a_predecir)} lotes.")
+
+        for sku, fila in zip(skus, predicciones.tolist()):
+            predicciones_sku = {'numero_pieza': sku}
+            for i, valor in enumerate(fila):
+                predicciones_sku[f'pred_semana_{i + 1}'] = valor
+            resultados_finales.append(predicciones_sku)
+
+    return resultados_finales
+
+
+def cargar_historia_desde_db(taller_id: int) -> pd.DataFrame:
+    """
+    Último registro de cada SKU guardado por el entrenamiento (RegistroEntrenamiento_*).
+    """
+    registros_frecuencia_alta = obtener_registroentrenamiento_frecuencia_alta(taller_id)
+    registros_intermitente = obtener_registroentrenamiento_intermitente(taller_id)
+
+    # Convertir a DataFrame
+    df_frecuencia_alta = pd.DataFrame(registros_frecuencia_alta)
+    df_intermitente = pd.DataFrame(registros_intermitente)
+    #formateo boolean
+    if 'es_semana_feriado' in df_frecuencia_alta:
+        df_frecuencia_alta['es_semana_feriado'] = df_frecuencia_alta['es_semana_feriado'].astype(int)
+    if 'es_semana_feriado' in df_intermitente:
+        df_intermitente['es_semana_feriado'] = df_intermitente['es_semana_feriado'].astype(int)
+
+    # Concatenar todos los registros
+    return pd.concat([df_frecuencia_alta, df_intermitente], ignore_index=True)
+
+
+def _inferir_compacto(historiales: dict, taller_id: int, fechas_a_predecir: pd.DatetimeIndex,
+                      modelos: dict = None) -> list:
+    """
+    Inferencia por lotes desde los historiales compactos ({segmento: historial}).
+    """
+    resultados_finales = []
+
+    for segmento, historial in historiales.items():
+        modelo = _obtener_modelo(taller_id, segmento, modelos)
+        if modelo is None:
+            print(f"Advertencia: No se encontró el modelo para el segmento '{segmento}'. "
+                  f"Se omiten {len(historial['skus'])} SKUs.")
+            continue
+
+        skus, predicciones = predecir_historial_compacto(historial, modelo, segmento, fechas_a_predecir, taller_id)
+        print(f"Segmento '{segmento}': {len(skus)} SKUs predichos en {len(fechas_a_predecir)} lotes "
+              f"(historial compacto).")
+
+        for sku, fila in zip(skus, predicciones.tolist()):
+            predicciones_sku = {'numero_pieza': sku}
+            for i, valor in enumerate(fila):
+                predicciones_sku[f'pred_semana_{i + 1}'] = valor
+            resultados_finales.append(predicciones_sku)
+
+    return resultados_finales
+
+
+def ejecutar_inferencia(taller_id: int, fecha_prediccion_str: str, vectorizado: bool = True,
+                        historia: pd.DataFrame = None, modelos: dict = None, historiales: dict = None):
+    """
+    Predice las próximas 4 semanas de cada SKU y las guarda en RepuestoTaller.
+    `historia`/`historiales` y `modelos` permiten pasar desde memoria lo que acaba de generar el
+    entrenamiento. Si no se pasan, se usan los historiales compactos de la DB (con
+    FORECAST_HISTORIAL_COMPACTO) o, si no hay, el último registro de cada SKU (RegistroEntrenamiento_*).
+    """
+    print(f"\n--- INICIANDO PIPELINE DE INFERENCIA PARA TALLER ID: {taller_id} ---")
+    print(f"Fecha de inicio de predicción: {fecha_prediccion_str}")
+
+    # Definir las 4 semanas futuras para la predicción
+    fecha_inicio = pd.to_datetime(fecha_prediccion_str)
+    fechas_a_predecir = pd.date_range(start=fecha_inicio, periods=4, freq='W-MON')
+
+    # --- 1. Historia: historiales compactos o último registro de cada SKU (memoria o DB) ---
+    if historiales is None and historia is None and getattr(settings, "FORECAST_HISTORIAL_COMPACTO", True):
+        historiales = cargar_historiales(taller_id)
+
+    if historiales and vectorizado:
+        print(f"Se cargaron los historiales compactos de {sum(len(h['skus']) for h in historiales.values())} SKUs.")
+        resultados_finales = _inferir_compacto(historiales, taller_id, fechas_a_predecir, modelos)
+    else:
+        if historiales:
+            df_ultimos_registros = historia_desde_historiales(historiales)
+        elif historia is not None:
+            df_ultimos_registros = historia.copy()
+        else:
+            df_ultimos_registros = cargar_historia_desde_db(taller_id)
+        if df_ultimos_registros.empty:
+            print(f"No se encontraron registros para el taller_id={taller_id}.")
+            return
+
+        # Convertir columna fecha a datetime
+        df_ultimos_registros['fecha'] = pd.to_datetime(df_ultimos_registros['fecha'])
+
+        print(f"Se cargaron los últimos registros de {df_ultimos_registros['numero_pieza'].nunique()} SKUs.")
+
+        if vectorizado:
+            resultados_finales = _inferir_vectorizado(df_ultimos_registros, taller_id, fechas_a_predecir, modelos)
+        else:
+            resultados_finales = _inferir_por_sku(df_ultimos_registros, taller_id, fechas_a_predecir, modelos)
+
     if resultados_finales:
         print("\n--- Guardando predicciones en la base de datos ---")
         guardar_predicciones_db(taller_id, resultados_finales)
@@ -328,6 +499,7 @@ def ejecutar_inferencia(taller_id: int, fecha_prediccion_str: str):
     else:
         print("\nNo se generaron predicciones.")
 
+    print(f"Registro de modelos: {registro_modelos.estadisticas()}")
     print("\n--- PROCESO DE INFERENCIA COMPLETADO ---")
 
 
@@ -0,0 +1,109 @@
+# metadata_modelos.py
+# -*- coding: utf-8 -*-
+"""
+Metadata de entrenamiento de cada modelo: models/<taller>/<segmento>/modelo_metadata.json.
+
+Guarda cuándo se entrenó, con qué datos (marca de agua) y el error en test, para decidir
+en cada corrida si el modelo se puede seguir usando o hay que reentrenarlo:
+  - se reentrena si el modelo tiene FORECAST_SEMANAS_REENTRENAMIENTO semanas o más (0 = siempre),
+  - o si su MAE sobre el test actual supera el MAE con el que se entrenó en más de FORECAST_DEGRADACION_MAX,
+  - o si no hay metadata/modelo, o el modelo usa otras features que las de los datos actuales.
+"""
+from __future__ import annotations
+
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+from django.conf import settings
+from django.utils import timezone
+
+from AI.registro_modelos import RUTA_BASE_MODELOS
+
+ARCHIVO_METADATA = "modelo_metadata.json"
+VERSION_METADATA = 1
+
+
+def ruta_metadata(taller_id: int, segmento: str, ruta_base: str = RUTA_BASE_MODELOS) -> str:
+    return os.path.join(ruta_base, str(taller_id), segmento, ARCHIVO_METADATA)
+
+
+def cargar_metadata(taller_id: int, segmento: str, ruta_base: str = RUTA_BASE_MODELOS) -> Optional[dict]:
+    ruta = ruta_metadata(taller_id, segmento, ruta_base)
+    if not os.path.isfile(ruta):
+        return None
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo leer la metadata del modelo '{ruta}': {e}")
+        return None
+    if metadata.get("version") != VERSION_METADATA:
+        return None
+    return metadata
+
+
+def guardar_metadata(ruta: str, metadata: dict):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION_METADATA, **metadata}, f, indent=2)
+    os.replace(temporal, ruta)
+
+
+def marca_agua_datos(*dfs: pd.DataFrame) -> dict:
+    """
+    Con qué datos se entrenó/evaluó: filas, SKUs y rango de semanas.
+    """
+    fechas = pd.concat([pd.to_datetime(df["fecha"]) for df in dfs])
+    skus = pd.concat([df["numero_pieza"] for df in dfs])
+    return {
+        "filas": int(len(fechas)),
+        "skus": int(skus.nunique()),
+        "fecha_min": fechas.min().date().isoformat() if len(fechas) else None,
+        "fecha_max": fechas.max().date().isoformat() if len(fechas) else None,
+    }
+
+
+def metadata_entrenamiento(marca_agua: dict, features: list, motor: str, mae: float, rmse: float,
+                           validacion: list) -> dict:
+    ahora = timezone.now().isoformat()
+    return {
+        "entrenado": ahora,
+        "marca_agua": marca_agua,
+        "features": list(features),
+        "motor": motor,
+        "mae": mae,
+        "rmse": rmse,
+        "validacion": validacion,
+        "ultima_evaluacion": {"fecha": ahora, "marca_agua": marca_agua, "mae": mae, "rmse": rmse},
+    }
+
+
+def motivo_reentrenamiento(metadata: Optional[dict], features: list, features_modelo: Optional[list],
+                           mae_actual: Optional[float] = None) -> Optional[str]:
+    """
+    Devuelve por qué hay que reentrenar, o None si el modelo guardado se puede reutilizar.
+    Con `mae_actual` None solo se revisan la antigüedad y las features.
+    """
+    semanas_max = getattr(settings, "FORECAST_SEMANAS_REENTRENAMIENTO", 4)
+    if not semanas_max:
+        return "reentrenamiento en cada corrida"
+    if metadata is None or features_modelo is None:
+        return "sin modelo o metadata previa"
+    if list(features_modelo) != list(features):
+        return "las features cambiaron"
+
+    entrenado = datetime.fromisoformat(metadata["entrenado"])
+    semanas = (timezone.now() - entrenado).days / 7
+    if semanas >= semanas_max:
+        return f"modelo de {semanas:.1f} semanas (máximo {semanas_max})"
+
+    if mae_actual is not None:
+        degradacion_max = getattr(settings, "FORECAST_DEGRADACION_MAX", 0.2)
+        limite = metadata["mae"] * (1 + degradacion_max)
+        if mae_actual > limite:
+            return f"MAE {mae_actual:.2f} supera {limite:.2f} (entrenado con {metadata['mae']:.2f})"
+    return None
@@ -1,4 +1,6 @@
 import os
+import sys
+import time
 import pandas as pd
 import numpy as np
 import lightgbm as lgb
@@ -6,17 +8,41 @@ from sklearn.metrics import mean_squared_error, mean_absolute_error
 import joblib
 import warnings
 import django
+from django.conf import settings
 from django.db import transaction  # Import transaction
-
+from django.utils import timezone
+
+from AI.artefactos import PARTES, borrar_split, cargar_split, detectar_formato
+from AI.historial_compacto import construir_historial, guardar_historial
+from AI.inferencia import _features_del_modelo, es_columna_externa
+from AI.metadata_modelos import (
+    ARCHIVO_METADATA,
+    cargar_metadata,
+    guardar_metadata,
+    marca_agua_datos,
+    metadata_entrenamiento,
+    motivo_reentrenamiento,
+    ruta_metadata,
+)
+from AI.registro_modelos import TALLER_MODELO_GLOBAL, modelo_global_activo, registro_modelos
 from d_externo.models import RegistroEntrenamiento_Frecuencia_Alta, RegistroEntrenamiento_intermitente
 from d_externo.repositories.dataexterna import borrar_registroentrenamiento_frecuencia_alta, \
     borrar_registroentrenamiento_intermitente
 from user.api.models.models import Taller
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 CHUNK_SIZE = 1000
 RUTA_BASE_MODELOS = "models"
+SEGMENTOS_NO_ENTRENABLES = ['validacion', 'nuevo', 'sin_venta']
+
+# Features a nivel taller del modelo global (categóricas para LightGBM)
+FEATURES_TALLER = ['taller_id']
 
 
 def get_features_for_segment(segmento: str, df_columns: list) -> list:
@@ -55,10 +81,42 @@ def get_features_for_segment(segmento: str, df_columns: list) -> list:
     return final_features
 
 
-def guardar_ultimo_registro_a_db(df: pd.DataFrame, segmento: str, taller_id: int):
+MODELOS_REGISTRO = {
+    "frecuencia_alta": RegistroEntrenamiento_Frecuencia_Alta,
+    "intermitente": RegistroEntrenamiento_intermitente,
+}
+
+
+def ultimo_registro_por_sku(df: pd.DataFrame, segmento: str) -> pd.DataFrame:
     """
-    Guarda el último registro de cada SKU en la base de datos de Django
-    usando bulk_create, asegurando que solo los campos válidos se pasen al constructor.
+    Última fila de cada SKU con las mismas columnas (en minúscula) que se guardan en
+    RegistroEntrenamiento_*: es la historia que usa la inferencia.
+    """
+    ultimo = df.sort_values('fecha').drop_duplicates(subset=['numero_pieza'], keep='last')
+    ultimo = ultimo.rename(columns=str.lower)
+
+    Modelo = MODELOS_REGISTRO.get(segmento)
+    if Modelo is not None:
+        campo_nombres = {f.name for f in Modelo._meta.get_fields()} - {'id', 'taller'}
+        ultimo = ultimo[[c for c in ultimo.columns if c in campo_nombres]]
+    return ultimo.reset_index(drop=True)
+
+
+def guardar_modelo(modelo, ruta_guardado_modelo: str, segmento: str, metadata: dict = None):
+    # models/global/<segmento> no lo crea el preproceso de ningún taller
+    os.makedirs(os.path.dirname(ruta_guardado_modelo), exist_ok=True)
+    joblib.dump(modelo, ruta_guardado_modelo)
+    print(f"Modelo final para '{segmento}' guardado en '{ruta_guardado_modelo}'.")
+    if metadata is not None:
+        # Recién con el modelo en disco: la metadata nueva nunca describe un modelo viejo
+        guardar_metadata(os.path.join(os.path.dirname(ruta_guardado_modelo), ARCHIVO_METADATA), metadata)
+
+
+def guardar_ultimo_registro_a_db(df: pd.DataFrame, segmento: str, taller_id: int, ultimo: pd.DataFrame = None):
+    """
+    Guarda el último registro de cada SKU en la base de datos de Django usando bulk_create.
+    El mapeo columna -> campo del modelo y la limpieza de NaN se hacen una sola vez sobre
+    todo el DataFrame (ver ultimo_registro_por_sku); `ultimo` permite pasarlo ya calculado.
     """
     try:
         taller = Taller.objects.get(id=taller_id)
@@ -83,49 +141,34 @@ def guardar_ultimo_registro_a_db(df: pd.DataFrame, segmento: str, taller_id: int
 
     print(f"\nIniciando la carga BULK del último registro de cada SKU ({segmento}) a la base de datos...")
 
-    # --- OBTENER NOMBRES DE CAMPOS DEL MODELO DJANGO ---
-    # Esto es CRUCIAL para evitar el TypeError en el constructor
-    campo_nombres = {f.name for f in Modelo._meta.get_fields()}
-    campo_nombres.discard('id')  # No necesitamos el campo ID
-    campo_nombres.discard('taller')  # Manejado explícitamente
-
     try:
-        # 1. Obtener el último registro (última fecha) para cada SKU
-        df_ultimo_registro = df.sort_values('fecha').drop_duplicates(
-            subset=['numero_pieza'], keep='last'
-        ).copy()
-
-        objetos_a_crear = []
-
-        # 2. Preparar los objetos Django
-        for _, row in df_ultimo_registro.iterrows():
-            datos = row.to_dict()
-
-            datos_limpios = {}
-            # Normalizamos nombres a minúsculas, filtramos contra campos Django y limpiamos NaN
-            for k, v in datos.items():
-                k_lower = k.lower()
-
-                # SOLO incluimos el campo si está en la lista de campos del modelo
-                if k_lower in campo_nombres:
-                    datos_limpios[k_lower] = None if pd.isna(v) else v
-
-            # Extraer campos clave que se pasan por nombre
-            numero_pieza = datos_limpios.pop('numero_pieza', None)
-
-            if not numero_pieza:
-                warnings.warn(f"Registro sin 'numero_pieza' encontrado y saltado.")
-                continue
-
-            # Crear instancia del modelo
-            instancia = Modelo(
-                taller=taller,
-                numero_pieza=numero_pieza,
-                **datos_limpios  # Ahora solo contiene los campos válidos restantes
-            )
-            objetos_a_crear.append(instancia)
-
-        # 3. Realizar el Bulk Create por chunks DENTRO de una transacción atómica
+        # 1. Último registro (última fecha) de cada SKU, solo con columnas que son campos del modelo
+        if ultimo is None:
+            ultimo = ultimo_registro_por_sku(df, segmento)
+
+        sin_pieza = ultimo['numero_pieza'].isna() | (ultimo['numero_pieza'].astype(str) == '')
+        if sin_pieza.any():
+            warnings.warn(f"{int(sin_pieza.sum())} registros sin 'numero_pieza' encontrados y saltados.")
+            ultimo = ultimo[~sin_pieza]
+
+        # 2. NaN -> None en una sola pasada (object también convierte los tipos NumPy a nativos)
+        valores = ultimo.astype(object).where(ultimo.notna(), None)
+
+        # 3. Columnas en el orden de los campos concretos del modelo: el constructor posicional
+        #    evita el procesamiento de kwargs por instancia
+        columnas = {}
+        for campo in Modelo._meta.concrete_fields:
+            if campo.attname == 'taller_id':
+                columnas[campo.attname] = taller.id
+            elif campo.name in valores.columns:
+                columnas[campo.attname] = valores[campo.name]
+            else:
+                columnas[campo.attname] = None if campo.primary_key else campo.get_default()
+        filas = pd.DataFrame(columnas, index=valores.index)
+
+        objetos_a_crear = [Modelo(*fila) for fila in filas.itertuples(index=False, name=None)]
+
+        # 4. Realizar el Bulk Create por chunks DENTRO de una transacción atómica
         if objetos_a_crear:
             print(f"Total de objetos a guardar: {len(objetos_a_crear)}")
 
@@ -149,100 +192,391 @@ def guardar_ultimo_registro_a_db(df: pd.DataFrame, segmento: str, taller_id: int
             f"Error al guardar los últimos registros en la base de datos mediante bulk_create. Se ha realizado ROLLBACK: {e}")
 
 
-def train_segment_model(taller: int, segmento: str):
+PARAMETROS_LGBM = dict(
+    objective='regression_l1',
+    metric='mae',
+    random_state=42,
+    n_jobs=-1,
+    learning_rate=0.05,
+    n_estimators=1000,
+    max_depth=8
+)
+
+# Validación rápida: árboles extra (como máximo) que se agregan al modelo base en cada fold
+ARBOLES_WARM_START = 100
+
+MODOS_VALIDACION = ("rapida", "completa", "ninguna")
+
+
+MOTORES_ENTRENAMIENTO = ("dataset", "sklearn")
+
+
+def _metricas(y_real, y_pred) -> dict:
+    return {
+        "mae": float(mean_absolute_error(y_real, y_pred)),
+        "rmse": float(np.sqrt(mean_squared_error(y_real, y_pred))),
+    }
+
+
+def _modo_validacion(modo: str = None) -> str:
+    if modo is None:
+        modo = getattr(settings, "FORECAST_VALIDACION", "rapida")
+    if modo not in MODOS_VALIDACION:
+        raise ValueError(f"Modo de validación desconocido: '{modo}'. Opciones: {MODOS_VALIDACION}")
+    return modo
+
+
+def _registrar_fold(metricas: list, i: int, fecha_fold, modo: str, y_fold, prediccion, arboles: int):
+    fold = {
+        "fold": i,
+        "fecha": str(pd.Timestamp(fecha_fold).date()),
+        "filas": int(len(prediccion)),
+        "arboles": int(arboles),
+        **_metricas(y_fold, prediccion),
+    }
+    metricas.append(fold)
+    print(f"  Fold {i} ({fold['fecha']}, {modo}): MAE {fold['mae']:.2f} | RMSE {fold['rmse']:.2f} "
+          f"| {fold['arboles']} árboles")
+
+
+def _imprimir_total_validacion(modo: str, y_val, predicciones: np.ndarray):
+    validas = ~np.isnan(predicciones)
+    if validas.any():
+        total = _metricas(np.asarray(y_val)[validas], predicciones[validas])
+        print(f"Validación ({modo}) total: MAE {total['mae']:.2f} | RMSE {total['rmse']:.2f}")
+
+
+def validacion_rolling(df_train: pd.DataFrame, df_val: pd.DataFrame, features: list, target: str,
+                       modo: str = None) -> list:
     """
-    Carga datos preprocesados y entrena un modelo LightGBM para un segmento específico.
+    Rolling-origin sobre las semanas de val: cada fold predice una semana usando todo lo anterior.
+
+    - "completa": un LGBMRegressor nuevo por fold, entrenado sobre train + semanas previas de val.
+    - "rapida": un único modelo base sobre train (fold 0) y, en cada fold siguiente, se continúa
+      ese booster (init_model) solo con las semanas previas de val. El costo deja de crecer
+      con (tamaño de train x semanas de val).
+    - "ninguna": no valida.
+
+    Devuelve una lista con {"fold", "fecha", "filas", "mae", "rmse", "arboles"} por fold.
     """
-    ruta_segmento_data = os.path.join(RUTA_BASE_MODELOS, str(taller), segmento)
-    ruta_archivo_train = os.path.join(ruta_segmento_data, f"demanda_preprocesada_{segmento}_train.csv")
-    ruta_archivo_val = os.path.join(ruta_segmento_data, f"demanda_preprocesada_{segmento}_val.csv")
-    ruta_archivo_test = os.path.join(ruta_segmento_data, f"demanda_preprocesada_{segmento}_test.csv")
+    modo = _modo_validacion(modo)
+    if modo == "ninguna":
+        return []
+
+    fechas_val_unicas = sorted(df_val['fecha'].unique())
+    if len(fechas_val_unicas) < 4:
+        print("Advertencia: No hay suficientes semanas para la validación. Saltando la validación.")
+        return []
+
+    fechas_val = df_val['fecha'].to_numpy()
+    X_val, y_val = df_val[features], df_val[target]
+    X_train, y_train = df_train[features], df_train[target]
+
+    # Predicciones preasignadas (una por fila de val) en lugar de concatenar por fold
+    predicciones = np.full(len(df_val), np.nan)
+    metricas = []
+    modelo_base = None
+
+    for i, fecha_fold in enumerate(fechas_val_unicas):
+        mask_fold = fechas_val == fecha_fold
+        mask_previas = fechas_val < fecha_fold
+        X_fold, y_fold = X_val[mask_fold], y_val[mask_fold]
+
+        if modo == "completa" or modelo_base is None:
+            X_fit = pd.concat([X_train, X_val[mask_previas]]) if mask_previas.any() else X_train
+            y_fit = pd.concat([y_train, y_val[mask_previas]]) if mask_previas.any() else y_train
+            if X_fit.empty or X_fold.empty:
+                continue
+            modelo = lgb.LGBMRegressor(**PARAMETROS_LGBM)
+            modelo.fit(X_fit, y_fit,
+                       eval_set=[(X_fold, y_fold)],
+                       eval_metric='mae',
+                       callbacks=[lgb.early_stopping(50, verbose=False)])
+            if modo == "rapida":
+                modelo_base = modelo
+        else:
+            # Solo se agregan árboles sobre las semanas nuevas, partiendo del modelo base
+            modelo = lgb.LGBMRegressor(**{**PARAMETROS_LGBM, "n_estimators": ARBOLES_WARM_START})
+            modelo.fit(X_val[mask_previas], y_val[mask_previas],
+                       init_model=modelo_base.booster_,
+                       eval_set=[(X_fold, y_fold)],
+                       eval_metric='mae',
+                       callbacks=[lgb.early_stopping(20, verbose=False)])
 
-    if not os.path.isfile(ruta_archivo_train) or not os.path.isfile(ruta_archivo_val) or not os.path.isfile(
-            ruta_archivo_test):
-        print(f"Advertencia: No se encontraron todos los archivos de datos para el segmento '{segmento}'. Saltando.")
-        return
+        prediccion = np.maximum(0, modelo.predict(X_fold)).round().astype(int)
+        predicciones[mask_fold] = prediccion
+        _registrar_fold(metricas, i, fecha_fold, modo, y_fold, prediccion, modelo.booster_.num_trees())
 
-    try:
-        print(f"\n--- INICIANDO ENTRENAMIENTO PARA EL SEGMENTO: '{segmento.upper()}' ---")
-        df_train = pd.read_csv(ruta_archivo_train)
-        df_val = pd.read_csv(ruta_archivo_val)
-        df_test = pd.read_csv(ruta_archivo_test)
+    _imprimir_total_validacion(modo, y_val, predicciones)
+    return metricas
 
-        df_train['fecha'] = pd.to_datetime(df_train['fecha'])
-        df_val['fecha'] = pd.to_datetime(df_val['fecha'])
-        df_test['fecha'] = pd.to_datetime(df_test['fecha'])
 
-        TARGET = 'Cantidad'
-        features = get_features_for_segment(segmento, df_train.columns)
+def _parametros_booster():
+    """
+    PARAMETROS_LGBM traducidos a la API nativa (lgb.train). Devuelve (params, num_boost_round).
+    """
+    params = dict(PARAMETROS_LGBM)
+    num_boost_round = params.pop("n_estimators")
+    params["seed"] = params.pop("random_state")
+    params["num_threads"] = params.pop("n_jobs")
+    params["verbose"] = -1
+    return params, num_boost_round
 
-        if TARGET not in df_train.columns or not features:
-            print(f"Error: No se encontraron las columnas necesarias en los archivos de datos para '{segmento}'.")
-            return
 
-        # Validación (rolling forecast) - Se mantiene el código de entrenamiento y validación
-        fechas_val_unicas = sorted(df_val['fecha'].unique())
-        all_val_predictions = pd.DataFrame()
+def _matriz_float32(df: pd.DataFrame, features: list) -> np.ndarray:
+    return np.ascontiguousarray(df[features].to_numpy(dtype=np.float32, na_value=np.nan))
 
-        if len(fechas_val_unicas) >= 4:
-            for i in range(len(fechas_val_unicas)):
-                current_fecha_val = fechas_val_unicas[i]
 
-                df_train_temp = pd.concat([df_train, df_val[df_val['fecha'] < current_fecha_val]]).copy()
-                df_test_temp = df_val[df_val['fecha'] == current_fecha_val].copy()
+def _subset(dataset: lgb.Dataset, indices: np.ndarray) -> lgb.Dataset:
+    """
+    Subconjunto de filas que reutiliza los bins ya calculados del dataset completo.
+    lightgbm 4.3 guarda los índices como lista y con numpy 2 falla al convertirlos
+    (np.array(copy=False)), por eso se dejan como array int32.
+    """
+    sub = dataset.subset(indices)
+    sub.used_indices = np.asarray(indices, dtype=np.int32)
+    return sub
+
+
+def entrenar_con_dataset(df_train: pd.DataFrame, df_val: pd.DataFrame, features: list, target: str,
+                         modo: str = None, categoricas: list = None):
+    """
+    Validación rolling + fit final sobre un único lgb.Dataset (train + val) construido una sola vez
+    desde una matriz float32 contigua: los folds y el modelo final son subsets del mismo dataset,
+    así LightGBM calcula los bins una sola vez. Mismos modos que validacion_rolling.
+    `categoricas` son features (enteras) que LightGBM trata como categóricas, p. ej. taller_id.
+    Devuelve (booster_final, metricas_validacion).
+    """
+    modo = _modo_validacion(modo)
+    params, num_boost_round = _parametros_booster()
+
+    X = np.concatenate([_matriz_float32(df_train, features), _matriz_float32(df_val, features)])
+    y = np.concatenate([df_train[target].to_numpy(dtype=np.float32), df_val[target].to_numpy(dtype=np.float32)])
+    fechas = np.concatenate([df_train['fecha'].to_numpy(), df_val['fecha'].to_numpy()])
+    es_val = np.arange(len(X)) >= len(df_train)
+
+    # lgb.train vuelve a fijar las categóricas en cada subset: se le pasan las mismas para que no lo intente
+    categoricas = categoricas or "auto"
+    dataset = lgb.Dataset(X, label=y, feature_name=list(features), categorical_feature=categoricas,
+                          free_raw_data=False, params=params).construct()
+
+    metricas = []
+    fechas_val_unicas = sorted(df_val['fecha'].unique())
+    if modo != "ninguna" and len(fechas_val_unicas) < 4:
+        print("Advertencia: No hay suficientes semanas para la validación. Saltando la validación.")
+    elif modo != "ninguna":
+        predicciones = np.full(len(X), np.nan)
+        booster_base = None
+
+        for i, fecha_fold in enumerate(fechas_val_unicas):
+            idx_fold = np.flatnonzero(fechas == fecha_fold)
+            valid_fold = _subset(dataset, idx_fold)
+
+            if modo == "completa" or booster_base is None:
+                booster = lgb.train(params, _subset(dataset, np.flatnonzero(fechas < fecha_fold)),
+                                    num_boost_round=num_boost_round,
+                                    categorical_feature=categoricas,
+                                    valid_sets=[valid_fold],
+                                    callbacks=[lgb.early_stopping(50, verbose=False)])
+                if modo == "rapida":
+                    booster_base = booster
+            else:
+                # Solo se agregan árboles sobre las semanas nuevas, partiendo del booster base
+                booster = lgb.train(params, _subset(dataset, np.flatnonzero(es_val & (fechas < fecha_fold))),
+                                    num_boost_round=ARBOLES_WARM_START,
+                                    init_model=booster_base,
+                                    categorical_feature=categoricas,
+                                    valid_sets=[valid_fold],
+                                    callbacks=[lgb.early_stopping(20, verbose=False)])
+
+            prediccion = np.maximum(0, booster.predict(X[idx_fold])).round().astype(int)
+            predicciones[idx_fold] = prediccion
+            _registrar_fold(metricas, i, fecha_fold, modo, y[idx_fold], prediccion, booster.num_trees())
+
+        _imprimir_total_validacion(modo, y[es_val], predicciones[es_val])
+
+    # Entrenamiento final sobre el dataset completo (ya binned)
+    booster_final = lgb.train(params, dataset, num_boost_round=num_boost_round, categorical_feature=categoricas)
+    return booster_final, metricas
+
+
+def _rss_pico_mb():
+    """
+    Pico de memoria residente del proceso (MB), o None si no se puede medir (Windows).
+    """
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo informa en KB y macOS en bytes
+    return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+
+
+def guardar_historia_segmento(taller: int, segmento: str, df_train: pd.DataFrame, df_val: pd.DataFrame,
+                              df_test: pd.DataFrame, escritor=None):
+    """
+    Persiste la historia que usa la inferencia del taller (historial compacto o último registro por SKU).
+    Devuelve (historia, historial); historial es None sin FORECAST_HISTORIAL_COMPACTO.
+    """
+    TARGET = 'Cantidad'
+    historia = ultimo_registro_por_sku(df_test, segmento)
+    historial = None
+    if getattr(settings, "FORECAST_HISTORIAL_COMPACTO", True):
+        # Una fila por segmento con la ventana de ventas de cada SKU, en lugar de una fila ancha por SKU
+        ventas = pd.concat([d[['numero_pieza', 'fecha', TARGET]] for d in (df_train, df_val, df_test)])
+        historial = construir_historial(ventas, historia, segmento,
+                                        [c for c in historia.columns if es_columna_externa(c)])
+
+    if escritor is not None:
+        if historial is not None:
+            escritor.enviar(f"historial {segmento}", guardar_historial, taller, segmento, historial)
+        else:
+            escritor.enviar(f"registro {segmento}", guardar_ultimo_registro_a_db, df_test, segmento, taller,
+                            ultimo=historia)
+    else:
+        if historial is not None:
+            guardar_historial(taller, segmento, historial)
+        else:
+            guardar_ultimo_registro_a_db(df_test, segmento, taller_id=taller, ultimo=historia)
+    return historia, historial
+
+
+def _persistir_modelo(taller, segmento: str, modelo, ruta_guardado_modelo: str, metadata: dict, reentrenado: bool,
+                      escritor=None):
+    # Modelo nuevo: modelo + metadata; modelo reutilizado: solo la metadata (última evaluación)
+    ruta = ruta_metadata(taller, segmento, RUTA_BASE_MODELOS)
+    if escritor is not None:
+        if reentrenado:
+            escritor.enviar(f"modelo {segmento}", guardar_modelo, modelo, ruta_guardado_modelo, segmento, metadata)
+        else:
+            escritor.enviar(f"metadata {segmento}", guardar_metadata, ruta, metadata)
+    elif reentrenado:
+        guardar_modelo(modelo, ruta_guardado_modelo, segmento, metadata)
+    else:
+        guardar_metadata(ruta, metadata)
+
+
+def _evaluar_en_test(modelo, df_test: pd.DataFrame, features: list, target: str):
+    prediccion = np.maximum(0, modelo.predict(_matriz_float32(df_test, features))).round().astype(int)
+    metricas = _metricas(df_test[target], prediccion)
+    return metricas["mae"], metricas["rmse"]
+
+
+def train_segment_model(taller: int, segmento: str, formato: str = None, datos: dict = None, escritor=None,
+                        validacion: str = None, motor: str = None, reentrenar: bool = False,
+                        categoricas: list = None, guardar_historia: bool = True, modelo_global=None):
+    """
+    Carga datos preprocesados y entrena un modelo LightGBM para un segmento específico.
 
-                X_train, y_train = df_train_temp[features], df_train_temp[TARGET]
-                X_test, y_test = df_test_temp[features], df_test_temp[TARGET]
+    Si se pasan los splits en `datos` ({"train", "val", "test"}) no se lee nada de disco,
+    y con un `escritor` (EscritorAsincrono) el modelo y el último registro se persisten
+    en segundo plano. `validacion` es "rapida", "completa" o "ninguna" (ver validacion_rolling).
+    `motor` es "dataset" (lgb.Dataset único, ver entrenar_con_dataset) o "sklearn" (LGBMRegressor).
+    Si el modelo guardado sigue vigente (ver AI/metadata_modelos.py) se reutiliza y solo se actualiza
+    la historia; `reentrenar` fuerza el entrenamiento.
+    `categoricas` se agregan a las features (solo motor "dataset"); con `guardar_historia` False no se
+    persiste la historia de inferencia (modelo global: cada taller guarda la suya).
+    Con FORECAST_MODELO_GLOBAL el taller no entrena si hay modelo global del segmento (`modelo_global`
+    o el de models/global): solo se evalúa sobre su test y se guarda su historia.
+    Devuelve {"modelo", "historia", "historial", "validacion", "mae", "rmse", "reentrenado", "segundos",
+    "rss_pico_mb"} o None si no se pudo entrenar.
+    """
+    inicio = time.perf_counter()
+    if motor is None:
+        motor = getattr(settings, "FORECAST_MOTOR_ENTRENAMIENTO", "dataset")
+    if motor not in MOTORES_ENTRENAMIENTO:
+        raise ValueError(f"Motor de entrenamiento desconocido: '{motor}'. Opciones: {MOTORES_ENTRENAMIENTO}")
+    if categoricas and motor != "dataset":
+        raise ValueError("Las features categóricas solo se soportan con el motor 'dataset'.")
+    ruta_segmento_data = os.path.join(RUTA_BASE_MODELOS, str(taller), segmento)
 
-                if X_train.empty or X_test.empty:
-                    continue
+    if datos is None:
+        formato = detectar_formato(ruta_segmento_data, segmento, preferido=formato)
+        if formato is None:
+            print(f"Advertencia: No se encontraron todos los archivos de datos para el segmento '{segmento}'. Saltando.")
+            return None
+        origen = f"formato {formato}"
+    else:
+        origen = "en memoria"
 
-                lgb_model_val = lgb.LGBMRegressor(
-                    objective='regression_l1',
-                    metric='mae',
-                    random_state=42,
-                    n_jobs=-1,
-                    learning_rate=0.05,
-                    n_estimators=1000,
-                    max_depth=8
-                )
+    try:
+        print(f"\n--- INICIANDO ENTRENAMIENTO PARA EL SEGMENTO: '{segmento.upper()}' ({origen}, motor {motor}) ---")
+        if datos is None:
+            df_train = cargar_split(ruta_segmento_data, segmento, "train", formato)
+            df_val = cargar_split(ruta_segmento_data, segmento, "val", formato)
+            df_test = cargar_split(ruta_segmento_data, segmento, "test", formato)
+        else:
+            df_train, df_val, df_test = datos["train"], datos["val"], datos["test"]
 
-                lgb_model_val.fit(X_train, y_train,
-                                  eval_set=[(X_test, y_test)],
-                                  eval_metric='mae',
-                                  callbacks=[lgb.early_stopping(50, verbose=False)])
+        TARGET = 'Cantidad'
+        features = get_features_for_segment(segmento, df_train.columns) + list(categoricas or [])
 
-                y_pred_val = lgb_model_val.predict(X_test)
-                y_pred_clipped = np.maximum(0, y_pred_val).round().astype(int)
+        if TARGET not in df_train.columns or not features:
+            print(f"Error: No se encontraron las columnas necesarias en los archivos de datos para '{segmento}'.")
+            return
 
-                df_test_temp['pred'] = y_pred_clipped
-                all_val_predictions = pd.concat([all_val_predictions, df_test_temp], ignore_index=True)
+        if modelo_global is None and taller != TALLER_MODELO_GLOBAL and modelo_global_activo():
+            modelo_global = registro_modelos.obtener(TALLER_MODELO_GLOBAL, segmento)
+
+        # ¿Sirve el modelo guardado? Antigüedad y features primero, después el error sobre el test actual
+        modelo_previo = metadata_previa = None
+        if modelo_global is not None:
+            # El taller no entrena: se evalúa el modelo global sobre su test y se guarda su historia
+            motivo = None
+            features = _features_del_modelo(modelo_global)
+            # Columnas que el taller no tiene (p. ej. un externo nuevo) quedan en NaN
+            df_test_global = df_test.assign(taller_id=taller).reindex(columns=[*features, TARGET])
+            mae_previo, rmse_previo = _evaluar_en_test(modelo_global, df_test_global, features, TARGET)
+        elif reentrenar:
+            motivo = "reentrenamiento forzado"
+        else:
+            metadata_previa = cargar_metadata(taller, segmento, RUTA_BASE_MODELOS)
+            if metadata_previa is not None:
+                modelo_previo = registro_modelos.obtener(taller, segmento)
+            features_previas = _features_del_modelo(modelo_previo) if modelo_previo is not None else None
+            motivo = motivo_reentrenamiento(metadata_previa, features, features_previas)
+            if motivo is None:
+                mae_previo, rmse_previo = _evaluar_en_test(modelo_previo, df_test, features, TARGET)
+                motivo = motivo_reentrenamiento(metadata_previa, features, features_previas, mae_previo)
+        reentrenado = motivo is not None
+
+        if modelo_global is not None:
+            print(f"Se usa el modelo global de '{segmento}' (MAE test del taller {mae_previo:.2f}).")
+            lgb_final_model, metricas_validacion = modelo_global, []
+        elif not reentrenado:
+            print(f"Se reutiliza el modelo entrenado el {metadata_previa['entrenado'][:10]} "
+                  f"(MAE test actual {mae_previo:.2f}, al entrenar {metadata_previa['mae']:.2f}).")
+            lgb_final_model, metricas_validacion = modelo_previo, []
+        elif motor == "dataset":
+            print(f"Reentrenando: {motivo}.")
+            # Un solo lgb.Dataset float32 para la validación y el fit final
+            lgb_final_model, metricas_validacion = entrenar_con_dataset(
+                df_train, df_val, features, TARGET, modo=validacion, categoricas=categoricas
+            )
+            X_test = _matriz_float32(df_test, features)
         else:
-            print("Advertencia: No hay suficientes semanas para la validación. Saltando la validación.")
+            print(f"Reentrenando: {motivo}.")
+            # Validación (rolling forecast) semana a semana sobre val
+            metricas_validacion = validacion_rolling(df_train, df_val, features, TARGET, modo=validacion)
 
-        # Entrenamiento final
-        df_full_train = pd.concat([df_train, df_val]).copy()
-        X_full_train, y_full_train = df_full_train[features], df_full_train[TARGET]
+            # Entrenamiento final
+            df_full_train = pd.concat([df_train, df_val]).copy()
+            X_full_train, y_full_train = df_full_train[features], df_full_train[TARGET]
 
-        lgb_final_model = lgb.LGBMRegressor(
-            objective='regression_l1',
-            metric='mae',
-            random_state=42,
-            n_jobs=-1,
-            learning_rate=0.05,
-            n_estimators=1000,
-            max_depth=8
-        )
+            lgb_final_model = lgb.LGBMRegressor(**PARAMETROS_LGBM)
 
-        lgb_final_model.fit(X_full_train, y_full_train)
+            lgb_final_model.fit(X_full_train, y_full_train)
+            X_test = df_test[features]
 
         # Predicción en test
-        X_test, y_test = df_test[features], df_test[TARGET]
-        y_pred_test = lgb_final_model.predict(X_test)
-        y_pred_clipped_test = np.maximum(0, y_pred_test).round().astype(int)
+        if reentrenado:
+            y_test = df_test[TARGET]
+            y_pred_test = lgb_final_model.predict(X_test)
+            y_pred_clipped_test = np.maximum(0, y_pred_test).round().astype(int)
 
-        mae_final = mean_absolute_error(y_test, y_pred_clipped_test)
-        rmse_final = np.sqrt(mean_squared_error(y_test, y_pred_clipped_test))
+            mae_final = mean_absolute_error(y_test, y_pred_clipped_test)
+            rmse_final = np.sqrt(mean_squared_error(y_test, y_pred_clipped_test))
+        else:
+            mae_final, rmse_final = mae_previo, rmse_previo
 
         print(f"Error Absoluto Medio (MAE) Final: {mae_final:.2f}")
         print(f"Raíz del Error Cuadrático Medio (RMSE) Final: {rmse_final:.2f}")
@@ -250,50 +584,133 @@ def train_segment_model(taller: int, segmento: str):
         # Guardar modelo
         model_filename = f"modelo_lightgbm_{segmento}_final.pkl"
         ruta_guardado_modelo = os.path.join(ruta_segmento_data, model_filename)
-        joblib.dump(lgb_final_model, ruta_guardado_modelo)
-        print(f"Modelo final para '{segmento}' guardado en '{ruta_guardado_modelo}'.")
 
-        # Guardar resultados en DB
-        # Esto usará la función corregida con whitelisting
-        guardar_ultimo_registro_a_db(df_test, segmento, taller_id=taller)
+        # Con el modelo global no hay modelo ni metadata propia del taller que guardar
+        if modelo_global is None:
+            marca_agua = marca_agua_datos(df_train, df_val, df_test)
+            if reentrenado:
+                metadata = metadata_entrenamiento(marca_agua, features, motor, float(mae_final), float(rmse_final),
+                                                  metricas_validacion)
+            else:
+                metadata = {**metadata_previa, "ultima_evaluacion": {
+                    "fecha": timezone.now().isoformat(), "marca_agua": marca_agua,
+                    "mae": float(mae_final), "rmse": float(rmse_final),
+                }}
+                metadata.pop("version", None)
+            _persistir_modelo(taller, segmento, lgb_final_model, ruta_guardado_modelo, metadata, reentrenado, escritor)
+
+        # Guardar la historia de la inferencia (el último registro por SKU o el historial compacto)
+        historia = historial = None
+        if guardar_historia:
+            historia, historial = guardar_historia_segmento(taller, segmento, df_train, df_val, df_test, escritor)
 
     except Exception as e:
         print(f"Error durante el entrenamiento del segmento '{segmento}': {e}")
-        return
+        return None
 
     else:
-        # Solo si fue exitoso, eliminar archivos CSV
-        for ruta in [ruta_archivo_train, ruta_archivo_val, ruta_archivo_test]:
-            try:
-                os.remove(ruta)
-                print(f"Archivo '{ruta}' eliminado correctamente.")
-            except Exception as e:
-                print(f"No se pudo eliminar '{ruta}': {e}")
-
-
-def ejecutar_pipeline_entrenamiento(taller_id: int):
+        if datos is None:
+            # Solo si fue exitoso, eliminar los archivos de datos (se liberan antes los memmap)
+            del df_train, df_val, df_test
+            for parte in PARTES:
+                borrar_split(ruta_segmento_data, segmento, parte, formato)
+        segundos = round(time.perf_counter() - inicio, 2)
+        rss_pico_mb = _rss_pico_mb()
+        print(f"Segmento '{segmento}' entrenado en {segundos}s (RSS pico del proceso: {rss_pico_mb} MB).")
+        return {
+            "modelo": lgb_final_model,
+            "historia": historia,
+            "historial": historial,
+            "validacion": metricas_validacion,
+            "mae": float(mae_final),
+            "rmse": float(rmse_final),
+            "reentrenado": reentrenado,
+            "segundos": segundos,
+            "rss_pico_mb": rss_pico_mb,
+        }
+
+
+def ejecutar_pipeline_entrenamiento(taller_id: int, formato: str = None, splits: dict = None, escritor=None,
+                                    validacion: str = None, motor: str = None, reentrenar: bool = False,
+                                    modelos_globales: dict = None) -> dict:
     """
     Ejecuta el pipeline de entrenamiento para todos los segments de un taller.
+    Con `splits` (lo que devuelve ejecutar_preproceso) entrena desde memoria.
+    Cada segmento reutiliza su modelo mientras siga vigente, salvo con `reentrenar`.
+    `modelos_globales` ({segmento: modelo}) son modelos globales recién entrenados, aún no leídos de disco.
+    Devuelve {segmento: {"modelo", "historia", "historial", ...}} de los segmentos entrenados.
     """
 
     ruta_taller_output = os.path.join(RUTA_BASE_MODELOS, str(taller_id))
 
-    if not os.path.isdir(ruta_taller_output):
-        print(f"Error: No se encontró la carpeta del taller en '{ruta_taller_output}'.")
-        return
+    if splits is not None:
+        segmentos = [s for s in splits if s not in SEGMENTOS_NO_ENTRENABLES]
+    else:
+        if not os.path.isdir(ruta_taller_output):
+            print(f"Error: No se encontró la carpeta del taller en '{ruta_taller_output}'.")
+            return {}
 
-    # Se busca las carpetas de segmentos (excluyendo 'validacion', 'nuevo', 'sin_venta')
-    segmentos = [d for d in os.listdir(ruta_taller_output) if
-                 os.path.isdir(os.path.join(ruta_taller_output, d)) and d not in ['validacion', 'nuevo', 'sin_venta']]
+        # Se busca las carpetas de segmentos (excluyendo 'validacion', 'nuevo', 'sin_venta')
+        segmentos = [d for d in os.listdir(ruta_taller_output) if
+                     os.path.isdir(os.path.join(ruta_taller_output, d)) and d not in SEGMENTOS_NO_ENTRENABLES]
 
     if not segmentos:
         print(f"No se encontraron subcarpetas de segmentos entrenables en '{ruta_taller_output}'.")
-        return
+        return {}
 
+    entrenados = {}
     for segmento in segmentos:
-        train_segment_model(taller_id, segmento)
+        datos = splits.get(segmento) if splits is not None else None
+        resultado = train_segment_model(taller_id, segmento, formato=formato, datos=datos, escritor=escritor,
+                                        validacion=validacion, motor=motor, reentrenar=reentrenar,
+                                        modelo_global=(modelos_globales or {}).get(segmento))
+        if resultado is not None:
+            entrenados[segmento] = resultado
 
     print("\n--- PROCESO DE ENTRENAMIENTO COMPLETO ---")
+    return entrenados
+
+
+def apilar_splits(splits_por_taller: dict, segmento: str):
+    """
+    Junta los splits de `segmento` de todos los talleres ({taller_id: splits}) agregando la columna taller_id.
+    Devuelve {"train", "val", "test"} o None si ningún taller tiene el segmento.
+    """
+    partes = {"train": [], "val": [], "test": []}
+    for taller_id, splits in splits_por_taller.items():
+        datos = (splits or {}).get(segmento)
+        if not datos:
+            continue
+        for parte, dfs in partes.items():
+            dfs.append(datos[parte].assign(taller_id=taller_id))
+    if not partes["train"]:
+        return None
+    # Las columnas que falten en algún taller quedan en NaN
+    return {parte: pd.concat(dfs, ignore_index=True, sort=False) for parte, dfs in partes.items()}
+
+
+def ejecutar_entrenamiento_global(splits_por_taller: dict, escritor=None, validacion: str = None,
+                                  reentrenar: bool = False) -> dict:
+    """
+    Entrena un único modelo por segmento con los datos de todos los talleres (models/global/<segmento>),
+    con FEATURES_TALLER como categóricas. Sigue la misma política de reentrenamiento que los modelos por taller.
+    Devuelve {segmento: resultado de train_segment_model}.
+    """
+    segmentos = sorted({s for splits in splits_por_taller.values() for s in (splits or {})
+                        if s not in SEGMENTOS_NO_ENTRENABLES})
+    entrenados = {}
+    for segmento in segmentos:
+        datos = apilar_splits(splits_por_taller, segmento)
+        if datos is None:
+            continue
+        print(f"\nModelo global '{segmento}': {len(datos['train']) + len(datos['val'])} filas de "
+              f"{datos['train']['taller_id'].nunique()} talleres.")
+        resultado = train_segment_model(TALLER_MODELO_GLOBAL, segmento, datos=datos, escritor=escritor,
+                                        validacion=validacion, motor="dataset", reentrenar=reentrenar,
+                                        categoricas=FEATURES_TALLER, guardar_historia=False)
+        if resultado is not None:
+            entrenados[segmento] = resultado
+    return entrenados
 
 
 if __name__ == '__main__':
@@ -0,0 +1,137 @@
+# registro_modelos.py
+# -*- coding: utf-8 -*-
+"""
+Registro en memoria de los modelos LightGBM entrenados.
+
+Cada modelo vive en RUTA_BASE_MODELOS/<taller>/<segmento>/modelo_lightgbm_<segmento>_final.pkl.
+El registro lo deserializa una sola vez y lo mantiene en un LRU acotado entre talleres.
+Antes de devolver un modelo cacheado se compara el mtime/tamaño del archivo; si cambió
+(por ejemplo, porque se reentrenó) se calcula el hash y solo se recarga si el contenido es distinto.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import joblib
+from django.conf import settings
+
+RUTA_BASE_MODELOS = "models"
+
+# Con FORECAST_MODELO_GLOBAL los modelos compartidos por todos los talleres viven en models/global/<segmento>
+TALLER_MODELO_GLOBAL = "global"
+
+
+def ruta_modelo(taller_id: int, segmento: str, ruta_base: str = RUTA_BASE_MODELOS) -> str:
+    return os.path.join(ruta_base, str(taller_id), segmento, f"modelo_lightgbm_{segmento}_final.pkl")
+
+
+def modelo_global_activo() -> bool:
+    return getattr(settings, "FORECAST_MODELO_GLOBAL", False)
+
+
+def existe_modelo(taller_id: int, segmento: str, ruta_base: str = RUTA_BASE_MODELOS) -> bool:
+    """
+    Hay un modelo en disco para predecir el segmento del taller (el global, si está activo, o el del taller).
+    """
+    if modelo_global_activo() and os.path.isfile(ruta_modelo(TALLER_MODELO_GLOBAL, segmento, ruta_base)):
+        return True
+    return os.path.isfile(ruta_modelo(taller_id, segmento, ruta_base))
+
+
+def _hash_archivo(ruta: str) -> str:
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class RegistroModelos:
+    def __init__(self, max_modelos: int = 16, ruta_base: str = RUTA_BASE_MODELOS):
+        self.max_modelos = max_modelos
+        self.ruta_base = ruta_base
+        # ruta -> (modelo, (mtime_ns, tamaño), sha256)
+        self._modelos: "OrderedDict[str, Tuple[Any, Tuple[int, int], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recargas = 0
+        self.desalojos = 0
+        self.segundos_carga = 0.0
+
+    def obtener(self, taller_id: int, segmento: str) -> Optional[Any]:
+        """
+        Devuelve el modelo del segmento para el taller, o None si no hay modelo entrenado.
+        """
+        ruta = ruta_modelo(taller_id, segmento, self.ruta_base)
+        try:
+            st = os.stat(ruta)
+        except FileNotFoundError:
+            with self._lock:
+                self._modelos.pop(ruta, None)
+            return None
+        firma = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            cacheado = self._modelos.get(ruta)
+            if cacheado is not None:
+                modelo, firma_cache, sha_cache = cacheado
+                if firma_cache == firma:
+                    self._modelos.move_to_end(ruta)
+                    self.hits += 1
+                    return modelo
+
+                # El archivo se tocó: solo recargamos si el contenido cambió de verdad
+                sha = _hash_archivo(ruta)
+                if sha == sha_cache:
+                    self._modelos[ruta] = (modelo, firma, sha)
+                    self._modelos.move_to_end(ruta)
+                    self.hits += 1
+                    return modelo
+                self.recargas += 1
+            else:
+                sha = _hash_archivo(ruta)
+
+            self.misses += 1
+            inicio = time.perf_counter()
+            modelo = joblib.load(ruta)
+            self.segundos_carga += time.perf_counter() - inicio
+
+            self._modelos[ruta] = (modelo, firma, sha)
+            self._modelos.move_to_end(ruta)
+            while len(self._modelos) > self.max_modelos:
+                self._modelos.popitem(last=False)
+                self.desalojos += 1
+            return modelo
+
+    def invalidar(self, taller_id: Optional[int] = None):
+        """
+        Descarta los modelos cacheados (de un taller o todos).
+        """
+        with self._lock:
+            if taller_id is None:
+                self._modelos.clear()
+                return
+            prefijo = os.path.join(self.ruta_base, str(taller_id)) + os.sep
+            for ruta in [r for r in self._modelos if r.startswith(prefijo)]:
+                del self._modelos[ruta]
+
+    def estadisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "modelos_en_memoria": len(self._modelos),
+                "hits": self.hits,
+                "misses": self.misses,
+                "recargas": self.recargas,
+                "desalojos": self.desalojos,
+                "segundos_carga": round(self.segundos_carga, 3),
+            }
+
+
+# Registro compartido por todo el proceso (cada worker de forecast_all tiene el suyo)
+registro_modelos = RegistroModelos(max_modelos=getattr(settings, "FORECAST_MAX_MODELOS_EN_MEMORIA", 16))
@@ -0,0 +1,63 @@
+"""
+Escrituras en segundo plano (artefactos en disco y registros en DB) para el pipeline en memoria.
+
+Las etapas siguientes usan los datos que ya tienen en memoria, así que persistir
+los splits, el modelo y el último registro por SKU no necesita bloquear el pipeline.
+Al final del taller se llama a `esperar()` para asegurarse de que todo quedó escrito.
+"""
+from __future__ import annotations
+
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.db import connections
+
+
+def _ejecutar_con_conexion_propia(funcion: Callable, *args, **kwargs):
+    # Cada hilo usa su propia conexión de Django: se cierra al terminar la tarea
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+class EscritorAsincrono:
+    def __init__(self, max_workers: int = 2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="forecast-escritura")
+        self._pendientes: List[Tuple[str, Future]] = []
+
+    def enviar(self, descripcion: str, funcion: Callable, *args, **kwargs) -> Future:
+        futuro = self._pool.submit(_ejecutar_con_conexion_propia, funcion, *args, **kwargs)
+        self._pendientes.append((descripcion, futuro))
+        return futuro
+
+    def esperar(self) -> Dict[str, Any]:
+        """
+        Espera a que terminen todas las escrituras y cierra el pool.
+        Devuelve {"escrituras": n, "errores": [{"descripcion", "error"}], "segundos_espera": float}.
+        """
+        inicio = time.perf_counter()
+        errores = []
+        for descripcion, futuro in self._pendientes:
+            try:
+                futuro.result()
+            except Exception as e:
+                print(f"Error en escritura en segundo plano '{descripcion}': {e}")
+                errores.append({"descripcion": descripcion, "error": str(e)})
+        self._pool.shutdown(wait=True)
+
+        resumen = {
+            "escrituras": len(self._pendientes),
+            "errores": errores,
+            "segundos_espera": round(time.perf_counter() - inicio, 2),
+        }
+        self._pendientes = []
+        return resumen
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.esperar()
+        return False
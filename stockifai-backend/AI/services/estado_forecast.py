@@ -0,0 +1,102 @@
+"""
+Detección de cambios entre corridas de forecast de un taller.
+
+Después de cada corrida exitosa se guarda en models/<taller>/forecast_estado.json la marca de agua
+de los movimientos del taller y la huella de los datos externos usados. En la corrida siguiente:
+  - si cambiaron los EGRESOS o los datos externos -> corrida completa (preproceso + entrenamiento + inferencia)
+  - si no cambiaron pero es otra semana (fecha_lunes) -> solo inferencia con los modelos guardados
+  - si no cambió nada -> se omite (las alertas se recalculan solo si cambiaron otros movimientos o el stock)
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Optional
+
+from django.utils import timezone
+
+from AI.registro_modelos import RUTA_BASE_MODELOS, existe_modelo
+from d_externo.repositories.dataexterna import huellas_datos_externos
+from inventario.repositories.movimiento_repo import MovimientoRepo
+from inventario.repositories.stock_repo import StockRepo
+
+ARCHIVO_ESTADO_FORECAST = "forecast_estado.json"
+VERSION_ESTADO_FORECAST = 1
+
+ACCION_COMPLETO = "completo"
+ACCION_INFERENCIA = "inferencia"
+ACCION_OMITIR = "omitir"
+
+
+def huella_actual(taller_id: int) -> dict:
+    marca = MovimientoRepo().marca_agua_taller(taller_id)
+    return {
+        "egresos": marca["egresos"],
+        "movimientos": marca["movimientos"],
+        "stock": StockRepo().huella_stock_taller(taller_id),
+        "externos": huellas_datos_externos(),
+    }
+
+
+def cargar_estado(taller_id: int, output_dir_base: str = RUTA_BASE_MODELOS) -> Optional[dict]:
+    ruta = os.path.join(output_dir_base, str(taller_id), ARCHIVO_ESTADO_FORECAST)
+    if not os.path.isfile(ruta):
+        return None
+    try:
+        with open(ruta, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"No se pudo leer el estado de forecast '{ruta}': {e}")
+        return None
+    if estado.get("version") != VERSION_ESTADO_FORECAST:
+        return None
+    return estado
+
+
+def guardar_estado(taller_id: int, fecha_lunes: str, huella: dict, segmentos: list,
+                   output_dir_base: str = RUTA_BASE_MODELOS):
+    ruta_taller = os.path.join(output_dir_base, str(taller_id))
+    os.makedirs(ruta_taller, exist_ok=True)
+    estado = {
+        "version": VERSION_ESTADO_FORECAST,
+        "fecha_lunes": fecha_lunes,
+        "segmentos": list(segmentos),
+        "huella": huella,
+        "actualizado": timezone.now().isoformat(),
+    }
+    ruta = os.path.join(ruta_taller, ARCHIVO_ESTADO_FORECAST)
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2)
+    os.replace(temporal, ruta)
+
+
+def _modelos_disponibles(taller_id: int, segmentos: list, output_dir_base: str) -> bool:
+    return bool(segmentos) and all(existe_modelo(taller_id, segmento, output_dir_base) for segmento in segmentos)
+
+
+def decidir_accion(taller_id: int, fecha_lunes: str, huella: dict, estado: Optional[dict],
+                   output_dir_base: str = RUTA_BASE_MODELOS) -> str:
+    """
+    Devuelve ACCION_COMPLETO, ACCION_INFERENCIA u ACCION_OMITIR comparando `huella` con la última corrida.
+    """
+    if estado is None:
+        return ACCION_COMPLETO
+
+    anterior = estado.get("huella") or {}
+    if anterior.get("egresos") != huella["egresos"] or anterior.get("externos") != huella["externos"]:
+        return ACCION_COMPLETO
+    # Sin modelos guardados no se puede inferir: se vuelve a entrenar
+    if not _modelos_disponibles(taller_id, estado.get("segmentos") or [], output_dir_base):
+        return ACCION_COMPLETO
+    if estado.get("fecha_lunes") != fecha_lunes:
+        return ACCION_INFERENCIA
+    return ACCION_OMITIR
+
+
+def cambiaron_movimientos(huella: dict, estado: Optional[dict]) -> bool:
+    # Cualquier movimiento o cambio de stock (también los que no dejan Movimiento) afecta las alertas
+    if estado is None:
+        return True
+    anterior = estado.get("huella") or {}
+    return anterior.get("movimientos") != huella["movimientos"] or anterior.get("stock") != huella["stock"]
@@ -0,0 +1,153 @@
+"""
+Ejecución del forecast de varios talleres en paralelo, cada uno en su propio proceso.
+El límite de tiempo por taller lo controla el proceso padre, que termina al hijo que lo supera
+(una señal dentro del worker no puede cortar LightGBM ni otras llamadas en C).
+
+Este módulo se importa dentro de los procesos worker ANTES de configurar Django,
+por eso no importa nada del proyecto a nivel de módulo (ni pandas ni LightGBM):
+así el inicializador puede fijar los hilos de OpenMP antes de que se cargue LightGBM.
+"""
+from __future__ import annotations
+
+import importlib
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class TallerTimeoutError(Exception):
+    ...
+
+
+def _terminar(proceso):
+    proceso.terminate()
+    proceso.join(10)
+    if proceso.is_alive():
+        proceso.kill()
+        proceso.join()
+
+
+def ejecutar_en_procesos(
+        tareas: List[Tuple[Any, str, tuple]],
+        max_workers: int,
+        timeout: Optional[int] = None,
+        hilos_por_worker: Optional[int] = None,
+) -> Dict[Any, Tuple[bool, Any, float]]:
+    """
+    Corre cada tarea (clave, "modulo.funcion", args) en su propio proceso (spawn), hasta `max_workers`
+    a la vez. La función va por nombre: se importa en el hijo después de configurar Django.
+    El límite de tiempo lo controla este proceso: la tarea que supera `timeout` segundos se termina
+    (terminate/kill) sin afectar a las demás; lo que no llegó a confirmar en la DB se descarta.
+    Devuelve {clave: (ok, resultado o mensaje de error, segundos)}.
+    """
+    if hilos_por_worker is None:
+        hilos_por_worker = max(1, (os.cpu_count() or 1) // max_workers)
+    # spawn y no fork: LightGBM/OpenMP no soportan fork con hilos ya creados
+    contexto = multiprocessing.get_context("spawn")
+
+    pendientes = list(tareas)
+    corriendo: Dict[Any, Tuple[Any, Any, float]] = {}  # receptor -> (clave, proceso, inicio)
+    resultados: Dict[Any, Tuple[bool, Any, float]] = {}
+    try:
+        while pendientes or corriendo:
+            while pendientes and len(corriendo) < max_workers:
+                clave, funcion, args = pendientes.pop(0)
+                receptor, emisor = contexto.Pipe(duplex=False)
+                proceso = contexto.Process(target=_ejecutar_en_hijo,
+                                           args=(emisor, hilos_por_worker, funcion, args))
+                proceso.start()
+                emisor.close()
+                corriendo[receptor] = (clave, proceso, time.monotonic())
+
+            espera = None
+            if timeout:
+                ahora = time.monotonic()
+                espera = max(0.0, min(inicio + timeout - ahora for _, _, inicio in corriendo.values()))
+            for receptor in wait(list(corriendo), timeout=espera):
+                clave, proceso, inicio = corriendo.pop(receptor)
+                try:
+                    ok, valor = receptor.recv()
+                except EOFError:
+                    # El proceso murió sin responder (p. ej. lo mató el sistema por falta de memoria)
+                    proceso.join()
+                    ok, valor = False, f"El proceso terminó sin resultado (código {proceso.exitcode})"
+                receptor.close()
+                proceso.join()
+                resultados[clave] = (ok, valor, round(time.monotonic() - inicio, 2))
+
+            if timeout:
+                ahora = time.monotonic()
+                for receptor, (clave, proceso, inicio) in list(corriendo.items()):
+                    if ahora - inicio >= timeout:
+                        _terminar(proceso)
+                        receptor.close()
+                        del corriendo[receptor]
+                        resultados[clave] = (False, f"Tiempo límite excedido ({timeout}s)", round(ahora - inicio, 2))
+    finally:
+        # Corte inesperado (Ctrl+C): no quedan procesos huérfanos
+        for receptor, (_, proceso, _) in corriendo.items():
+            _terminar(proceso)
+            receptor.close()
+    return resultados
+
+
+def _ejecutar_en_hijo(emisor, hilos_por_worker: int, funcion: str, args: tuple):
+    _inicializar_worker(hilos_por_worker)
+    from django.db import connections
+    try:
+        modulo, nombre = funcion.rsplit(".", 1)
+        emisor.send((True, getattr(importlib.import_module(modulo), nombre)(*args)))
+    except Exception as e:
+        emisor.send((False, str(e)))
+    finally:
+        connections.close_all()
+        emisor.close()
+
+
+def _inicializar_worker(hilos_por_worker: int):
+    # LightGBM usa n_jobs=-1: sin esto cada worker intentaría usar todos los cores
+    os.environ["OMP_NUM_THREADS"] = str(hilos_por_worker)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockifai.settings")
+
+    import django
+    django.setup()
+
+    # Cada worker abre sus propias conexiones (nunca se comparten sockets con el padre)
+    from django.db import connections
+    connections.close_all()
+
+
+def _ejecutar_taller_en_worker(taller_id: int, fecha_lunes, forzar: bool = False) -> Dict[str, Any]:
+    from AI.services.forecast_pipeline import ejecutar_forecast_y_alertas_taller
+
+    out = ejecutar_forecast_y_alertas_taller(taller_id, fecha_lunes, forzar=forzar)
+    return {"accion": out.get("accion")}
+
+
+def ejecutar_talleres_en_paralelo(
+        taller_ids: List[int],
+        fecha_lunes,
+        max_workers: int,
+        timeout_por_taller: Optional[int] = None,
+        forzar: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Corre forecast + alertas de cada taller en su propio proceso, hasta `max_workers` a la vez.
+    Devuelve un resultado por taller, en el mismo orden que `taller_ids`:
+        {"taller_id": ..., "ok": bool, "accion": str, "segundos": float, "error": str (solo si falló)}
+    """
+    tareas = [(taller_id, f"{__name__}._ejecutar_taller_en_worker", (taller_id, fecha_lunes, forzar))
+              for taller_id in taller_ids]
+    por_taller = ejecutar_en_procesos(tareas, max_workers, timeout_por_taller)
+
+    resultados = []
+    for taller_id in taller_ids:
+        ok, valor, segundos = por_taller[taller_id]
+        resultado = {"taller_id": taller_id, "ok": ok, "segundos": segundos}
+        resultado.update(valor if ok else {"error": valor})
+        estado = "OK" if ok else f"ERROR ({valor})"
+        print(f"[forecast] Taller {taller_id}: {estado} en {segundos}s")
+        resultados.append(resultado)
+    return resultados
@@ -1,55 +1,362 @@
 from __future__ import annotations
+import os
+import time
 from datetime import datetime, date, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Callable, Dict, Any, Optional, List
 
-from AI.historicos import ejecutar_preproceso
-from AI.model_training import ejecutar_pipeline_entrenamiento
+import pandas as pd
+from django.conf import settings
+from django.db import connections
+
+from AI.artefactos import FORMATO_NPY, PARTES, cargar_split
+from AI.historicos import datos_externos_cacheados, ejecutar_preproceso
+from AI.model_training import SEGMENTOS_NO_ENTRENABLES, ejecutar_entrenamiento_global, ejecutar_pipeline_entrenamiento
 from AI.inferencia import ejecutar_inferencia
+from AI.registro_modelos import existe_modelo, modelo_global_activo
+from AI.services.escritura_asincrona import EscritorAsincrono
+from AI.services.estado_forecast import (
+    ACCION_COMPLETO,
+    ACCION_INFERENCIA,
+    ACCION_OMITIR,
+    cambiaron_movimientos,
+    cargar_estado,
+    decidir_accion,
+    guardar_estado,
+    huella_actual,
+)
+from AI.services.forecast_paralelo import ejecutar_en_procesos, ejecutar_talleres_en_paralelo
 from catalogo.models import RepuestoTaller
 from inventario.repositories.repuesto_taller_repo import RepuestoTallerRepo
 from inventario.services.actualizar_alertas import actualizar_alertas_para_repuestos
 from user.api.models.models import Taller
 
 
-def ejecutar_forecast_pipeline_por_taller(taller_id: int, fecha_lunes: datetime) -> Dict[str, Any]:
+def _sin_progreso(etapa: str):
+    pass
+
+
+def _inferir_entrenados(taller_id: int, fecha_lunes: str, entrenados: dict):
+    # Inferencia con lo que acaba de dejar el entrenamiento en memoria (modelos e historia)
+    if entrenados:
+        historia = pd.concat([r["historia"] for r in entrenados.values()], ignore_index=True)
+        modelos = {segmento: r["modelo"] for segmento, r in entrenados.items()}
+        historiales = {segmento: r["historial"] for segmento, r in entrenados.items()
+                       if r.get("historial") is not None}
+        ejecutar_inferencia(taller_id=taller_id, fecha_prediccion_str=fecha_lunes,
+                            historia=historia, modelos=modelos, historiales=historiales or None)
+    else:
+        # Sin modelos nuevos: se usa lo último persistido, igual que el modo por archivos
+        ejecutar_inferencia(taller_id=taller_id, fecha_prediccion_str=fecha_lunes)
+
+
+def _segmentos_fallidos(segmentos: list, entrenados: dict) -> list:
+    # train_segment_model devuelve None (y no queda en `entrenados`) si el segmento no se pudo entrenar
+    return [s for s in segmentos if s not in SEGMENTOS_NO_ENTRENABLES and s not in (entrenados or {})]
+
+
+def _guardar_estado_corrida(taller_id: int, fecha_lunes: str, huella: Optional[dict], segmentos: list,
+                            entrenados: dict):
+    if huella is None:
+        return
+    fallidos = _segmentos_fallidos(segmentos, entrenados)
+    if fallidos:
+        # Sin estado guardado la próxima corrida vuelve a ser completa y reintenta esos segmentos
+        print(f"Segmentos sin entrenar {fallidos}: no se guarda el estado de la corrida.")
+        return
+    # Solo los segmentos con modelo en disco sirven para una corrida de solo inferencia
+    segmentos = [s for s in segmentos if existe_modelo(taller_id, s, "models")]
+    guardar_estado(taller_id, fecha_lunes, huella, segmentos, "models")
+
+
+def ejecutar_forecast_pipeline_por_taller(taller_id: int, fecha_lunes: datetime,
+                                          en_memoria: Optional[bool] = None,
+                                          progreso: Optional[Callable[[str], None]] = None,
+                                          forzar: bool = False) -> Dict[str, Any]:
+    """
+    Preproceso -> entrenamiento -> inferencia de un taller.
+    En modo en memoria cada etapa le pasa sus resultados a la siguiente sin releerlos
+    de disco/DB, y los artefactos (splits, modelo, último registro) se escriben en segundo plano.
+    `progreso` se llama con el nombre de cada etapa al empezarla ("preproceso", "entrenamiento", "inferencia").
+
+    Con FORECAST_DETECTAR_CAMBIOS (y sin `forzar`) se compara contra la última corrida
+    (ver AI/services/estado_forecast.py): si no hubo egresos ni datos externos nuevos se hace
+    solo la inferencia, o nada si además es la misma semana. result["accion"] indica qué se hizo.
+    """
     fecha_lunes = _normalize_fecha_lunes(fecha_lunes)
+    if en_memoria is None:
+        en_memoria = getattr(settings, "FORECAST_PIPELINE_EN_MEMORIA", True)
+    if progreso is None:
+        progreso = _sin_progreso
 
     result: Dict[str, Any] = {"taller_id": taller_id, "fecha_lunes": fecha_lunes}
 
-    print(f"\n--- PASO 1: Preproceso - Taller: {taller_id} ---")
-    pp = ejecutar_preproceso(taller_id=taller_id, output_dir_base="models")
-    result["preprocess"] = {"segmentos": list(pp.keys()) if pp else []}
+    huella = None
+    accion = ACCION_COMPLETO
+    if getattr(settings, "FORECAST_DETECTAR_CAMBIOS", True) and not forzar:
+        huella = huella_actual(taller_id)
+        estado = cargar_estado(taller_id, "models")
+        accion = decidir_accion(taller_id, fecha_lunes, huella, estado, "models")
+        result["actualizar_alertas"] = accion != ACCION_OMITIR or cambiaron_movimientos(huella, estado)
+    result["accion"] = accion
+
+    if accion == ACCION_OMITIR:
+        print(f"\n--- Taller {taller_id}: sin cambios desde la última corrida ({fecha_lunes}), se omite ---")
+        if result["actualizar_alertas"]:
+            # Hubo movimientos que no son egresos: se registran para no recalcular alertas otra vez
+            guardar_estado(taller_id, fecha_lunes, huella, estado.get("segmentos") or [], "models")
+        return result
 
-    print("\n--- PASO 2: Entrenando modelos ---")
-    ejecutar_pipeline_entrenamiento(taller_id)
+    if accion == ACCION_INFERENCIA:
+        progreso("inferencia")
+        print(f"\n--- Taller {taller_id}: sin egresos ni datos externos nuevos, solo inferencia ---")
+        ejecutar_inferencia(taller_id=taller_id, fecha_prediccion_str=fecha_lunes)
+        guardar_estado(taller_id, fecha_lunes, huella, estado.get("segmentos") or [], "models")
+        print(f"\n--- Fin del forecasting - Taller: {taller_id} ---")
+        return result
 
-    print("\n--- PASO 3: Realizando inferencias ---")
-    ejecutar_inferencia(taller_id=taller_id, fecha_prediccion_str=fecha_lunes)
+    if not en_memoria:
+        progreso("preproceso")
+        print(f"\n--- PASO 1: Preproceso - Taller: {taller_id} ---")
+        pp = ejecutar_preproceso(taller_id=taller_id, output_dir_base="models")
+        result["preprocess"] = {"segmentos": list(pp.keys()) if pp else []}
 
+        progreso("entrenamiento")
+        print("\n--- PASO 2: Entrenando modelos ---")
+        entrenados = ejecutar_pipeline_entrenamiento(taller_id, reentrenar=forzar)
+
+        progreso("inferencia")
+        print("\n--- PASO 3: Realizando inferencias ---")
+        ejecutar_inferencia(taller_id=taller_id, fecha_prediccion_str=fecha_lunes)
+
+        _guardar_estado_corrida(taller_id, fecha_lunes, huella, result["preprocess"]["segmentos"], entrenados)
+        print(f"\n--- Fin del forecasting - Taller: {taller_id} ---")
+        return result
+
+    escritor = EscritorAsincrono()
+    try:
+        progreso("preproceso")
+        print(f"\n--- PASO 1: Preproceso (en memoria) - Taller: {taller_id} ---")
+        pp = ejecutar_preproceso(taller_id=taller_id, output_dir_base="models", escritor=escritor)
+        result["preprocess"] = {"segmentos": list(pp.keys()) if pp else []}
+
+        progreso("entrenamiento")
+        print("\n--- PASO 2: Entrenando modelos (en memoria) ---")
+        entrenados = ejecutar_pipeline_entrenamiento(taller_id, splits=pp or {}, escritor=escritor,
+                                                     reentrenar=forzar)
+
+        progreso("inferencia")
+        print("\n--- PASO 3: Realizando inferencias ---")
+        _inferir_entrenados(taller_id, fecha_lunes, entrenados)
+    finally:
+        escrituras = escritor.esperar()
+    print(f"Escrituras en segundo plano: {escrituras['escrituras']} "
+          f"(errores: {len(escrituras['errores'])}, espera final {escrituras['segundos_espera']}s)")
+    result["escrituras"] = escrituras
+
+    # Si alguna escritura falló los artefactos en disco no son confiables: la próxima corrida es completa
+    if not escrituras["errores"]:
+        _guardar_estado_corrida(taller_id, fecha_lunes, huella, result["preprocess"]["segmentos"], entrenados)
     print(f"\n--- Fin del forecasting - Taller: {taller_id} ---")
     return result
 
 
-def ejecutar_forecast_talleres(fecha_lunes: datetime) -> Dict[str, Any]:
-    ids: list[int] = list(Taller.objects.values_list("id", flat=True))
-    outputs: List[Dict[str, Any]] = []
-    errores: List[Dict[str, Any]] = []
+def ejecutar_forecast_y_alertas_taller(taller_id: int, fecha_lunes: datetime,
+                                       progreso: Optional[Callable[[str], None]] = None,
+                                       forzar: bool = False) -> Dict[str, Any]:
+    out = ejecutar_forecast_pipeline_por_taller(taller_id, fecha_lunes, progreso=progreso, forzar=forzar)
+    if not out.get("actualizar_alertas", True):
+        print(f"Taller {taller_id}: sin movimientos nuevos, no se recalculan alertas.")
+        return out
+
+    if progreso is not None:
+        progreso("alertas")
+    # obtener todos los repuestos taller
+    repuestos_taller_ids = RepuestoTaller.objects.filter(taller_id=taller_id)
+
+    # llamar a generar actualizar alertas
+    actualizar_alertas_para_repuestos(repuestos_taller_ids)
+    return out
+
 
+def _algun_taller_con_cambios(ids: List[int], fecha_lunes: str) -> bool:
+    # Con el modelo global el entrenamiento es uno para todos: basta que un taller tenga cambios
     for taller_id in ids:
+        estado = cargar_estado(taller_id, "models")
+        if decidir_accion(taller_id, fecha_lunes, huella_actual(taller_id), estado, "models") == ACCION_COMPLETO:
+            return True
+    return False
+
+
+def _preprocesar_taller_global(taller_id: int, detectar_cambios: bool) -> Dict[str, Any]:
+    """
+    Preproceso de un taller para el modelo global (corre en un worker o en este proceso).
+    Los splits quedan en disco en formato npy; solo se devuelve la huella y los segmentos.
+    """
+    # La huella se toma antes de leer los datos: lo que llegue durante la corrida se ve en la próxima
+    huella = huella_actual(taller_id) if detectar_cambios else None
+    pp = ejecutar_preproceso(taller_id=taller_id, output_dir_base="models", formato=FORMATO_NPY) or {}
+    return {"huella": huella, "segmentos": list(pp)}
+
+
+def _cargar_splits_global(taller_id: int, segmentos: list) -> dict:
+    # Con memmap: los splits de todos los talleres no quedan copiados en memoria a la vez
+    splits = {}
+    for segmento in segmentos:
+        if segmento in SEGMENTOS_NO_ENTRENABLES:
+            continue
+        ruta_segmento = os.path.join("models", str(taller_id), segmento)
+        splits[segmento] = {parte: cargar_split(ruta_segmento, segmento, parte, FORMATO_NPY) for parte in PARTES}
+    return splits
+
+
+def _preparar_workers():
+    if getattr(settings, "FORECAST_CACHE_EXTERNOS", True):
+        # Los workers leen los datos externos de la cache en disco en lugar de consultarlos cada uno
         try:
-            out = ejecutar_forecast_pipeline_por_taller(taller_id, fecha_lunes)
-            outputs.append({"taller_id": taller_id})
+            datos_externos_cacheados("models")
+        except Exception as e:
+            print(f"No se pudieron precalcular los datos externos (cada worker los calculará): {e}")
+    # Las conexiones del proceso padre no deben quedar abiertas mientras trabajan los workers
+    connections.close_all()
 
-            # obtener todos los repuestos taller
-            repuestos_taller_ids = RepuestoTaller.objects.filter(taller_id=taller_id)
 
-            # llamar a generar actualizar alertas
-            actualizar_alertas_para_repuestos(repuestos_taller_ids)
+def ejecutar_forecast_global(ids: List[int], fecha_lunes: datetime, forzar: bool = False,
+                             max_workers: int = 1, timeout_por_taller: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Forecast de todos los talleres con un modelo por segmento compartido (FORECAST_MODELO_GLOBAL):
+      1. preproceso de cada taller; con `max_workers` > 1 o `timeout_por_taller` en procesos aparte
+         (ver ejecutar_en_procesos). Los splits quedan en disco (npy) y acá se abren con memmap
+      2. un entrenamiento por segmento sobre los splits apilados de todos los talleres (models/global)
+      3. por taller: historia, inferencia con el modelo global y alertas. Corre en este proceso, uno detrás
+         de otro, con los modelos recién entrenados: `timeout_por_taller` no aplica a este paso
+    Se preprocesan todos los talleres, aunque solo algunos tengan cambios: el modelo global necesita los
+    datos de todos (ejecutar_forecast_talleres ni la llama si ningún taller tiene cambios).
+    Devuelve un resultado por taller con el mismo formato que ejecutar_talleres_en_paralelo.
+    """
+    fecha_lunes = _normalize_fecha_lunes(fecha_lunes)
+    resultados: Dict[int, Dict[str, Any]] = {}
+    splits_por_taller: Dict[int, dict] = {}
+    huellas: Dict[int, Optional[dict]] = {}
+    detectar_cambios = getattr(settings, "FORECAST_DETECTAR_CAMBIOS", True) and not forzar
 
+    print("\n--- PASO 1: Preproceso de todos los talleres (modelo global) ---")
+    if (max_workers > 1 and len(ids) > 1) or timeout_por_taller:
+        _preparar_workers()
+        tareas = [(taller_id, f"{__name__}._preprocesar_taller_global", (taller_id, detectar_cambios))
+                  for taller_id in ids]
+        preprocesados = ejecutar_en_procesos(tareas, max_workers, timeout_por_taller)
+    else:
+        preprocesados = {}
+        for taller_id in ids:
+            inicio = time.perf_counter()
+            try:
+                preprocesados[taller_id] = (True, _preprocesar_taller_global(taller_id, detectar_cambios),
+                                            round(time.perf_counter() - inicio, 2))
+            except Exception as e:
+                preprocesados[taller_id] = (False, str(e), round(time.perf_counter() - inicio, 2))
 
+    for taller_id in ids:
+        ok, valor, segundos = preprocesados[taller_id]
+        resultados[taller_id] = {"taller_id": taller_id, "ok": ok, "segundos": segundos}
+        if not ok:
+            resultados[taller_id]["error"] = valor
+            continue
+        try:
+            splits_por_taller[taller_id] = _cargar_splits_global(taller_id, valor["segmentos"])
         except Exception as e:
-            # no frenamos toda la corrida por un taller
-            errores.append({"taller_id": taller_id, "error": str(e)})
+            resultados[taller_id].update({"ok": False, "error": str(e)})
+            continue
+        huellas[taller_id] = valor["huella"]
+        resultados[taller_id].update({"accion": "global", "segmentos": valor["segmentos"]})
+
+    escritor = EscritorAsincrono()
+    try:
+        print("\n--- PASO 2: Entrenando los modelos globales ---")
+        globales = ejecutar_entrenamiento_global(splits_por_taller, escritor=escritor, reentrenar=forzar)
+        modelos_globales = {segmento: r["modelo"] for segmento, r in globales.items()}
+
+        print("\n--- PASO 3: Inferencia y alertas por taller ---")
+        for taller_id in ids:
+            if not resultados[taller_id]["ok"]:
+                continue
+            inicio = time.perf_counter()
+            try:
+                # Sin modelo global para un segmento (muy pocos datos) el taller entrena el suyo
+                entrenados = ejecutar_pipeline_entrenamiento(taller_id, splits=splits_por_taller.pop(taller_id),
+                                                             escritor=escritor, reentrenar=forzar,
+                                                             modelos_globales=modelos_globales)
+                _inferir_entrenados(taller_id, fecha_lunes, entrenados)
+                resultados[taller_id]["entrenados"] = dict.fromkeys(entrenados)
+                actualizar_alertas_para_repuestos(RepuestoTaller.objects.filter(taller_id=taller_id))
+            except Exception as e:
+                resultados[taller_id].update({"ok": False, "error": str(e)})
+            resultados[taller_id]["segundos"] = round(resultados[taller_id]["segundos"] + time.perf_counter() - inicio, 2)
+    finally:
+        escrituras = escritor.esperar()
+    print(f"Escrituras en segundo plano: {escrituras['escrituras']} "
+          f"(errores: {len(escrituras['errores'])}, espera final {escrituras['segundos_espera']}s)")
+
+    # Con los modelos ya en disco, cada taller queda registrado para la detección de cambios
+    for taller_id in ids:
+        segmentos = resultados[taller_id].pop("segmentos", [])
+        entrenados = resultados[taller_id].pop("entrenados", {})
+        if resultados[taller_id]["ok"] and not escrituras["errores"]:
+            _guardar_estado_corrida(taller_id, fecha_lunes, huellas.get(taller_id), segmentos, entrenados)
+    return [resultados[taller_id] for taller_id in ids]
+
+
+def ejecutar_forecast_talleres(
+        fecha_lunes: datetime,
+        max_workers: Optional[int] = None,
+        timeout_por_taller: Optional[int] = None,
+        forzar: bool = False,
+        taller_ids: Optional[List[int]] = None,
+) -> Dict[str, Any]:
+    """
+    Corre el forecast de todos los talleres (o de `taller_ids`).
+    Con max_workers > 1 los talleres se procesan en un pool de procesos
+    (ver AI/services/forecast_paralelo.py); si no, uno detrás de otro.
+    Con `forzar` se reentrena todo aunque un taller no tenga cambios desde la última corrida.
+    Con FORECAST_MODELO_GLOBAL se entrena un modelo por segmento para todos (ver ejecutar_forecast_global),
+    salvo que ningún taller tenga cambios: ahí cada taller hace solo inferencia (o nada), como sin modelo global.
+    """
+    if max_workers is None:
+        max_workers = getattr(settings, "FORECAST_MAX_WORKERS", 1)
+    if timeout_por_taller is None:
+        timeout_por_taller = getattr(settings, "FORECAST_TIMEOUT_POR_TALLER", None)
+
+    ids: list[int] = list(taller_ids) if taller_ids is not None else list(Taller.objects.values_list("id", flat=True))
+    outputs: List[Dict[str, Any]] = []
+    errores: List[Dict[str, Any]] = []
+
+    global_con_cambios = modelo_global_activo() and (
+        forzar or not getattr(settings, "FORECAST_DETECTAR_CAMBIOS", True) or _algun_taller_con_cambios(ids, _normalize_fecha_lunes(fecha_lunes)))
+    if global_con_cambios:
+        # Un modelo por segmento para todos
+        resultados = ejecutar_forecast_global(ids, fecha_lunes, forzar, max_workers, timeout_por_taller)
+    elif (max_workers > 1 and len(ids) > 1) or timeout_por_taller:
+        # Con límite de tiempo cada taller corre en un proceso aparte (aunque sea de a uno)
+        # para poder terminarlo desde acá. Con modelo global y sin cambios en ningún taller
+        # también se sigue este camino: cada uno hace solo inferencia (o nada)
+        _preparar_workers()
+        resultados = ejecutar_talleres_en_paralelo(ids, fecha_lunes, max_workers, timeout_por_taller, forzar)
+    else:
+        resultados = []
+        for taller_id in ids:
+            inicio = time.perf_counter()
+            try:
+                out = ejecutar_forecast_y_alertas_taller(taller_id, fecha_lunes, forzar=forzar)
+                resultados.append({"taller_id": taller_id, "ok": True, "accion": out.get("accion")})
+            except Exception as e:
+                # no frenamos toda la corrida por un taller
+                resultados.append({"taller_id": taller_id, "ok": False, "error": str(e)})
+            resultados[-1]["segundos"] = round(time.perf_counter() - inicio, 2)
+
+    for r in resultados:
+        if r["ok"]:
+            outputs.append({"taller_id": r["taller_id"], "accion": r.get("accion"), "segundos": r["segundos"]})
+        else:
+            errores.append({"taller_id": r["taller_id"], "error": r["error"], "segundos": r["segundos"]})
 
     return {"fecha_lunes": fecha_lunes, "talleres": ids, "ok": outputs, "errores": errores}
 
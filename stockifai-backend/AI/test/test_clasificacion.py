@@ -0,0 +1,67 @@
+import os
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from AI.historicos import clasificar_demanda
+
+
+def _demanda_sintetica(n_skus: int, n_semanas: int = 156, seed: int = 0) -> pd.DataFrame:
+    """
+    Demanda semanal (numero_pieza, fecha, Cantidad) con SKUs de distinto patrón:
+    frecuentes, intermitentes, sin venta, nuevos y otros que dejaron de venderse.
+    """
+    rng = np.random.default_rng(seed)
+    fechas = pd.date_range("2021-01-04", periods=n_semanas, freq="W-MON")
+
+    inicio = rng.integers(0, n_semanas, size=n_skus)
+    fin = np.minimum(n_semanas, inicio + rng.integers(1, n_semanas, size=n_skus))
+    tasa = rng.choice([0.0, 0.05, 0.3, 2.0], size=n_skus)
+
+    largos = fin - inicio
+    sku = np.repeat(np.arange(n_skus), largos)
+    semana = np.arange(largos.sum()) - np.repeat(np.cumsum(largos) - largos, largos) + np.repeat(inicio, largos)
+    cantidad = rng.poisson(np.repeat(tasa, largos))
+
+    # Se dejan las semanas sin venta solo en algunos casos (como llegan de la agregación)
+    mantener = (cantidad > 0) | (rng.random(len(cantidad)) < 0.1)
+    df = pd.DataFrame({
+        "numero_pieza": pd.Index(np.char.add("SKU", np.arange(n_skus).astype(str)))[sku[mantener]],
+        "fecha": fechas[semana[mantener]],
+        "Cantidad": cantidad[mantener],
+    })
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+class ClasificarDemandaTest(SimpleTestCase):
+    def test_vectorizado_igual_a_loop_por_sku(self):
+        demanda = _demanda_sintetica(n_skus=400)
+
+        full_loop, rotacion_loop = clasificar_demanda(demanda, vectorizado=False)
+        full_vec, rotacion_vec = clasificar_demanda(demanda, vectorizado=True)
+
+        pd.testing.assert_frame_equal(rotacion_vec, rotacion_loop)
+        pd.testing.assert_frame_equal(full_vec, full_loop, check_dtype=False)
+        self.assertGreater(rotacion_vec["frecuencia_rotacion"].nunique(), 3)
+        self.assertEqual(
+            set(full_vec["segmento_demanda"]), {"nuevo", "sin_venta", "intermitente", "frecuencia_alta"}
+        )
+
+    @unittest.skipUnless(os.getenv("STOCKIFAI_BENCHMARK"), "Benchmark: definir STOCKIFAI_BENCHMARK=1")
+    def test_benchmark_50k_skus(self):
+        demanda = _demanda_sintetica(n_skus=50_000)
+
+        inicio = time.perf_counter()
+        _, rotacion_vec = clasificar_demanda(demanda, vectorizado=True)
+        segundos_vec = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        _, rotacion_loop = clasificar_demanda(demanda, vectorizado=False)
+        segundos_loop = time.perf_counter() - inicio
+
+        print(f"\nclasificar_demanda 50k SKUs ({len(demanda)} filas): "
+              f"vectorizado {segundos_vec:.2f}s | por SKU {segundos_loop:.2f}s")
+        pd.testing.assert_frame_equal(rotacion_vec, rotacion_loop)
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('d_externo', '0003_rename_numero_parte_registroentrenamiento_frecuencia_alta_numero_pieza_and_more'),
+        ('user', '0005_user_rol_en_taller'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HistorialCompacto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('segmento_demanda', models.CharField(max_length=50, verbose_name='Segmento de Demanda')),
+                ('fecha_fin', models.DateField(verbose_name='Semana de la última columna')),
+                ('semanas', models.PositiveSmallIntegerField(verbose_name='Semanas de la ventana')),
+                ('skus', models.JSONField(verbose_name='Números de pieza')),
+                ('ventas', models.BinaryField(verbose_name='Ventas semanales')),
+                ('columnas_externas', models.JSONField(default=list, verbose_name='Columnas externas')),
+                ('externos', models.BinaryField(verbose_name='Variables externas')),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('taller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historiales_compactos', to='user.taller')),
+            ],
+            options={
+                'unique_together': {('taller', 'segmento_demanda')},
+            },
+        ),
+    ]
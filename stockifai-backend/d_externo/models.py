@@ -483,4 +483,35 @@ class RegistroEntrenamiento_Frecuencia_Alta(models.Model):
     coef_var_52 = models.FloatField(verbose_name="Coeficiente de Variación 52 Semanas", null=True, blank=True)
 
     def __str__(self):
-        return f"{self.numero_pieza} - {self.fecha}"
\ No newline at end of file
+        return f"{self.numero_pieza} - {self.fecha}"
+
+class HistorialCompacto(models.Model):
+    """
+    Ventana de ventas semanales de todos los SKUs de un taller y segmento en una sola fila:
+    índice de SKUs + matriz float32 (SKUs x semanas) empaquetada en un blob.
+    Reemplaza, para la inferencia, a las filas de ~150 columnas por SKU de RegistroEntrenamiento_*.
+    """
+    taller = models.ForeignKey(
+        "user.Taller",
+        on_delete=models.CASCADE,
+        related_name="historiales_compactos",
+    )
+    segmento_demanda = models.CharField(max_length=50, verbose_name="Segmento de Demanda")
+    fecha_fin = models.DateField(verbose_name="Semana de la última columna")
+    semanas = models.PositiveSmallIntegerField(verbose_name="Semanas de la ventana")
+
+    # Orden de las filas de las matrices
+    skus = models.JSONField(verbose_name="Números de pieza")
+    # float32 (len(skus), semanas), C-order
+    ventas = models.BinaryField(verbose_name="Ventas semanales")
+    # Último valor conocido de cada variable externa: float32 (len(skus), len(columnas_externas))
+    columnas_externas = models.JSONField(default=list, verbose_name="Columnas externas")
+    externos = models.BinaryField(verbose_name="Variables externas")
+
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = [('taller', 'segmento_demanda')]
+
+    def __str__(self):
+        return f"{self.taller_id} - {self.segmento_demanda} ({self.fecha_fin})"
@@ -1,4 +1,7 @@
-from d_externo.models import Inflacion, Patentamiento, IPSA, Prenda, TasaInteresPrestamo, TipoCambio,  RegistroEntrenamiento_intermitente, RegistroEntrenamiento_Frecuencia_Alta
+from d_externo.models import Inflacion, Patentamiento, IPSA, Prenda, TasaInteresPrestamo, TipoCambio,  RegistroEntrenamiento_intermitente, RegistroEntrenamiento_Frecuencia_Alta, \
+    HistorialCompacto
+from django.db.models import Count, Max
+
 from user.api.models.models import Taller
 
 def obtener_todas_las_inflaciones():
@@ -31,6 +34,22 @@ def obtener_todos_los_tipos_cambio():
     return list(TipoCambio.objects.all().values('fecha', 'tipo_cambio'))
 
 
+def huellas_datos_externos() -> dict:
+    """
+    Huella de cada tabla externa: {tabla: [cantidad, max_id, max_fecha]}.
+    Cambia si se agregan, borran o recargan registros.
+    """
+    huellas = {}
+    for modelo in (Inflacion, Patentamiento, IPSA, Prenda, TasaInteresPrestamo, TipoCambio):
+        resumen = modelo.objects.aggregate(cantidad=Count('id'), max_id=Max('id'), max_fecha=Max('fecha'))
+        huellas[modelo._meta.db_table] = [
+            resumen['cantidad'],
+            resumen['max_id'],
+            resumen['max_fecha'].isoformat() if resumen['max_fecha'] else None,
+        ]
+    return huellas
+
+
 def obtener_registroentrenamiento_intermitente(taller_id: int):
     """
     Devuelve todos los registros de RegistroEntrenamiento_intermitente
@@ -109,4 +128,27 @@ def guardar_registroentrenamiento_frecuencia_alta(datos: dict, taller: Taller):
         return registro
     except Exception as e:
         print(f"Error al crear registro de Frecuencia Alta: {e}")
-        raise
\ No newline at end of file
+        raise
+
+
+def obtener_historiales_compactos(taller_id: int):
+    """
+    Devuelve los HistorialCompacto de un taller (uno por segmento).
+    """
+    return list(HistorialCompacto.objects.filter(taller_id=taller_id))
+
+
+def guardar_historial_compacto(taller_id: int, segmento: str, datos: dict):
+    """
+    Crea o reemplaza el HistorialCompacto de un taller y segmento.
+    """
+    try:
+        registro, _ = HistorialCompacto.objects.update_or_create(
+            taller_id=taller_id,
+            segmento_demanda=segmento,
+            defaults=datos,
+        )
+        return registro
+    except Exception as e:
+        print(f"Error al guardar el historial compacto de '{segmento}': {e}")
+        raise
@@ -1,7 +1,7 @@
 from rest_framework import serializers
 
 from catalogo.models import Repuesto, Categoria, Marca
-from inventario.models import Deposito, Movimiento, Alerta, ObjetivoKPI
+from inventario.models import Deposito, Movimiento, Alerta, ObjetivoKPI, TrabajoForecast, TrabajoImportacion
 from catalogo.models import RepuestoTaller
 from user.api.models.models import Taller
 from user.models import Grupo
@@ -177,4 +177,42 @@ class AlertaSerializer(serializers.ModelSerializer):
             'estado',
             'fecha_creacion',
             'datos_snapshot'
-        ]
\ No newline at end of file
+        ]
+
+
+class TrabajoImportacionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrabajoImportacion
+        fields = [
+            'id',
+            'tipo',
+            'taller',
+            'nombre_archivo',
+            'estado',
+            'progreso',
+            'resultado',
+            'error',
+            'fecha_creacion',
+            'fecha_inicio',
+            'fecha_fin',
+        ]
+        read_only_fields = fields
+
+
+class TrabajoForecastSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrabajoForecast
+        fields = [
+            'id',
+            'taller',
+            'fecha_lunes',
+            'estado',
+            'etapa',
+            'progreso',
+            'resultado',
+            'error',
+            'fecha_creacion',
+            'fecha_inicio',
+            'fecha_fin',
+        ]
+        read_only_fields = fields
@@ -7,11 +7,13 @@ from .views import (
     ImportarStockView,
     ImportarCatalogoView,
     ImportarPreciosView,
+    EstadoTrabajoImportacionView,
     DepositosPorTallerView,
     ConsultarStockView,
     LocalizarRepuestoView,
     EjecutarForecastPorTallerView,
     EjecutarForecastView,
+    EstadoTrabajoForecastView,
     DetalleForecastingView,
     ConsultarForecastingListView,
     AlertsListView,
@@ -37,6 +39,8 @@ urlpatterns = [
     path("importaciones/stock", ImportarStockView.as_view(), name="importar-stock"),
     path("importaciones/catalogo", ImportarCatalogoView.as_view(), name="importar-catalogo"),
     path("importaciones/precios", ImportarPreciosView.as_view(), name="importar-precios"),
+    path("importaciones/trabajos/<int:trabajo_id>", EstadoTrabajoImportacionView.as_view(),
+         name="importacion-trabajo-estado"),
     path("talleres/<int:taller_id>/depositos", DepositosPorTallerView.as_view(), name="depositos-por-taller"),
     path("grupos/<int:grupo_id>/depositos", DepositosPorGrupoView.as_view(), name="depositos-por-grupo"),
     path("grupos/<int:grupo_id>/", GrupoDetailView.as_view(), name="grupo-detail"),
@@ -46,6 +50,8 @@ urlpatterns = [
     path("talleres/<int:taller_id>/localizador", LocalizarRepuestoView.as_view(), name="localizar-repuesto"),
     path("talleres/<int:taller_id>/forecast/run", EjecutarForecastPorTallerView.as_view(), name="forecast-run-taller"),
     path("talleres/forecast/run", EjecutarForecastView.as_view(), name="forecast-run"),
+    path("talleres/<int:taller_id>/forecast/trabajos/<int:trabajo_id>", EstadoTrabajoForecastView.as_view(),
+         name="forecast-trabajo-estado"),
     path("talleres/<int:taller_id>/forecasting", ConsultarForecastingListView.as_view(), name="forecasting-list"),
     path("talleres/<int:taller_id>/repuestos/<int:repuesto_taller_id>/forecasting", DetalleForecastingView.as_view(),
          name="detalle-forecasting"),
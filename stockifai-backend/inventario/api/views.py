@@ -26,7 +26,7 @@ from rest_framework.views import APIView
 
 from AI.services.forecast_pipeline import ejecutar_forecast_pipeline_por_taller, ejecutar_forecast_talleres
 from catalogo.models import Repuesto, RepuestoTaller
-from inventario.models import Deposito, Movimiento, StockPorDeposito, Alerta, ObjetivoKPI
+from inventario.models import Deposito, Movimiento, StockPorDeposito, Alerta, ObjetivoKPI, TrabajoForecast, TrabajoImportacion
 from user.models import Grupo, GrupoTaller, Taller
 from user.api.models.models import User
 
@@ -43,6 +43,8 @@ from ..services.import_catalogo import importar_catalogo
 from ..services.import_precios import importar_precios
 from ..services.import_movimientos import importar_movimientos
 from ..services.import_stock import importar_stock
+from ..services.trabajos_forecast import encolar_trabajo_forecast
+from ..services.trabajos_importacion import encolar_trabajo_importacion
 from .serializers import (
     AlertaSerializer,
     CatalogoImportSerializer,
@@ -55,15 +57,48 @@ from .serializers import (
     StockDepositoDetalleSerializer,
     StockImportSerializer,
     TallerConStockSerializer,
+    TrabajoForecastSerializer,
+    TrabajoImportacionSerializer,
 )
 
 logger = logging.getLogger(__name__)
 
 
+def _importacion_asincrona() -> bool:
+    return getattr(settings, "IMPORTACION_TRABAJOS_ASINCRONOS", True)
+
+
+def _encolar_importacion(request, tipo: str, validated_data: dict) -> Response:
+    """
+    Guarda el archivo y encola la importación; el worker (procesar_trabajos_importacion) la ejecuta
+    y el cliente consulta el avance en importaciones/trabajos/<id>.
+    """
+    try:
+        usuario = PermissionChecker.get_user_from_session(request)
+    except PermissionDenied:
+        usuario = None  # las importaciones no exigen sesión; solo se registra quién la pidió
+
+    parametros = {k: v for k, v in validated_data.items() if k not in ("file", "taller_id")}
+    trabajo = encolar_trabajo_importacion(
+        tipo,
+        validated_data["file"],
+        parametros=parametros,
+        taller_id=validated_data.get("taller_id"),
+        usuario=usuario,
+    )
+    return Response(
+        {"status": "encolado", "trabajo": TrabajoImportacionSerializer(trabajo).data},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
 class ImportarMovimientosView(APIView):
     def post(self, request):
         ser = MovimientosImportSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
+        if _importacion_asincrona():
+            return _encolar_importacion(request, TrabajoImportacion.Tipo.MOVIMIENTOS, ser.validated_data)
+
         with transaction.atomic():
             resultado = importar_movimientos(
                 file=ser.validated_data["file"],
@@ -81,6 +116,8 @@ class ImportarStockView(APIView):
     def post(self, request):
         ser = StockImportSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
+        if _importacion_asincrona():
+            return _encolar_importacion(request, TrabajoImportacion.Tipo.STOCK, ser.validated_data)
 
         with transaction.atomic():
             resultado = importar_stock(
@@ -89,6 +126,8 @@ class ImportarStockView(APIView):
                 fields_map=ser.validated_data.get("fields_map") or {},
                 mode=ser.validated_data.get("mode", "set"),
             )
+        if resultado.get("repuestos_afectados_ids"):
+            actualizar_alertas_para_repuestos(resultado["repuestos_afectados_ids"])
         return Response(resultado, status=status.HTTP_200_OK)
 
 
@@ -96,6 +135,9 @@ class ImportarCatalogoView(APIView):
     def post(self, request):
         ser = CatalogoImportSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
+        if _importacion_asincrona():
+            return _encolar_importacion(request, TrabajoImportacion.Tipo.CATALOGO, ser.validated_data)
+
         with transaction.atomic():
             res = importar_catalogo(
                 file=ser.validated_data["file"],
@@ -109,6 +151,8 @@ class ImportarPreciosView(APIView):
     def post(self, request):
         ser = PreciosImportSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
+        if _importacion_asincrona():
+            return _encolar_importacion(request, TrabajoImportacion.Tipo.PRECIOS, ser.validated_data)
 
         try:
             res = importar_precios(
@@ -122,6 +166,20 @@ class ImportarPreciosView(APIView):
         return Response(res, status=status.HTTP_200_OK)
 
 
+class EstadoTrabajoImportacionView(APIView):
+    def get(self, request, trabajo_id: int):
+        trabajo = get_object_or_404(TrabajoImportacion, id=trabajo_id)
+        user = PermissionChecker.get_user_from_session(request)
+
+        if trabajo.taller_id is not None:
+            if not PermissionChecker.puede_ver_taller(user, trabajo.taller):
+                return Response({"error": "No tienes permiso para ver este taller"}, status=403)
+        elif not PermissionChecker.puede_ver_importacion_catalogo(user, trabajo):
+            return Response({"error": "No tienes permiso para ver esta importación"}, status=403)
+
+        return Response(TrabajoImportacionSerializer(trabajo).data, status=status.HTTP_200_OK)
+
+
 class DepositosPorTallerView(APIView):
     def get(self, request, taller_id: int):
         qs = Deposito.objects.filter(taller_id=taller_id)
@@ -522,15 +580,56 @@ class EjecutarForecastPorTallerView(APIView):
 
         fecha_lunes = request.data.get("fecha_lunes")  # "YYYY-MM-DD" (lunes)
 
-        out = ejecutar_forecast_pipeline_por_taller(taller_id, fecha_lunes)
-        return Response({"status": "ok", "details": out}, status=status.HTTP_200_OK)
+        if not getattr(settings, "FORECAST_TRABAJOS_ASINCRONOS", True):
+            out = ejecutar_forecast_pipeline_por_taller(taller_id, fecha_lunes)
+            return Response({"status": "ok", "details": out}, status=status.HTTP_200_OK)
+
+        try:
+            trabajo, creado = encolar_trabajo_forecast(taller_id, fecha_lunes, usuario=user)
+        except (TypeError, ValueError):
+            return Response({"error": "fecha_lunes debe tener formato YYYY-MM-DD"}, status=400)
+
+        # El forecast corre en el worker (procesar_trabajos_forecast); el cliente consulta el estado
+        return Response(
+            {"status": "encolado" if creado else "en_curso", "trabajo": TrabajoForecastSerializer(trabajo).data},
+            status=status.HTTP_202_ACCEPTED
+        )
 
 class EjecutarForecastView(APIView):
     def post(self, request):
         fecha_lunes = request.data.get("fecha_lunes")  # "YYYY-MM-DD" (lunes)
 
-        out = ejecutar_forecast_talleres(fecha_lunes)
-        return Response({"status": "ok", "details": out}, status=status.HTTP_200_OK)
+        if not getattr(settings, "FORECAST_TRABAJOS_ASINCRONOS", True):
+            out = ejecutar_forecast_talleres(fecha_lunes)
+            return Response({"status": "ok", "details": out}, status=status.HTTP_200_OK)
+
+        trabajos = []
+        try:
+            for taller_id in Taller.objects.values_list("id", flat=True):
+                trabajo, _ = encolar_trabajo_forecast(taller_id, fecha_lunes)
+                trabajos.append(trabajo)
+        except (TypeError, ValueError):
+            return Response({"error": "fecha_lunes debe tener formato YYYY-MM-DD"}, status=400)
+
+        return Response(
+            {"status": "encolado", "trabajos": TrabajoForecastSerializer(trabajos, many=True).data},
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class EstadoTrabajoForecastView(APIView):
+    def get(self, request, taller_id: int, trabajo_id: int):
+        user = PermissionChecker.get_user_from_session(request)
+
+        try:
+            taller = Taller.objects.get(id=taller_id)
+            if not PermissionChecker.puede_ver_taller(user, taller):
+                return Response({"error": "No tienes permiso para ver este taller"}, status=403)
+        except Taller.DoesNotExist:
+            return Response({"error": "Taller no encontrado"}, status=404)
+
+        trabajo = get_object_or_404(TrabajoForecast, id=trabajo_id, taller_id=taller_id)
+        return Response(TrabajoForecastSerializer(trabajo).data, status=status.HTTP_200_OK)
 
 
 
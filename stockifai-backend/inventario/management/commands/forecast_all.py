@@ -3,18 +3,51 @@ from datetime import date, timedelta, datetime
 from django.core.management.base import BaseCommand
 
 from AI.services.forecast_pipeline import ejecutar_forecast_talleres
+from inventario.services.trabajos_forecast import cerrar_reserva, latidos, reservar_talleres
+from user.api.models.models import Taller
 
 
 class Command(BaseCommand):
     help = "Ejecutar el forecast para TODOS los talleres, apuntando al próximo lunes."
 
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Procesos en paralelo (default: settings.FORECAST_MAX_WORKERS)")
+        parser.add_argument("--timeout", type=int, default=None,
+                            help="Segundos máximos por taller (default: settings.FORECAST_TIMEOUT_POR_TALLER)")
+        parser.add_argument("--forzar", action="store_true",
+                            help="Reentrenar todos los talleres aunque no tengan cambios desde la última corrida")
+
     def handle(self, *args, **options):
         self.stdout.write(f"CRON TASK")
         fecha_lunes = next_monday_str()
 
         self.stdout.write(f"Ejecutando forecast para lunes {fecha_lunes}")
 
-        result = ejecutar_forecast_talleres(fecha_lunes)
+        # Cada taller queda reservado con un TrabajoForecast EN_CURSO: no se superpone con la cola
+        # (los que ya tienen un trabajo activo los termina la cola)
+        reservados = reservar_talleres(Taller.objects.values_list("id", flat=True), fecha_lunes)
+        omitidos = Taller.objects.exclude(id__in=list(reservados)).values_list("id", flat=True)
+        for taller_id in omitidos:
+            self.stdout.write(self.style.WARNING(f"Taller {taller_id}: ya tiene un trabajo de forecast activo, se omite"))
+
+        try:
+            with latidos(list(reservados.values())):
+                result = ejecutar_forecast_talleres(
+                    fecha_lunes,
+                    max_workers=options.get("workers"),
+                    timeout_por_taller=options.get("timeout"),
+                    forzar=options.get("forzar", False),
+                    taller_ids=list(reservados),
+                )
+        except Exception as e:
+            for trabajo in reservados.values():
+                cerrar_reserva(trabajo, {"ok": False, "error": f"forecast_all interrumpido: {e}"})
+            raise
+        for item in result.get("ok", []):
+            cerrar_reserva(reservados[item["taller_id"]], {"ok": True, **item})
+        for item in result.get("errores", []):
+            cerrar_reserva(reservados[item["taller_id"]], {"ok": False, **item})
 
         self.stdout.write(self.style.SUCCESS("Forecast OK"))
 
@@ -22,10 +55,10 @@ class Command(BaseCommand):
         errores = result.get("errores", [])
 
         for item in ok:
-            self.stdout.write(f"Taller OK: {item.get('taller_id')}")
+            self.stdout.write(f"Taller OK: {item.get('taller_id')} [{item.get('accion')}] ({item.get('segundos')}s)")
 
         for item in errores:
-            self.stdout.write(self.style.ERROR(f"Taller ERROR: {item.get('taller_id')} - {item.get('error')}"))
+            self.stdout.write(self.style.ERROR(f"Taller ERROR: {item.get('taller_id')} - {item.get('error')} ({item.get('segundos')}s)"))
 
 
 def next_monday_str() -> datetime:
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventario.models import TrabajoForecast
+from inventario.services.bloqueos import tomar_lugar
+from inventario.services.trabajos_forecast import (
+    ejecutar_trabajo,
+    liberar_trabajos_colgados,
+    tomar_siguiente_trabajo,
+)
+
+
+class Command(BaseCommand):
+    help = "Procesar los trabajos de forecast encolados desde la API (TrabajoForecast)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--una-vez", action="store_true",
+                            help="Procesar los pendientes y salir (para cron) en lugar de quedar escuchando")
+        parser.add_argument("--intervalo", type=int, default=5,
+                            help="Segundos de espera entre consultas cuando no hay trabajos (default: 5)")
+        parser.add_argument("--max-trabajos", type=int, default=None,
+                            help="Salir después de procesar esta cantidad de trabajos")
+
+    def handle(self, *args, **options):
+        # Como mucho FORECAST_MAX_WORKERS workers a la vez (el cron arranca uno por minuto)
+        lugares = getattr(settings, "FORECAST_MAX_WORKERS", 1)
+        with tomar_lugar("procesar_trabajos_forecast", lugares) as lugar:
+            if lugar is None:
+                self.stdout.write(f"Ya hay {lugares} worker(s) de forecast corriendo; no se procesa nada.")
+                return
+            self._procesar(lugar, options)
+
+    def _procesar(self, lugar, options):
+        una_vez = options["una_vez"]
+        intervalo = options["intervalo"]
+        max_trabajos = options["max_trabajos"]
+        minutos_colgado = getattr(settings, "FORECAST_TRABAJO_MAX_MINUTOS", 10)
+
+        procesados = 0
+        while max_trabajos is None or procesados < max_trabajos:
+            close_old_connections()
+            lugar.mantener()
+            liberados = liberar_trabajos_colgados(minutos_colgado)
+            if liberados:
+                self.stdout.write(self.style.WARNING(f"Trabajos colgados marcados como ERROR: {liberados}"))
+
+            trabajo = tomar_siguiente_trabajo()
+            if trabajo is None:
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+                continue
+
+            self.stdout.write(f"Trabajo {trabajo.id}: taller {trabajo.taller_id}, lunes {trabajo.fecha_lunes}")
+            inicio = time.perf_counter()
+            ejecutar_trabajo(trabajo)
+            segundos = round(time.perf_counter() - inicio, 2)
+            procesados += 1
+
+            if trabajo.estado == TrabajoForecast.Estado.COMPLETADO:
+                self.stdout.write(self.style.SUCCESS(f"Trabajo {trabajo.id} OK ({segundos}s)"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Trabajo {trabajo.id} {trabajo.estado}: {trabajo.error} ({segundos}s)"))
+
+        self.stdout.write(f"Trabajos procesados: {procesados}")
@@ -0,0 +1,68 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from inventario.models import TrabajoImportacion
+from inventario.services.bloqueos import tomar_lugar
+from inventario.services.trabajos_importacion import (
+    ejecutar_trabajo,
+    liberar_trabajos_colgados,
+    tomar_siguiente_trabajo,
+)
+
+
+class Command(BaseCommand):
+    help = "Procesar las importaciones encoladas desde la API (TrabajoImportacion)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--una-vez", action="store_true",
+                            help="Procesar las pendientes y salir (para cron) en lugar de quedar escuchando")
+        parser.add_argument("--intervalo", type=int, default=5,
+                            help="Segundos de espera entre consultas cuando no hay importaciones (default: 5)")
+        parser.add_argument("--max-trabajos", type=int, default=None,
+                            help="Salir después de procesar esta cantidad de importaciones")
+
+    def handle(self, *args, **options):
+        # Como mucho IMPORTACION_MAX_WORKERS workers a la vez (el cron arranca uno por minuto)
+        lugares = getattr(settings, "IMPORTACION_MAX_WORKERS", 1)
+        with tomar_lugar("procesar_trabajos_importacion", lugares) as lugar:
+            if lugar is None:
+                self.stdout.write(f"Ya hay {lugares} worker(s) de importación corriendo; no se procesa nada.")
+                return
+            self._procesar(lugar, options)
+
+    def _procesar(self, lugar, options):
+        una_vez = options["una_vez"]
+        intervalo = options["intervalo"]
+        max_trabajos = options["max_trabajos"]
+        minutos_colgado = getattr(settings, "IMPORTACION_TRABAJO_MAX_MINUTOS", 10)
+
+        procesados = 0
+        while max_trabajos is None or procesados < max_trabajos:
+            close_old_connections()
+            lugar.mantener()
+            liberados = liberar_trabajos_colgados(minutos_colgado)
+            if liberados:
+                self.stdout.write(self.style.WARNING(f"Importaciones colgadas marcadas como ERROR: {liberados}"))
+
+            trabajo = tomar_siguiente_trabajo()
+            if trabajo is None:
+                if una_vez:
+                    break
+                time.sleep(intervalo)
+                continue
+
+            self.stdout.write(f"Importación {trabajo.id}: {trabajo.tipo} {trabajo.nombre_archivo}")
+            inicio = time.perf_counter()
+            ejecutar_trabajo(trabajo)
+            segundos = round(time.perf_counter() - inicio, 2)
+            procesados += 1
+
+            if trabajo.estado == TrabajoImportacion.Estado.COMPLETADO:
+                self.stdout.write(self.style.SUCCESS(f"Importación {trabajo.id} OK {trabajo.progreso} ({segundos}s)"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Importación {trabajo.id} ERROR: {trabajo.error} ({segundos}s)"))
+
+        self.stdout.write(f"Importaciones procesadas: {procesados}")
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventario.repositories.demanda_semanal_repo import DemandaSemanalRepo
+
+
+class Command(BaseCommand):
+    help = "Recalcular la demanda semanal agregada (DemandaSemanal) desde los movimientos de EGRESO."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--taller", type=int, default=None,
+                            help="Reconstruir solo este taller (default: todos)")
+
+    def handle(self, *args, **options):
+        taller_id = options["taller"]
+        inicio = time.perf_counter()
+        filas = DemandaSemanalRepo().reconstruir(taller_id)
+        segundos = round(time.perf_counter() - inicio, 2)
+
+        alcance = f"taller {taller_id}" if taller_id is not None else "todos los talleres"
+        self.stdout.write(self.style.SUCCESS(f"Demanda semanal reconstruida ({alcance}): {filas} filas en {segundos}s"))
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_alerta_and_more'),
+        ('user', '0005_user_rol_en_taller'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_lunes', models.DateField()),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=20)),
+                ('etapa', models.CharField(blank=True, choices=[('preproceso', 'Preproceso'), ('entrenamiento', 'Entrenamiento'), ('inferencia', 'Inferencia'), ('alertas', 'Alertas')], max_length=20, null=True)),
+                ('progreso', models.JSONField(blank=True, default=dict)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=120, null=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('taller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_forecast', to='user.taller')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'fecha_creacion'], name='inventario__estado_e7fb1b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='trabajoforecast',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado__in', ['PENDIENTE', 'EN_CURSO'])), fields=('taller',), name='trabajo_forecast_activo_unico_por_taller'),
+        ),
+    ]
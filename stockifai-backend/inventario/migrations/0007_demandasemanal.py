@@ -0,0 +1,59 @@
+# Generated by Django 5.0.6 on 2026-10-17 19:43
+
+from datetime import timezone as dt_timezone
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+
+
+def cargar_demanda_semanal(apps, schema_editor):
+    # Carga inicial desde los EGRESOS existentes (lo mismo que `reconstruir_demanda_semanal`)
+    Movimiento = apps.get_model('inventario', 'Movimiento')
+    DemandaSemanal = apps.get_model('inventario', 'DemandaSemanal')
+
+    filas = (
+        Movimiento.objects
+        .filter(tipo='EGRESO', cantidad__gte=0)
+        .annotate(semana=TruncWeek('fecha', tzinfo=dt_timezone.utc))
+        .values('stock_por_deposito__repuesto_taller_id', 'semana')
+        .annotate(total=Sum('cantidad'))
+        .order_by()
+    )
+    lote = []
+    for fila in filas.iterator(chunk_size=5000):
+        lote.append(DemandaSemanal(
+            repuesto_taller_id=fila['stock_por_deposito__repuesto_taller_id'],
+            semana=fila['semana'].date(),
+            cantidad=fila['total'] or 0,
+        ))
+        if len(lote) >= 5000:
+            DemandaSemanal.objects.bulk_create(lote)
+            lote = []
+    if lote:
+        DemandaSemanal.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('catalogo', '0004_repuestotaller_frecuencia'),
+        ('inventario', '0006_trabajoforecast'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandaSemanal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semana', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('repuesto_taller', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='demanda_semanal', to='catalogo.repuestotaller')),
+            ],
+            options={
+                'unique_together': {('repuesto_taller', 'semana')},
+            },
+        ),
+        migrations.RunPython(cargar_demanda_semanal, migrations.RunPython.noop),
+    ]
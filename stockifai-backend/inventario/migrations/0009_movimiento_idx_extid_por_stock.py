@@ -0,0 +1,17 @@
+# Generated by Django 5.0.6 on 2026-10-17 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimiento',
+            index=models.Index(fields=['stock_por_deposito', 'externo_id'], name='idx_mov_extid_por_stock'),
+        ),
+    ]
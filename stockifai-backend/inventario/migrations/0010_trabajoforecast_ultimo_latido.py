@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_movimiento_idx_extid_por_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoforecast',
+            name='ultimo_latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_trabajoforecast_ultimo_latido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='ultimo_latido',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.6 on 2026-10-17 21:40
+
+from datetime import timezone as dt_timezone
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncWeek
+
+
+def cargar_cantidad_negativa(apps, schema_editor):
+    # Los EGRESOS con cantidad negativa existentes (0007 solo cargó los positivos)
+    Movimiento = apps.get_model('inventario', 'Movimiento')
+    DemandaSemanal = apps.get_model('inventario', 'DemandaSemanal')
+
+    filas = (
+        Movimiento.objects
+        .filter(tipo='EGRESO', cantidad__lt=0)
+        .annotate(semana=TruncWeek('fecha', tzinfo=dt_timezone.utc))
+        .values('stock_por_deposito__repuesto_taller_id', 'semana')
+        .annotate(total=Sum('cantidad'))
+        .order_by()
+    )
+    for fila in filas.iterator(chunk_size=5000):
+        DemandaSemanal.objects.update_or_create(
+            repuesto_taller_id=fila['stock_por_deposito__repuesto_taller_id'],
+            semana=fila['semana'].date(),
+            defaults={'cantidad_negativa': fila['total'] or 0},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_trabajoimportacion_ultimo_latido'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='demandasemanal',
+            name='cantidad_negativa',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(cargar_cantidad_negativa, migrations.RunPython.noop),
+    ]
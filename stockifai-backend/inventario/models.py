@@ -64,10 +64,32 @@ class Movimiento(models.Model):
     tipo=models.CharField(max_length=10, choices=TIPO); cantidad=models.IntegerField(); fecha=models.DateTimeField()
     documento=models.CharField(max_length=120, null=True, blank=True)
     externo_id=models.CharField(max_length=200, null=True, blank=True, db_index=True)
-    class Meta: constraints=[models.UniqueConstraint(fields=['stock_por_deposito','externo_id'],name='uq_mov_extid_por_stock',condition=~models.Q(externo_id=None))]
+    class Meta:
+        constraints=[models.UniqueConstraint(fields=['stock_por_deposito','externo_id'],name='uq_mov_extid_por_stock',condition=~models.Q(externo_id=None))]
+        # Búsqueda de duplicados del import; MySQL no crea la constraint parcial de arriba
+        indexes=[models.Index(fields=['stock_por_deposito','externo_id'],name='idx_mov_extid_por_stock')]
     def __str__(self): return f"{self.tipo} {self.cantidad} @ SPD {self.stock_por_deposito_id}"
 
 
+class DemandaSemanal(models.Model):
+    """
+    Suma semanal de EGRESOS por repuesto del taller (semana = lunes, en UTC como el forecast).
+    Los EGRESOS con cantidad negativa se suman aparte: el forecast no los cuenta y el dashboard sí.
+    La mantienen las altas de movimientos (DemandaSemanalRepo.registrar_egresos); se reconstruye
+    con el comando `reconstruir_demanda_semanal`.
+    """
+    repuesto_taller = models.ForeignKey('catalogo.RepuestoTaller', on_delete=models.CASCADE, related_name='demanda_semanal')
+    semana = models.DateField()
+    cantidad = models.IntegerField(default=0)
+    cantidad_negativa = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = [('repuesto_taller', 'semana')]
+
+    def __str__(self):
+        return f"RT:{self.repuesto_taller_id} {self.semana} = {self.cantidad}"
+
+
 class ObjetivoKPI(models.Model):
     """Objetivos de KPIs por taller o grupo"""
 
@@ -176,4 +198,98 @@ class Alerta(models.Model):
         ]
 
     def __str__(self):
-        return f"Alerta {self.nivel} para {self.repuesto_taller.repuesto.numero_pieza}"
\ No newline at end of file
+        return f"Alerta {self.nivel} para {self.repuesto_taller.repuesto.numero_pieza}"
+
+class TrabajoForecast(models.Model):
+    """
+    Trabajo de forecast encolado (preproceso -> entrenamiento -> inferencia -> alertas de un taller).
+    Lo ejecuta el comando `procesar_trabajos_forecast` fuera del request HTTP.
+    """
+    class Estado(models.TextChoices):
+        PENDIENTE = 'PENDIENTE', 'Pendiente'
+        EN_CURSO = 'EN_CURSO', 'En curso'
+        COMPLETADO = 'COMPLETADO', 'Completado'
+        ERROR = 'ERROR', 'Error'
+
+    class Etapa(models.TextChoices):
+        PREPROCESO = 'preproceso', 'Preproceso'
+        ENTRENAMIENTO = 'entrenamiento', 'Entrenamiento'
+        INFERENCIA = 'inferencia', 'Inferencia'
+        ALERTAS = 'alertas', 'Alertas'
+
+    ESTADOS_ACTIVOS = (Estado.PENDIENTE, Estado.EN_CURSO)
+
+    taller = models.ForeignKey('user.Taller', on_delete=models.CASCADE, related_name='trabajos_forecast')
+    fecha_lunes = models.DateField()
+    solicitado_por = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    etapa = models.CharField(max_length=20, choices=Etapa.choices, null=True, blank=True)
+    # {etapa: {"inicio": iso, "fin": iso}} a medida que avanza el pipeline
+    progreso = models.JSONField(default=dict, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    worker = models.CharField(max_length=120, null=True, blank=True)  # host:pid que lo tomó
+    # Lo actualiza el worker mientras corre; sin latidos recientes el trabajo se da por colgado
+    ultimo_latido = models.DateTimeField(null=True, blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'fecha_creacion'])]
+        constraints = [
+            # Un solo trabajo activo por taller (en MySQL lo garantiza el lock del encolado)
+            models.UniqueConstraint(
+                fields=['taller'],
+                condition=models.Q(estado__in=['PENDIENTE', 'EN_CURSO']),
+                name='trabajo_forecast_activo_unico_por_taller'
+            )
+        ]
+
+    def __str__(self):
+        return f"TrabajoForecast {self.id} - taller {self.taller_id} ({self.estado})"
+
+
+class TrabajoImportacion(models.Model):
+    """
+    Importación de un archivo (movimientos, stock, catálogo o precios) encolada desde la API.
+    El archivo queda guardado hasta que la ejecuta el comando `procesar_trabajos_importacion`.
+    """
+    class Tipo(models.TextChoices):
+        MOVIMIENTOS = 'MOVIMIENTOS', 'Movimientos'
+        STOCK = 'STOCK', 'Stock'
+        CATALOGO = 'CATALOGO', 'Catálogo'
+        PRECIOS = 'PRECIOS', 'Precios'
+
+    Estado = TrabajoForecast.Estado
+    ESTADOS_ACTIVOS = TrabajoForecast.ESTADOS_ACTIVOS
+
+    tipo = models.CharField(max_length=20, choices=Tipo.choices)
+    taller = models.ForeignKey('user.Taller', null=True, blank=True, on_delete=models.CASCADE,
+                               related_name='trabajos_importacion')  # el catálogo no es de un taller
+    archivo = models.FileField(upload_to='importaciones/%Y/%m/', null=True, blank=True)
+    nombre_archivo = models.CharField(max_length=255)
+    # Opciones del import tal como llegaron en el request (fields_map, mode, deposito_id, ...)
+    parametros = models.JSONField(default=dict, blank=True)
+    solicitado_por = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+
+    estado = models.CharField(max_length=20, choices=Estado.choices, default=Estado.PENDIENTE)
+    # {"filas_leidas", "insertados", "ignorados", "rechazados"} a medida que avanza
+    progreso = models.JSONField(default=dict, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    worker = models.CharField(max_length=120, null=True, blank=True)  # host:pid que lo tomó
+    # Lo actualiza el worker mientras corre; sin latidos recientes el trabajo se da por colgado
+    ultimo_latido = models.DateTimeField(null=True, blank=True)
+
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['estado', 'fecha_creacion'])]
+
+    def __str__(self):
+        return f"TrabajoImportacion {self.id} - {self.tipo} ({self.estado})"
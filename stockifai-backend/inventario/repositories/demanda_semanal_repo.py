@@ -0,0 +1,249 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import TruncWeek
+
+from inventario.models import DemandaSemanal, Movimiento
+
+CHUNK_SIZE = 1000
+
+
+def semana_de(fecha) -> date:
+    """
+    Lunes (UTC) de la semana de `fecha`: misma semana que arma el preproceso del forecast.
+    """
+    if isinstance(fecha, datetime):
+        if fecha.tzinfo is not None:
+            fecha = fecha.astimezone(dt_timezone.utc)
+        fecha = fecha.date()
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def _inicio_utc(semana: date) -> datetime:
+    return datetime.combine(semana, time.min, tzinfo=dt_timezone.utc)
+
+
+def _partir_rango(desde_dt, hasta_dt):
+    """
+    Parte [desde_dt, hasta_dt) en las semanas enteras que contiene, como (primera, fin) con fin
+    exclusivo (None si no hay ninguna), y el filtro de fechas de los bordes que quedan afuera.
+    """
+    primera = semana_de(desde_dt)
+    if _inicio_utc(primera) < desde_dt:
+        primera += timedelta(weeks=1)
+    fin = semana_de(hasta_dt)
+    if primera >= fin:
+        return None, Q(fecha__gte=desde_dt, fecha__lt=hasta_dt)
+
+    filtro_bordes = Q()
+    for desde, hasta in ((desde_dt, _inicio_utc(primera)), (_inicio_utc(fin), hasta_dt)):
+        if desde < hasta:
+            filtro_bordes |= Q(fecha__gte=desde, fecha__lt=hasta)
+    return (primera, fin), filtro_bordes
+
+
+class DemandaSemanalRepo:
+    """
+    Agregado semanal de EGRESOS (DemandaSemanal). Las lecturas usan el agregado para las semanas
+    completas del rango y solo van a Movimiento por los bordes (semanas parciales).
+    El forecast lee solo `cantidad` (los EGRESOS con cantidad negativa no son demanda para el
+    preproceso); el dashboard suma también `cantidad_negativa`, como cuando sumaba Movimiento.
+    """
+
+    def _egresos(self, negativos: bool = False):
+        if negativos:
+            return Movimiento.objects.filter(tipo="EGRESO")
+        # Mismo criterio que el preproceso: los EGRESOS con cantidad negativa no son demanda
+        return Movimiento.objects.filter(tipo="EGRESO", cantidad__gte=0)
+
+    def registrar_egresos(self, egresos) -> int:
+        """
+        Suma al agregado los EGRESOS recién creados, dados como (repuesto_taller_id, fecha, cantidad).
+        Llamar dentro de la misma transacción que crea los movimientos. Devuelve las semanas tocadas.
+        """
+        return self._sumar(egresos, 1)
+
+    def quitar_egresos(self, egresos) -> int:
+        """
+        Resta del agregado EGRESOS borrados o modificados (sus valores anteriores), mismo formato
+        que registrar_egresos.
+        """
+        return self._sumar(egresos, -1)
+
+    def _sumar(self, egresos, signo: int) -> int:
+        # (rt, semana) -> [delta de cantidad, delta de cantidad_negativa]
+        deltas = defaultdict(lambda: [0, 0])
+        for rt_id, fecha, cantidad in egresos:
+            if cantidad is None:
+                continue
+            deltas[(rt_id, semana_de(fecha))][0 if cantidad >= 0 else 1] += signo * int(cantidad)
+        deltas = {clave: delta for clave, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return 0
+
+        qn = connection.ops.quote_name
+        tabla = qn(DemandaSemanal._meta.db_table)
+        rt, semana, cantidad, negativa = (
+            qn(DemandaSemanal._meta.get_field(f).column)
+            for f in ("repuesto_taller", "semana", "cantidad", "cantidad_negativa")
+        )
+        # Un solo upsert que suma el delta (sin pisar sumas concurrentes). En MySQL cada conflicto
+        # consume un valor del id autoincremental (BigAutoField, sin riesgo de agotarlo).
+        if connection.vendor == "mysql":
+            sql = (f"INSERT INTO {tabla} ({rt}, {semana}, {cantidad}, {negativa}) VALUES (%s, %s, %s, %s) "
+                   f"ON DUPLICATE KEY UPDATE {cantidad} = {cantidad} + VALUES({cantidad}), "
+                   f"{negativa} = {negativa} + VALUES({negativa})")
+        else:
+            sql = (f"INSERT INTO {tabla} ({rt}, {semana}, {cantidad}, {negativa}) VALUES (%s, %s, %s, %s) "
+                   f"ON CONFLICT ({rt}, {semana}) DO UPDATE SET {cantidad} = {tabla}.{cantidad} + excluded.{cantidad}, "
+                   f"{negativa} = {tabla}.{negativa} + excluded.{negativa}")
+
+        items = [
+            (rt_id, connection.ops.adapt_datefield_value(sem), delta, delta_negativa)
+            for (rt_id, sem), (delta, delta_negativa) in deltas.items()
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            for i in range(0, len(items), CHUNK_SIZE):
+                cursor.executemany(sql, items[i:i + CHUNK_SIZE])
+        return len(deltas)
+
+    def reconstruir(self, taller_id: int | None = None) -> int:
+        """
+        Recalcula el agregado desde Movimiento (de un taller o de todos). Devuelve las filas creadas.
+        """
+        existentes = DemandaSemanal.objects.all()
+        egresos = self._egresos(negativos=True)
+        if taller_id is not None:
+            existentes = existentes.filter(repuesto_taller__taller_id=taller_id)
+            egresos = egresos.filter(stock_por_deposito__repuesto_taller__taller_id=taller_id)
+
+        filas = (
+            egresos
+            .annotate(semana=TruncWeek("fecha", tzinfo=dt_timezone.utc))
+            .values("stock_por_deposito__repuesto_taller_id", "semana")
+            .annotate(total=Sum("cantidad", filter=Q(cantidad__gte=0)),
+                      total_negativa=Sum("cantidad", filter=Q(cantidad__lt=0)))
+            .order_by()
+        )
+        creadas = 0
+        with transaction.atomic():
+            existentes.delete()
+            lote = []
+            for fila in filas.iterator(chunk_size=CHUNK_SIZE):
+                lote.append(DemandaSemanal(
+                    repuesto_taller_id=fila["stock_por_deposito__repuesto_taller_id"],
+                    semana=semana_de(fila["semana"]),
+                    cantidad=fila["total"] or 0,
+                    cantidad_negativa=fila["total_negativa"] or 0,
+                ))
+                if len(lote) >= CHUNK_SIZE:
+                    DemandaSemanal.objects.bulk_create(lote)
+                    creadas += len(lote)
+                    lote = []
+            if lote:
+                DemandaSemanal.objects.bulk_create(lote)
+                creadas += len(lote)
+        return creadas
+
+    def demanda_semanal_taller(self, taller_id: int, desde_dt, hasta_dt) -> list:
+        """
+        (numero_pieza, semana, cantidad) de los EGRESOS del taller con fecha en [desde_dt, hasta_dt),
+        sumados por SKU y semana (lunes UTC).
+        """
+        totales = defaultdict(int)
+        completas, filtro_bordes = _partir_rango(desde_dt, hasta_dt)
+        if completas is not None:
+            primera, fin = completas
+            filas = (
+                DemandaSemanal.objects
+                .filter(repuesto_taller__taller_id=taller_id, semana__gte=primera, semana__lt=fin)
+                .values_list("repuesto_taller__repuesto__numero_pieza", "semana", "cantidad")
+            )
+            for numero_pieza, semana, cantidad in filas.iterator(chunk_size=5000):
+                totales[(numero_pieza, semana)] += cantidad
+
+        if filtro_bordes:
+            movimientos = self._egresos().filter(
+                filtro_bordes, stock_por_deposito__repuesto_taller__taller_id=taller_id
+            ).values_list("stock_por_deposito__repuesto_taller__repuesto__numero_pieza", "fecha", "cantidad")
+            for numero_pieza, fecha, cantidad in movimientos.iterator(chunk_size=5000):
+                totales[(numero_pieza, semana_de(fecha))] += cantidad
+
+        return [(numero_pieza, semana, cantidad) for (numero_pieza, semana), cantidad in totales.items()]
+
+    def demanda_por_semana(self, repuesto_taller_id: int, limites: list) -> list:
+        """
+        Demanda del repuesto del taller (todos los EGRESOS) entre cada par de `limites` consecutivos
+        (datetimes aware, p. ej. los lunes en hora local). Las semanas UTC salen del agregado; de
+        Movimiento solo el tramo entre cada límite y el lunes UTC de su semana.
+        """
+        if len(limites) < 2:
+            return []
+        semanas = [semana_de(limite) for limite in limites]
+        agregado = dict(
+            DemandaSemanal.objects
+            .filter(repuesto_taller_id=repuesto_taller_id, semana__gte=semanas[0], semana__lt=semanas[-1])
+            .annotate(total=F("cantidad") + F("cantidad_negativa"))
+            .values_list("semana", "total")
+        )
+
+        # Demanda de [lunes UTC, límite) para cada límite
+        tramos = [(_inicio_utc(semana), limite) for semana, limite in zip(semanas, limites)]
+        en_tramo = [0] * len(limites)
+        filtro = Q()
+        for desde, hasta in tramos:
+            if desde < hasta:
+                filtro |= Q(fecha__gte=desde, fecha__lt=hasta)
+        if filtro:
+            movimientos = self._egresos(negativos=True).filter(
+                filtro, stock_por_deposito__repuesto_taller_id=repuesto_taller_id
+            ).values_list("fecha", "cantidad")
+            for fecha, cantidad in movimientos:
+                for i, (desde, hasta) in enumerate(tramos):
+                    if desde <= fecha < hasta:
+                        en_tramo[i] += cantidad
+                        break
+
+        # [limites[i], limites[i+1]) = semanas UTC completas entre los dos lunes UTC, menos el tramo
+        # inicial que quedó antes de limites[i], más el tramo hasta limites[i+1]
+        totales = []
+        for i in range(len(limites) - 1):
+            semanas_completas = sum(
+                cantidad for semana, cantidad in agregado.items() if semanas[i] <= semana < semanas[i + 1]
+            )
+            totales.append(semanas_completas - en_tramo[i] + en_tramo[i + 1])
+        return totales
+
+    def demanda_entre(self, rt_ids, desde_dt, hasta_dt) -> dict:
+        """
+        {repuesto_taller_id: cantidad} de EGRESOS con fecha en [desde_dt, hasta_dt), incluidos los de
+        cantidad negativa.
+        """
+        totales = defaultdict(int)
+        completas, filtro_bordes = _partir_rango(desde_dt, hasta_dt)
+        if completas is not None:
+            primera, fin = completas
+            filas = (
+                DemandaSemanal.objects
+                .filter(repuesto_taller_id__in=rt_ids, semana__gte=primera, semana__lt=fin)
+                .values("repuesto_taller_id")
+                .annotate(total=Sum("cantidad") + Sum("cantidad_negativa"))
+                .order_by()
+            )
+            for fila in filas:
+                totales[fila["repuesto_taller_id"]] += fila["total"] or 0
+
+        if filtro_bordes:
+            filas = (
+                self._egresos(negativos=True)
+                .filter(filtro_bordes, stock_por_deposito__repuesto_taller_id__in=rt_ids)
+                .values("stock_por_deposito__repuesto_taller_id")
+                .annotate(total=Sum("cantidad"))
+                .order_by()
+            )
+            for fila in filas:
+                totales[fila["stock_por_deposito__repuesto_taller_id"]] += fila["total"] or 0
+
+        return dict(totales)
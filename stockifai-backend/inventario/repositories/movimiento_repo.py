@@ -1,40 +1,99 @@
 from datetime import datetime, time, timedelta
 
 from dateutil.relativedelta import relativedelta
-from django.db import IntegrityError
-from django.db.models import F
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
 from django.utils import timezone
 
 from .base import DuplicateError
 from inventario.models import Movimiento, StockPorDeposito
+
+CHUNK_SIZE = 1000
+
+
 class MovimientoRepo:
     def crear_unico(self, spd: StockPorDeposito, *, tipo: str, cantidad: int, fecha, externo_id: str | None, documento: str | None=None) -> Movimiento:
         mov = Movimiento(stock_por_deposito=spd, tipo=tipo, cantidad=cantidad, fecha=fecha, externo_id=externo_id, documento=documento)
-        try: mov.save()
+        try:
+            # La demanda semanal agregada la actualizan las señales de Movimiento (inventario/signals.py)
+            with transaction.atomic():
+                mov.save()
         except IntegrityError as e: raise DuplicateError("Movimiento duplicado por externo_id") from e
         return mov
 
-    def get_egresos_ultimos_5_anios(self, taller_id: int):
+    def externos_existentes(self, pares) -> set:
         """
-        Devuelve movimientos de EGRESO para el taller indicado, de los últimos 5 años.
+        De los pares (stock_por_deposito_id, externo_id), los que ya tienen un movimiento cargado
+        (mismo alcance que uq_mov_extid_por_stock). Consulta de a CHUNK_SIZE pares.
         """
+        pares = sorted({(spd_id, externo_id) for spd_id, externo_id in pares if externo_id})
+        existentes = set()
+        for i in range(0, len(pares), CHUNK_SIZE):
+            chunk = set(pares[i:i + CHUNK_SIZE])
+            # Ordenados por SPD, cada chunk toca pocos stocks: el índice (spd, externo_id) resuelve el IN
+            filas = Movimiento.objects.filter(
+                stock_por_deposito_id__in={spd_id for spd_id, _ in chunk},
+                externo_id__in={externo_id for _, externo_id in chunk},
+            ).values_list("stock_por_deposito_id", "externo_id")
+            existentes.update(par for par in filas if par in chunk)
+        return existentes
 
+    def crear_nuevos(self, movimientos: list[Movimiento]) -> list[Movimiento]:
+        """
+        bulk_create de los movimientos cuyo (stock_por_deposito, externo_id) no está cargado.
+        Bloquea los StockPorDeposito involucrados y vuelve a verificar antes de insertar, así dos
+        importaciones concurrentes no cuentan el mismo movimiento. Devuelve los creados.
+        """
+        if not movimientos:
+            return []
+        with transaction.atomic():
+            spd_ids = {mov.stock_por_deposito_id for mov in movimientos}
+            list(StockPorDeposito.objects.select_for_update().filter(pk__in=spd_ids).order_by("pk").values_list("pk", flat=True))
+            existentes = self.externos_existentes((mov.stock_por_deposito_id, mov.externo_id) for mov in movimientos)
+            nuevos = [mov for mov in movimientos if (mov.stock_por_deposito_id, mov.externo_id) not in existentes]
+            # Sin ignore_conflicts: con los StockPorDeposito bloqueados no puede haber duplicados,
+            # y en MySQL (INSERT IGNORE) ocultaría cualquier otro error de la fila
+            Movimiento.objects.bulk_create(nuevos, batch_size=CHUNK_SIZE)
+        return nuevos
+
+    def inicio_ventana_egresos(self):
+        """
+        Fecha (aware) desde la que se consideran los EGRESOS para el forecast.
+        """
         cant_anios = 4 #hay datos erroneos con 5
 
         hasta_date = timezone.now()
         desde_date = (hasta_date - relativedelta(years=cant_anios)).date()
+        return timezone.make_aware(datetime.combine(desde_date, time.min))
 
-        desde_dt = timezone.make_aware(datetime.combine(desde_date, time.min))
-        hasta_dt = timezone.make_aware(datetime.combine(hasta_date, time.max))
+    def fin_ventana_egresos(self):
+        return timezone.make_aware(datetime.combine(timezone.now(), time.max))
 
-        query_set = (
+    def _egresos_taller(self, taller_id: int):
+        return (
             Movimiento.objects
             .filter(
                 stock_por_deposito__repuesto_taller__taller_id=taller_id,
                 tipo="EGRESO",
-                fecha__gte=desde_dt,
-                fecha__lt=hasta_dt,
             )
+        )
+
+    def get_egresos_ultimos_5_anios(self, taller_id: int):
+        """
+        Devuelve movimientos de EGRESO para el taller indicado, de los últimos 5 años.
+        """
+        return self.get_egresos_entre(taller_id, self.inicio_ventana_egresos(), self.fin_ventana_egresos())
+
+    def get_egresos_entre(self, taller_id: int, desde_dt, hasta_dt=None):
+        """
+        Movimientos de EGRESO del taller con fecha en [desde_dt, hasta_dt).
+        """
+        query_set = self._egresos_taller(taller_id).filter(fecha__gte=desde_dt)
+        if hasta_dt is not None:
+            query_set = query_set.filter(fecha__lt=hasta_dt)
+
+        query_set = (
+            query_set
             .annotate(
                 numero_pieza=F("stock_por_deposito__repuesto_taller__repuesto__numero_pieza"),
                 descripcion=F("stock_por_deposito__repuesto_taller__repuesto__descripcion"),
@@ -42,6 +101,58 @@ class MovimientoRepo:
             .values("id", "numero_pieza", "descripcion", "fecha", "cantidad")
             .order_by("fecha")
         )
-        print(query_set)
         return query_set
 
+    def iterar_egresos(self, taller_id: int, desde_dt, hasta_dt=None, chunk_size: int = 5000):
+        """
+        Tuplas (numero_pieza, fecha, cantidad) de los EGRESOS del taller con fecha en [desde_dt, hasta_dt),
+        leídas de a `chunk_size` filas paginando por id (keyset). No se usa .iterator(): con mysqlclient
+        no hay cursor del lado del servidor y el resultado completo quedaría en memoria.
+        """
+        query_set = self._egresos_taller(taller_id).filter(fecha__gte=desde_dt)
+        if hasta_dt is not None:
+            query_set = query_set.filter(fecha__lt=hasta_dt)
+        query_set = query_set.order_by("id").values_list(
+            "id", "stock_por_deposito__repuesto_taller__repuesto__numero_pieza", "fecha", "cantidad"
+        )
+
+        ultimo_id = 0
+        while True:
+            lote = list(query_set.filter(id__gt=ultimo_id)[:chunk_size])
+            for _, numero_pieza, fecha, cantidad in lote:
+                yield numero_pieza, fecha, cantidad
+            if len(lote) < chunk_size:
+                return
+            ultimo_id = lote[-1][0]
+
+    def resumen_egresos_hasta(self, taller_id: int, hasta_dt) -> dict:
+        """
+        Huella de los EGRESOS del taller anteriores a hasta_dt (cantidad de filas, suma e id máximo).
+        Sirve para detectar cambios retroactivos en la historia sin traer las filas.
+        """
+        resumen = self._egresos_taller(taller_id).filter(fecha__lt=hasta_dt).aggregate(
+            movimientos=Count("id"), cantidad=Sum("cantidad"), max_id=Max("id")
+        )
+        return {k: int(v or 0) for k, v in resumen.items()}
+
+    def marca_agua_taller(self, taller_id: int) -> dict:
+        """
+        Marca de agua de los movimientos del taller: {"egresos": {...}, "movimientos": {...}} con
+        cantidad de filas, suma de cantidades e id y fecha máximos.
+        Los EGRESOS alimentan el forecast; el resto de los movimientos solo cambian el stock (alertas).
+        """
+        egresos = self._egresos_taller(taller_id).aggregate(
+            filas=Count("id"), cantidad=Sum("cantidad"), max_id=Max("id"), max_fecha=Max("fecha")
+        )
+        movimientos = Movimiento.objects.filter(
+            stock_por_deposito__repuesto_taller__taller_id=taller_id
+        ).aggregate(filas=Count("id"), cantidad=Sum("cantidad"), max_id=Max("id"), max_fecha=Max("fecha"))
+
+        def _serializable(resumen: dict) -> dict:
+            max_fecha = resumen.pop("max_fecha")
+            serializable = {k: int(v or 0) for k, v in resumen.items()}
+            serializable["max_fecha"] = max_fecha.isoformat() if max_fecha else None
+            return serializable
+
+        return {"egresos": _serializable(egresos), "movimientos": _serializable(movimientos)}
+
@@ -1,8 +1,13 @@
+from django.db import transaction
+
 from .base import RepoResult
 from catalogo.models import RepuestoTaller
 from catalogo.models import Repuesto
 from user.models import Taller
 
+CAMPOS_PREDICCION = ['pred_1', 'pred_2', 'pred_3', 'pred_4']
+
+
 class RepuestoTallerRepo:
     def get_or_create(self, repuesto: Repuesto, taller: Taller) -> RepoResult:
         obj, created = RepuestoTaller.objects.get_or_create(repuesto=repuesto, taller=taller)
@@ -42,4 +47,50 @@ class RepuestoTallerRepo:
         return list(
             RepuestoTaller.objects.filter(taller=taller, repuesto_id__in=repuesto_ids)
             .only("id_repuesto_taller", "repuesto_id", "taller_id")
-        )
\ No newline at end of file
+        )
+    def upsert_predicciones(self, taller_id: int, predicciones_por_repuesto: dict, batch_size: int = 1000) -> dict:
+        """
+        Inserta o actualiza pred_1..pred_4 de muchos RepuestoTaller de un taller, solo con ids (sin
+        cargar Repuesto ni RepuestoTaller).
+
+            predicciones_por_repuesto (dict): {repuesto_id: {'pred_1': 10, ..., 'pred_4': 9}}
+
+        Se separan existentes y nuevos con una consulta de ids por lote y se usa bulk_update/bulk_create.
+        No se usa bulk_create(update_conflicts=True): en MySQL cada INSERT ... ON DUPLICATE KEY UPDATE
+        consume un valor del AUTO_INCREMENT aunque la fila ya exista, y casi todas las filas existen.
+        Devuelve {"guardados", "actualizados", "creados"}.
+        """
+        filas = [
+            RepuestoTaller(
+                repuesto_id=repuesto_id,
+                taller_id=taller_id,
+                **{campo: preds.get(campo) for campo in CAMPOS_PREDICCION},
+            )
+            for repuesto_id, preds in predicciones_por_repuesto.items()
+        ]
+        if not filas:
+            return {"guardados": 0, "actualizados": 0, "creados": 0}
+
+        existentes = {}
+        repuesto_ids = list(predicciones_por_repuesto.keys())
+        for i in range(0, len(repuesto_ids), batch_size):
+            existentes.update(
+                RepuestoTaller.objects.filter(taller_id=taller_id, repuesto_id__in=repuesto_ids[i:i + batch_size])
+                .values_list("repuesto_id", "id_repuesto_taller")
+            )
+
+        a_actualizar, a_crear = [], []
+        for fila in filas:
+            pk = existentes.get(fila.repuesto_id)
+            if pk is None:
+                a_crear.append(fila)
+            else:
+                fila.pk = pk
+                a_actualizar.append(fila)
+
+        with transaction.atomic():
+            if a_actualizar:
+                RepuestoTaller.objects.bulk_update(a_actualizar, fields=CAMPOS_PREDICCION, batch_size=batch_size)
+            if a_crear:
+                RepuestoTaller.objects.bulk_create(a_crear, batch_size=batch_size)
+        return {"guardados": len(filas), "actualizados": len(a_actualizar), "creados": len(a_crear)}
@@ -1,8 +1,13 @@
-from django.db.models import F
+from django.db import connection
+from django.db.models import Case, Count, F, IntegerField, Sum, Value, When
 from .base import RepoResult, StockInsufficientError
 from inventario.models import StockPorDeposito, Deposito
 from catalogo.models import RepuestoTaller
 
+CHUNK_SIZE = 1000
+# Tabla temporal (de la sesión) donde se cargan los deltas antes del UPDATE ... JOIN en MySQL
+TABLA_DELTAS = "tmp_deltas_stock"
+
 class StockRepo:
     def get_or_create(self, rt: RepuestoTaller, deposito: Deposito) -> RepoResult:
         obj, created = StockPorDeposito.objects.get_or_create(repuesto_taller=rt, deposito=deposito)
@@ -29,4 +34,60 @@ class StockRepo:
             ).only(
                 "id", "repuesto_taller_id", "deposito_id", "cantidad"
             )
-        )
\ No newline at end of file
+        )
+
+    def huella_stock_taller(self, taller_id: int) -> dict:
+        """
+        Huella del stock del taller: cantidad de filas, suma de cantidades y suma de id * cantidad
+        (cambia aunque el total se mantenga, p. ej. al pasar stock de un repuesto a otro).
+        Cubre los cambios de stock que no dejan Movimiento, como importar_stock.
+        """
+        resumen = StockPorDeposito.objects.filter(repuesto_taller__taller_id=taller_id).aggregate(
+            filas=Count("id"), total=Sum("cantidad"), ponderada=Sum(F("id") * F("cantidad"))
+        )
+        return {k: int(v or 0) for k, v in resumen.items()}
+
+    def aplicar_deltas(self, deltas: dict[int, int]) -> None:
+        """
+        Suma a cada StockPorDeposito su delta ({spd_id: delta}). Llamar dentro de una transacción.
+        En MySQL carga los deltas en una tabla temporal y los aplica con un solo UPDATE ... JOIN;
+        en otros motores (SQLite) usa UPDATE con CASE de a CHUNK_SIZE filas.
+        """
+        items = [(pk, delta) for pk, delta in deltas.items() if delta]
+        if not items:
+            return
+        if connection.vendor == "mysql":
+            self._aplicar_deltas_tabla_temporal(items)
+            return
+
+        for i in range(0, len(items), CHUNK_SIZE):
+            chunk = items[i:i + CHUNK_SIZE]
+            whens = [When(pk=pk, then=F('cantidad') + Value(delta)) for pk, delta in chunk]
+            StockPorDeposito.objects.filter(pk__in=[pk for pk, _ in chunk]).update(
+                cantidad=Case(*whens, default=F('cantidad'), output_field=IntegerField())
+            )
+
+    def _aplicar_deltas_tabla_temporal(self, items: list[tuple[int, int]]) -> None:
+        qn = connection.ops.quote_name
+        tabla = qn(StockPorDeposito._meta.db_table)
+        pk = qn(StockPorDeposito._meta.pk.column)
+        cantidad = qn(StockPorDeposito._meta.get_field('cantidad').column)
+        tmp = qn(TABLA_DELTAS)
+
+        with connection.cursor() as cursor:
+            # IF EXISTS: una importación anterior de la misma conexión pudo fallar antes del DROP
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {tmp}")
+            cursor.execute(f"CREATE TEMPORARY TABLE {tmp} (spd_id BIGINT PRIMARY KEY, delta INT NOT NULL)")
+            try:
+                # mysqlclient arma un INSERT multi-fila por lote
+                for i in range(0, len(items), CHUNK_SIZE * 10):
+                    cursor.executemany(
+                        f"INSERT INTO {tmp} (spd_id, delta) VALUES (%s, %s)",
+                        items[i:i + CHUNK_SIZE * 10],
+                    )
+                cursor.execute(
+                    f"UPDATE {tabla} s JOIN {tmp} d ON d.spd_id = s.{pk} "
+                    f"SET s.{cantidad} = s.{cantidad} + d.delta"
+                )
+            finally:
+                cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {tmp}")
@@ -1,5 +1,7 @@
 from datetime import date, timedelta, datetime, time
+from django.conf import settings
 from ..models import Movimiento
+from ..repositories.demanda_semanal_repo import DemandaSemanalRepo
 from decimal import Decimal, ROUND_HALF_UP
 from typing import List, Optional, Union, Dict
 from django.db.models import Sum, Q
@@ -157,6 +159,9 @@ def batch_calculate_demand(rt_ids: List[int], month_ranges: Dict[str, date]) ->
     start_prev = month_ranges["start_prev"]
     end_curr = month_ranges["end_current"]
 
+    if getattr(settings, "FORECAST_DEMANDA_SEMANAL_AGREGADA", True):
+        return _batch_demand_agregada(rt_ids, month_ranges)
+
     try:
         # Usamos el path completo que se usaba en el filtro original:
         # stock_por_deposito__repuesto_taller_id__in
@@ -192,6 +197,35 @@ def batch_calculate_demand(rt_ids: List[int], month_ranges: Dict[str, date]) ->
         for item in monthly_demand_data
     }
     return demand_map
+
+
+def _batch_demand_agregada(rt_ids: List[int], month_ranges: Dict[str, date]) -> Dict[int, Dict[str, int]]:
+    """
+    Igual que batch_calculate_demand pero leyendo las semanas completas de la tabla agregada
+    (DemandaSemanal); de Movimiento solo se suman los días de los bordes de cada mes.
+    """
+    def _rango(desde: date, hasta: date):
+        # [desde 00:00, hasta + 1 día 00:00) en la zona horaria local, como fecha__date__range
+        return (make_aware_datetime(datetime.combine(desde, time.min)),
+                make_aware_datetime(datetime.combine(hasta + timedelta(days=1), time.min)))
+
+    repo = DemandaSemanalRepo()
+    try:
+        prev = repo.demanda_entre(rt_ids, *_rango(month_ranges["start_prev"], month_ranges["end_prev"]))
+        curr = repo.demanda_entre(rt_ids, *_rango(month_ranges["start_current"], month_ranges["end_current"]))
+    except Exception as e:
+        print(f"Error en batch_calculate_demand: {e}")
+        return {}
+
+    return {
+        rt_id: {
+            'prev': int(round(prev.get(rt_id) or 0)),
+            'curr': int(round(curr.get(rt_id) or 0)),
+        }
+        for rt_id in set(prev) | set(curr)
+    }
+
+
 def get_historical_demand(repuesto_taller_id: int, num_weeks: int = 16) -> Dict[str, List[Union[float, str]]]:
     """
     Calcula la demanda histórica (salidas de inventario) para las últimas 'num_weeks'.
@@ -215,17 +249,29 @@ def get_historical_demand(repuesto_taller_id: int, num_weeks: int = 16) -> Dict[
 
     # 2. Consultar y agregar los movimientos de SALIDA
     try:
-        # En un entorno real de Django/DB, usarías las fechas aware:
-        demand_data = Movimiento.objects.filter(
-            stock_por_deposito__repuesto_taller_id=repuesto_taller_id,
-            tipo='EGRESO',
-            fecha__gte=aware_start_date,  # Usamos la fecha aware
-            fecha__lt=aware_start_of_current_week  # Usamos la fecha aware
-        ).annotate(
-            week=TruncWeek('fecha')
-        ).values('week').annotate(
-            demanda_semanal=Sum('cantidad')
-        ).order_by('week')
+        if getattr(settings, "FORECAST_DEMANDA_SEMANAL_AGREGADA", True):
+            # Mismas semanas (lunes en hora local) que TruncWeek: la tabla agregada (lunes UTC)
+            # más las horas de Movimiento entre cada lunes UTC y el lunes local
+            lunes = [start_date + timedelta(weeks=k) for k in range(num_weeks + 1)]
+            demandas = DemandaSemanalRepo().demanda_por_semana(
+                repuesto_taller_id, [make_aware_datetime(datetime.combine(d, time.min)) for d in lunes]
+            )
+            demand_data = [
+                {'week': datetime.combine(semana, time.min), 'demanda_semanal': cantidad}
+                for semana, cantidad in zip(lunes, demandas) if cantidad
+            ]
+        else:
+            # En un entorno real de Django/DB, usarías las fechas aware:
+            demand_data = Movimiento.objects.filter(
+                stock_por_deposito__repuesto_taller_id=repuesto_taller_id,
+                tipo='EGRESO',
+                fecha__gte=aware_start_date,  # Usamos la fecha aware
+                fecha__lt=aware_start_of_current_week  # Usamos la fecha aware
+            ).annotate(
+                week=TruncWeek('fecha')
+            ).values('week').annotate(
+                demanda_semanal=Sum('cantidad')
+            ).order_by('week')
 
         # Placeholder para simular la demanda histórica
         if not demand_data:
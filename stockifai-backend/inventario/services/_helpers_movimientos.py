@@ -1,7 +1,8 @@
 import re, unicodedata
 import pandas as pd
 from datetime import datetime
-from django.utils.timezone import make_aware
+from django.utils.timezone import get_current_timezone_name, make_aware
+from openpyxl import load_workbook
 
 def read_df(file) -> pd.DataFrame:
     name = getattr(file, 'name', '').lower()
@@ -9,6 +10,43 @@ def read_df(file) -> pd.DataFrame:
         return pd.read_csv(file)
     return pd.read_excel(file)
 
+def iterar_df(file, filas_por_bloque: int = 20000):
+    """
+    Como read_df pero de a bloques de `filas_por_bloque` filas, sin cargar el archivo entero:
+    CSV con read_csv(chunksize) y Excel con openpyxl en modo read_only.
+    El índice de cada bloque es la posición de la fila en el archivo, igual que con read_df.
+    """
+    name = getattr(file, 'name', '').lower()
+    if name.endswith('.csv'):
+        yield from pd.read_csv(file, chunksize=filas_por_bloque)
+        return
+    yield from _iterar_excel(file, filas_por_bloque)
+
+def _iterar_excel(file, filas_por_bloque: int):
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return
+        columnas = [c if c is not None else f"Unnamed: {i}" for i, c in enumerate(encabezado)]
+        ancho = len(columnas)
+
+        bloque, indices = [], []
+        for pos, fila in enumerate(filas):
+            # Filas vacías (formato sin datos): read_excel también las descarta
+            if all(v is None for v in fila):
+                continue
+            bloque.append(tuple(fila[:ancho]) + (None,) * (ancho - len(fila)))
+            indices.append(pos)
+            if len(bloque) >= filas_por_bloque:
+                yield pd.DataFrame(bloque, columns=columnas, index=indices)
+                bloque, indices = [], []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=columnas, index=indices)
+    finally:
+        wb.close()
+
 # --- normalización de encabezados (auto-mapeo con sinónimos) ---
 def _slug(s: str) -> str:
     s = unicodedata.normalize('NFKD', str(s)).encode('ascii', 'ignore').decode('ascii')
@@ -51,23 +89,85 @@ def norm_cols(df: pd.DataFrame, fields_map: dict | None) -> pd.DataFrame:
     return df
 # ----------------------------------------------------------------
 
+_FORMATOS_FECHA = ("%Y-%m-%d","%d/%m/%Y","%d/%m/%Y %H:%M:%S","%Y-%m-%d %H:%M:%S")
+
 def parse_fecha(val):
     if isinstance(val, datetime):
         return make_aware(val) if val.tzinfo is None else val
-    for fmt in ("%Y-%m-%d","%d/%m/%Y","%d/%m/%Y %H:%M:%S","%Y-%m-%d %H:%M:%S"):
+    for fmt in _FORMATOS_FECHA:
         try:
             return make_aware(datetime.strptime(str(val), fmt))
         except Exception:
             pass
     raise ValueError(f"Fecha inválida: {val}")
 
+_TIPOS = {
+    "I":"INGRESO","INGRESO":"INGRESO","ENTRADA":"INGRESO",
+    "E":"EGRESO","EGRESO":"EGRESO","SALIDA":"EGRESO",
+    "AJUSTE+":"AJUSTE+","AJUSTE-":"AJUSTE-"
+}
+
 def norm_tipo(v: str) -> str:
     v = str(v).strip().upper()
-    mapa = {
-        "I":"INGRESO","INGRESO":"INGRESO","ENTRADA":"INGRESO",
-        "E":"EGRESO","EGRESO":"EGRESO","SALIDA":"EGRESO",
-        "AJUSTE+":"AJUSTE+","AJUSTE-":"AJUSTE-"
-    }
-    if v not in mapa:
+    if v not in _TIPOS:
         raise ValueError(f"Tipo inválido: {v}")
-    return mapa[v]
+    return _TIPOS[v]
+
+# --- versiones vectorizadas (columna completa) ---
+def _matchea(texto: str, fmt: str) -> bool:
+    try:
+        datetime.strptime(texto, fmt)
+        return True
+    except ValueError:
+        return False
+
+def parse_fechas(col: pd.Series) -> pd.Series:
+    """
+    parse_fecha sobre toda la columna: prueba cada formato de _FORMATOS_FECHA sobre las filas
+    que siguen sin fecha (y por último ISO 8601). Devuelve fechas aware en la zona local; NaT si no se pudo.
+    """
+    # Por nombre: pandas localiza mucho más rápido que con el ZoneInfo de Django
+    tz = get_current_timezone_name()
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.tz_convert(tz) if col.dt.tz is not None else col.dt.tz_localize(tz, ambiguous='NaT', nonexistent='NaT')
+
+    partes = []
+    # Celdas que ya vienen como fecha (Excel con tipos mezclados) van por el camino de a una
+    es_fecha = col.map(lambda v: isinstance(v, datetime) and not pd.isna(v)).astype(bool)
+    if es_fecha.any():
+        partes.append(pd.to_datetime(col[es_fecha].map(parse_fecha), utc=True))
+
+    textos = col[~es_fecha & col.notna()].astype(str)
+    # Los formatos son excluyentes entre sí: primero el que matchea la primera fila
+    # (normalmente todo el archivo), después el resto en orden
+    formatos = _FORMATOS_FECHA + ("ISO8601",)
+    if not textos.empty:
+        inferido = next((f for f in _FORMATOS_FECHA if _matchea(textos.iat[0], f)), None)
+        if inferido:
+            formatos = (inferido,) + tuple(f for f in formatos if f != inferido)
+    for fmt in formatos:
+        if textos.empty:
+            break
+        parseadas = pd.to_datetime(textos, format=fmt, errors='coerce')
+        if not pd.api.types.is_datetime64_any_dtype(parseadas):
+            # ISO 8601 con distintos husos horarios: esas filas quedan para el error de fecha
+            continue
+        ok = parseadas.notna()
+        if ok.any():
+            parseadas = parseadas[ok]
+            if parseadas.dt.tz is None:
+                parseadas = parseadas.dt.tz_localize(tz, ambiguous='NaT', nonexistent='NaT')
+            partes.append(parseadas.dt.tz_convert('UTC'))
+        textos = textos[~ok]
+
+    if not partes:
+        return pd.Series(pd.NaT, index=col.index, dtype=pd.DatetimeTZDtype(tz=tz))
+    return pd.concat(partes).reindex(col.index).dt.tz_convert(tz)
+
+def norm_tipos(col: pd.Series) -> tuple[pd.Series, pd.Series]:
+    """
+    norm_tipo sobre toda la columna con un lookup por categoría. Devuelve (tipos, texto normalizado);
+    los tipos inválidos quedan en NaN.
+    """
+    texto = col.astype(str).str.strip().str.upper().astype('category')
+    return texto.map(_TIPOS).astype(object), texto.astype(str)
@@ -0,0 +1,106 @@
+"""
+Locks entre procesos para limitar cuántos workers corren a la vez.
+
+En MySQL usa GET_LOCK sobre una conexión propia (vale entre servidores y el motor lo libera
+si el proceso muere). En otros motores usa flock sobre un archivo del directorio temporal,
+que solo limita los procesos de la misma máquina.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Optional
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin límite entre procesos
+    fcntl = None
+
+
+class _LugarMysql:
+    def __init__(self, nombre: str):
+        # Conexión aparte: close_old_connections() del worker no debe soltar el lock
+        self.conexion = connections.create_connection(DEFAULT_DB_ALIAS)
+        self.nombre = nombre[:64]
+
+    def tomar(self) -> bool:
+        with self.conexion.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 0)", [self.nombre])
+            return cursor.fetchone()[0] == 1
+
+    def mantener(self):
+        # Evita que wait_timeout cierre la conexión (y suelte el lock) en un worker ocioso
+        with self.conexion.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    def soltar(self):
+        try:
+            with self.conexion.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", [self.nombre])
+        finally:
+            self.conexion.close()
+
+
+class _LugarArchivo:
+    def __init__(self, nombre: str):
+        self.ruta = os.path.join(tempfile.gettempdir(), f"stockifai-{nombre}.lock")
+        self.archivo = None
+
+    def tomar(self) -> bool:
+        self.archivo = open(self.ruta, "a")
+        try:
+            fcntl.flock(self.archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self.archivo.close()
+            return False
+
+    def mantener(self):
+        pass
+
+    def soltar(self):
+        self.archivo.close()  # cerrar el archivo libera el flock
+
+
+class _LugarLibre:
+    # Sin fcntl (Windows) no se limita
+    def tomar(self) -> bool:
+        return True
+
+    def mantener(self):
+        pass
+
+    def soltar(self):
+        pass
+
+
+def _candidato(nombre: str):
+    if connections[DEFAULT_DB_ALIAS].vendor == "mysql":
+        return _LugarMysql(f"stockifai.{nombre}")
+    if fcntl is not None:
+        return _LugarArchivo(nombre)
+    return _LugarLibre()
+
+
+@contextmanager
+def tomar_lugar(nombre: str, lugares: int):
+    """
+    Intenta tomar uno de `lugares` locks (`nombre-0` ... `nombre-{lugares-1}`) sin esperar.
+    Devuelve el lugar tomado (con `mantener()` para llamar cada tanto) o None si están todos ocupados.
+    """
+    lugar: Optional[object] = None
+    for i in range(max(1, lugares)):
+        candidato = _candidato(f"{nombre}-{i}")
+        if candidato.tomar():
+            lugar = candidato
+            break
+        if isinstance(candidato, _LugarMysql):
+            candidato.conexion.close()
+    try:
+        yield lugar
+    finally:
+        if lugar is not None:
+            lugar.soltar()
@@ -1,9 +1,12 @@
 from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
 from django.db import transaction, connection
-from django.db.models import F, Value, Case, When, IntegerField
 
 from catalogo.models import RepuestoTaller
-from ._helpers_movimientos import read_df, norm_cols, parse_fecha, norm_tipo
+from ._helpers_movimientos import read_df, iterar_df, norm_cols, parse_fecha, norm_tipo, parse_fechas, norm_tipos
 from ..models import StockPorDeposito, Movimiento
 from ..repositories.taller_repo import TallerRepo
 from ..repositories.deposito_repo import DepositoRepo
@@ -11,6 +14,7 @@ from ..repositories.repuesto_repo import RepuestoRepo
 from ..repositories.repuesto_taller_repo import RepuestoTallerRepo
 from ..repositories.stock_repo import StockRepo
 from ..repositories.movimiento_repo import MovimientoRepo
+from ..repositories.demanda_semanal_repo import DemandaSemanalRepo
 from ..repositories.base import DuplicateError, NotFoundError, StockInsufficientError
 
 taller_repo = TallerRepo()
@@ -19,6 +23,7 @@ repuesto_repo = RepuestoRepo()
 rt_repo = RepuestoTallerRepo()
 stock_repo = StockRepo()
 mov_repo = MovimientoRepo()
+demanda_repo = DemandaSemanalRepo()
 
 BULK_BATCH = 2000
 CHUNK_SIZE = 1000
@@ -26,14 +31,27 @@ CHUNK_SIZE = 1000
 
 def importar_movimientos(*, file, taller_id: int, fields_map: dict | None = None,
                          deposito_id: int | None = None, deposito_nombre: str | None = None,
-                         permitir_stock_negativo: bool = True):
+                         permitir_stock_negativo: bool = True, streaming: bool | None = None,
+                         progreso=None):
     """
     Versión optimizada del import de movimientos - asume repuestos y depósitos ya existen.
     MODIFICADO: Ahora devuelve los IDs de los repuestos afectados por la importación.
+    En modo streaming (IMPORTACION_STREAMING) el archivo se lee y se importa de a bloques de
+    IMPORTACION_FILAS_POR_BLOQUE filas, así la memoria no depende del tamaño del archivo.
+    Todo el archivo se importa en una sola transacción: si un bloque falla (p. ej. un repuesto o
+    depósito inexistente) no queda nada de los anteriores y el archivo se puede reimportar entero.
+    `progreso`, si viene, se llama después de cada bloque con los contadores acumulados
+    (filas_leidas, insertados, ignorados, rechazados); lo escrito en la DB con esta conexión
+    no se ve desde otras hasta el final.
     """
-    # 1) Leer y normalizar archivo
-    df = read_df(file)
-    df = norm_cols(df, fields_map or {})
+    if streaming is None:
+        streaming = getattr(settings, "IMPORTACION_STREAMING", True)
+
+    # 1) Leer el archivo (completo o por bloques)
+    if streaming:
+        bloques = iterar_df(file, getattr(settings, "IMPORTACION_FILAS_POR_BLOQUE", 20000))
+    else:
+        bloques = [read_df(file)]
 
     # 2) Configurar contexto
     taller = taller_repo.get(taller_id)
@@ -49,29 +67,52 @@ def importar_movimientos(*, file, taller_id: int, fields_map: dict | None = None
     _configure_db_for_bulk_aws()
 
     try:
-        # 4) Pre-procesar datos
-        processed_data = _preprocess_data(df, deposito_default)
+        result = {"insertados": 0, "ignorados": 0, "rechazados": 0, "errores": []}
+        # IDs de los RepuestoTaller que se procesaron, para recalcularles las alertas
+        repuestos_afectados_ids = {}
+        filas_leidas = 0
 
-        # 5) Prefetch solo lo necesario (2-3 queries MAX)
-        entities = _prefetch_entities_simple(processed_data, taller)
+        # Se lee por bloques pero se confirma todo junto (igual que sin streaming)
+        with transaction.atomic():
+            for df in bloques:
+                df = norm_cols(df, fields_map or {})
+                filas_leidas += len(df)
+                parcial, rt_ids = _importar_bloque(df, taller, deposito_default, permitir_stock_negativo)
+                for clave in ("insertados", "ignorados", "rechazados"):
+                    result[clave] += parcial[clave]
+                result["errores"].extend(parcial["errores"])
+                repuestos_afectados_ids.update(dict.fromkeys(rt_ids))
+                if progreso is not None:
+                    progreso({
+                        "filas_leidas": filas_leidas,
+                        "insertados": result["insertados"],
+                        "ignorados": result["ignorados"],
+                        "rechazados": result["rechazados"],
+                    })
+
+        result["repuestos_afectados_ids"] = list(repuestos_afectados_ids)
+        return result
 
-        # 6) Crear solo RT y SPD faltantes (mínimo)
-        _create_minimal_entities(processed_data, entities, taller)
+    finally:
+        _restore_db_config()
 
-        # 7) Procesar movimientos en bulk
-        result = _process_bulk_movimientos(
-            processed_data, entities, permitir_stock_negativo
-        )
 
-        # Extraemos los IDs de los RepuestoTaller que se procesaron
-        # para saber a cuáles debemos recalcularles las alertas.
-        repuestos_afectados_ids = [rt.pk for rt in entities["repuesto_taller"].values()]
-        result["repuestos_afectados_ids"] = repuestos_afectados_ids
+def _importar_bloque(df, taller, deposito_default, permitir_stock_negativo):
+    """Importa un bloque de filas ya normalizado. Devuelve (resultado, ids de RepuestoTaller)."""
+    # 4) Pre-procesar datos
+    processed_data = _preprocess_data(df, deposito_default)
 
-        return result
+    # 5) Prefetch solo lo necesario (2-3 queries MAX)
+    entities = _prefetch_entities_simple(processed_data, taller)
 
-    finally:
-        _restore_db_config()
+    # 6) Crear solo RT y SPD faltantes (mínimo)
+    _create_minimal_entities(processed_data, entities, taller)
+
+    # 7) Procesar movimientos en bulk
+    result = _process_bulk_movimientos(
+        processed_data, entities, permitir_stock_negativo
+    )
+    return result, [rt.pk for rt in entities["repuesto_taller"].values()]
 
 
 def _configure_db_for_bulk_aws():
@@ -104,7 +145,77 @@ def _restore_db_config():
         pass
 
 
-def _preprocess_data(df, deposito_default):
+def _texto_opcional(df, columna):
+    """Columna de texto con strip; None donde falta la columna, la celda está vacía o es NaN."""
+    if columna not in df.columns:
+        return pd.Series(np.full(len(df), None, dtype=object), index=df.index)
+    col = df[columna]
+    texto = col.astype(str).str.strip()
+    return pd.Series(np.where(col.notna() & (texto != ''), texto, None), index=df.index, dtype=object)
+
+
+def _preprocess_data(df, deposito_default, vectorizado: bool = True):
+    """
+    Pre-procesa y valida los datos del archivo con operaciones por columna.
+    Cada fila inválida genera un error con su número de línea en el archivo (índice + 2),
+    con la misma prioridad que la versión por fila: fecha, tipo, cantidad, depósito.
+    """
+    if not vectorizado:
+        return _preprocess_data_por_fila(df, deposito_default)
+
+    numero_pieza = df['numero_pieza'].astype(str).str.strip()
+    fechas = parse_fechas(df['fecha'])
+    tipos, tipos_texto = norm_tipos(df['tipo'])
+
+    # int() de la versión por fila: se aceptan números (truncados) y texto con un entero
+    cantidades = pd.to_numeric(df['cantidad'], errors='coerce')
+    cantidades_ok = cantidades.notna() & np.isfinite(cantidades.astype(float))
+    if not pd.api.types.is_numeric_dtype(df['cantidad']):
+        # "2.7" como texto es inválido aunque 2.7 como número se trunque
+        es_texto = df['cantidad'].map(type).eq(str)
+        texto_entero = df['cantidad'].where(es_texto, "").str.fullmatch(r"\s*[+-]?\d+\s*")
+        cantidades_ok &= ~es_texto | texto_entero
+
+    depositos = _texto_opcional(df, 'deposito')
+    if deposito_default:
+        depositos = depositos.fillna(deposito_default.nombre)
+
+    # Motivo del primer error de cada fila (el orden de los where define la prioridad)
+    motivos = pd.Series(None, index=df.index, dtype=object)
+    motivos = motivos.where(depositos.notna(), "Depósito no especificado")
+    motivos = motivos.where(cantidades_ok, "Cantidad inválida: " + df['cantidad'].astype(str))
+    motivos = motivos.where(tipos.notna(), "Tipo inválido: " + tipos_texto)
+    motivos = motivos.where(fechas.notna(), "Fecha inválida: " + df['fecha'].astype(str))
+
+    invalidas = motivos.notna()
+    errores = [
+        {"fila": int(idx) + 2, "motivo": motivo}
+        for idx, motivo in motivos[invalidas].items()
+    ]
+
+    validas = ~invalidas
+    columnas = {
+        'idx': df.index[validas],
+        'numero_pieza': numero_pieza[validas],
+        'fecha': fechas[validas],
+        'tipo': tipos[validas],
+        'cantidad': np.trunc(cantidades[validas].astype(float)).astype(int),
+        'externo_id': _texto_opcional(df, 'externo_id')[validas],
+        'deposito': depositos[validas],
+        'documento': _texto_opcional(df, 'documento')[validas],
+    }
+    processed_rows = [
+        dict(zip(columnas, valores))
+        for valores in zip(*(col.tolist() for col in columnas.values()))
+    ]
+
+    return {
+        'rows': processed_rows,
+        'errores': errores
+    }
+
+
+def _preprocess_data_por_fila(df, deposito_default):
     """Pre-procesa y valida los datos del archivo."""
     processed_rows = []
     errores = []
@@ -161,7 +272,6 @@ def _prefetch_entities_simple(processed_data, taller):
     # Extraer únicos
     numeros_pieza = list(set(row['numero_pieza'] for row in rows))
     depositos_nombres = list(set(row['deposito'] for row in rows))
-    externos_ids = [row['externo_id'] for row in rows if row['externo_id']]
 
     # QUERY 1: Repuestos (deben existir)
     repuestos_list = repuesto_repo.list_by_numeros(numeros_pieza)
@@ -194,12 +304,18 @@ def _prefetch_entities_simple(processed_data, taller):
         )
         spd_exist = {(s.repuesto_taller_id, s.deposito_id): s for s in spd_list}
 
-    # QUERY 5: Movimientos existentes (para duplicados)
-    movimientos_existentes = set()
-    if externos_ids:
-        from ..models import Movimiento
-        existing_movs = Movimiento.objects.filter(externo_id__in=externos_ids).values_list('externo_id', flat=True)
-        movimientos_existentes = set(existing_movs)
+    # QUERY 5: Movimientos existentes (para duplicados), por (SPD, externo_id) como la constraint.
+    # Los SPD que todavía no existen no pueden tener movimientos cargados.
+    pares = []
+    for row in rows:
+        if not row['externo_id']:
+            continue
+        rep = repuestos_exist[row['numero_pieza']]
+        rt = rt_exist.get(rep.pk)
+        spd = spd_exist.get((rt.pk, depositos_exist[row['deposito']].pk)) if rt else None
+        if spd is not None:
+            pares.append((spd.pk, row['externo_id']))
+    movimientos_existentes = mov_repo.externos_existentes(pares)
 
     return {
         'repuestos': repuestos_exist,
@@ -267,6 +383,11 @@ def _create_minimal_entities(processed_data, entities, taller):
                 entities['stock'][(rt_id, dep_id)] = spd
 
 
+def _delta(tipo, cantidad):
+    """Efecto del movimiento en el stock: EGRESO y AJUSTE- restan, INGRESO y AJUSTE+ suman."""
+    return -cantidad if tipo in ("EGRESO", "AJUSTE-") else cantidad
+
+
 def _process_bulk_movimientos(processed_data, entities, permitir_stock_negativo):
     """Procesa movimientos en bulk y actualiza stock."""
 
@@ -283,11 +404,6 @@ def _process_bulk_movimientos(processed_data, entities, permitir_stock_negativo)
     # Procesar cada fila
     for row in rows:
         try:
-            # Verificar duplicado por externo_id
-            if row['externo_id'] and row['externo_id'] in entities['movimientos_existentes']:
-                ignorados += 1
-                continue
-
             # Resolver entidades (deben existir)
             rep = entities['repuestos'][row['numero_pieza']]
             dep = entities['depositos'][row['deposito']]
@@ -299,9 +415,15 @@ def _process_bulk_movimientos(processed_data, entities, permitir_stock_negativo)
                 spd = StockPorDeposito.objects.get(repuesto_taller_id=rt.pk, deposito_id=dep.pk)
                 entities['stock'][(rt.pk, dep.pk)] = spd
 
+            # Verificar duplicado por (SPD, externo_id): ya cargado o repetido en el archivo
+            clave = (spd.pk, row['externo_id'])
+            if row['externo_id'] and clave in entities['movimientos_existentes']:
+                ignorados += 1
+                continue
+
             # Calcular delta de stock
-            if row['tipo'] in ("EGRESO", "AJUSTE-"):
-                delta = -row['cantidad']
+            delta = _delta(row['tipo'], row['cantidad'])
+            if delta < 0:
                 # Validar stock negativo
                 if not permitir_stock_negativo:
                     stock_actual = getattr(spd, 'cantidad', 0)
@@ -311,8 +433,6 @@ def _process_bulk_movimientos(processed_data, entities, permitir_stock_negativo)
                             f"Stock insuficiente para {row['numero_pieza']} en {row['deposito']}. "
                             f"Actual: {stock_actual}, Requerido: {row['cantidad']}"
                         )
-            else:  # INGRESO, AJUSTE+
-                delta = row['cantidad']
 
             # Preparar movimiento
             movimientos_bulk.append(Movimiento(
@@ -327,43 +447,35 @@ def _process_bulk_movimientos(processed_data, entities, permitir_stock_negativo)
             # Acumular delta para stock
             deltas_por_spd[spd.pk] += delta
             insertados += 1
+            if row['externo_id']:
+                entities['movimientos_existentes'].add(clave)
 
         except (NotFoundError, StockInsufficientError, ValueError, KeyError) as ex:
             errores.append({"fila": row['idx'] + 2, "motivo": str(ex)})
 
-    # Bulk create movimientos
-    if movimientos_bulk:
+    # Movimientos, demanda semanal y stock del bloque juntos (nunca movimientos sin su stock)
+    with transaction.atomic():
+        # Bulk create movimientos (los que otra importación cargó mientras tanto se ignoran)
         for i in range(0, len(movimientos_bulk), CHUNK_SIZE):
             chunk = movimientos_bulk[i:i + CHUNK_SIZE]
-            with transaction.atomic():
-                try:
-                    Movimiento.objects.bulk_create(
-                        chunk,
-                        batch_size=CHUNK_SIZE,
-                        ignore_conflicts=False
-                    )
-                except Exception as ex:
-                    # Manejar duplicados individualmente
-                    print(type(ex).__name__, str(ex))
-                    for mov in chunk:
-                        try:
-                            mov.save()
-                        except Exception:
-                            ignorados += 1
-                            insertados -= 1
-
-    # Bulk update stock
-    if deltas_por_spd:
-        items = list(deltas_por_spd.items())
-        for i in range(0, len(items), CHUNK_SIZE):
-            chunk = items[i:i + CHUNK_SIZE]
-            pks = [pk for pk, _ in chunk]
-            whens = [When(pk=pk, then=F('cantidad') + Value(delta)) for pk, delta in chunk]
-
-            with transaction.atomic():
-                StockPorDeposito.objects.filter(pk__in=pks).update(
-                    cantidad=Case(*whens, default=F('cantidad'), output_field=IntegerField())
-                )
+            creados = mov_repo.crear_nuevos(chunk)
+            if len(creados) < len(chunk):
+                ids_creados = {id(mov) for mov in creados}
+                for mov in chunk:
+                    if id(mov) not in ids_creados:
+                        ignorados += 1
+                        insertados -= 1
+                        deltas_por_spd[mov.stock_por_deposito_id] -= _delta(mov.tipo, mov.cantidad)
+
+            # Demanda semanal agregada: solo los EGRESOS que efectivamente se crearon
+            demanda_repo.registrar_egresos(
+                (mov.stock_por_deposito.repuesto_taller_id, mov.fecha, mov.cantidad)
+                for mov in creados if mov.tipo == "EGRESO"
+            )
+
+        # Bulk update stock (tabla temporal + UPDATE ... JOIN en MySQL)
+        if deltas_por_spd:
+            stock_repo.aplicar_deltas(deltas_por_spd)
 
     return {
         "insertados": insertados,
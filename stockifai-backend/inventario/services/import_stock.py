@@ -3,7 +3,6 @@ from collections import defaultdict
 from uuid import uuid4
 
 from django.db import transaction, connection, ProgrammingError
-from django.db.models import F, Value, Case, When, IntegerField
 from django.utils import timezone
 
 from catalogo.models import Repuesto, RepuestoTaller
@@ -204,6 +203,8 @@ def _process_movements_and_deltas(df, entities, batch_id, hoy, documento, mode,
     errores = []
     movimientos_bulk = []
     deltas_por_spd = defaultdict(int)
+    # IDs de los RepuestoTaller con stock modificado, para recalcularles las alertas
+    repuestos_afectados_ids = {}
 
     for idx, row in df.iterrows():
         try:
@@ -248,6 +249,7 @@ def _process_movements_and_deltas(df, entities, batch_id, hoy, documento, mode,
                 documento=documento,
             ))
             deltas_por_spd[spd.pk] += delta
+            repuestos_afectados_ids[rt.pk] = None
             procesados += 1
 
         except (NotFoundError, ValueError, KeyError) as ex:
@@ -260,16 +262,9 @@ def _process_movements_and_deltas(df, entities, batch_id, hoy, documento, mode,
             batch_size=BULK_BATCH,
         )
 
-    # UPDATE masivo de stock
+    # UPDATE masivo de stock (tabla temporal + UPDATE ... JOIN en MySQL)
     if deltas_por_spd:
-        items = list(deltas_por_spd.items())
-        for i in range(0, len(items), CHUNK_SIZE):
-            chunk = items[i:i + CHUNK_SIZE]
-            pks = [pk for pk, _ in chunk]
-            whens = [When(pk=pk, then=F('cantidad') + Value(d)) for pk, d in chunk]
-            StockPorDeposito.objects.filter(pk__in=pks).update(
-                cantidad=Case(*whens, default=F('cantidad'), output_field=IntegerField())
-            )
+        stock_repo.aplicar_deltas(deltas_por_spd)
 
     return {
         "procesados": procesados,
@@ -277,4 +272,5 @@ def _process_movements_and_deltas(df, entities, batch_id, hoy, documento, mode,
         "errores": errores,
         "mode": mode,
         "batch": batch_id,
+        "repuestos_afectados_ids": list(repuestos_afectados_ids),
     }
\ No newline at end of file
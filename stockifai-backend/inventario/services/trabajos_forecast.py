@@ -0,0 +1,248 @@
+"""
+Cola de trabajos de forecast en la DB (TrabajoForecast).
+
+- La API encola (`encolar_trabajo_forecast`) y responde enseguida con el id del trabajo.
+- El comando `procesar_trabajos_forecast` toma los pendientes (`tomar_siguiente_trabajo`) y los
+  ejecuta (`ejecutar_trabajo`), registrando la etapa en curso para que el cliente consulte el progreso.
+- Un taller tiene como máximo un trabajo activo (pendiente o en curso): encolar de nuevo devuelve el existente.
+  forecast_all también reserva cada taller con un trabajo EN_CURSO (`reservar_talleres`), así no se
+  superpone con la cola.
+- Mientras un trabajo corre, un hilo actualiza `ultimo_latido`; solo se liberan los trabajos cuyo
+  worker dejó de latir (`liberar_trabajos_colgados`).
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from AI.services.forecast_paralelo import ejecutar_en_procesos
+from AI.services.forecast_pipeline import ejecutar_forecast_y_alertas_taller
+from inventario.models import TrabajoForecast
+from user.api.models.models import Taller
+
+
+def _nombre_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _a_fecha_lunes(fecha_lunes) -> date:
+    if not fecha_lunes:
+        raise ValueError("fecha_lunes es requerida")
+    if isinstance(fecha_lunes, str):
+        fecha_lunes = datetime.strptime(fecha_lunes, "%Y-%m-%d").date()
+    elif isinstance(fecha_lunes, datetime):
+        fecha_lunes = fecha_lunes.date()
+    return fecha_lunes - timedelta(days=fecha_lunes.weekday())
+
+
+def encolar_trabajo_forecast(taller_id: int, fecha_lunes, usuario=None) -> Tuple[TrabajoForecast, bool]:
+    """
+    Encola el forecast de un taller. Si ya hay un trabajo activo para el taller lo devuelve
+    en lugar de crear otro. Devuelve (trabajo, creado).
+    """
+    fecha = _a_fecha_lunes(fecha_lunes)
+    with transaction.atomic():
+        # El lock sobre el taller serializa los encolados concurrentes del mismo taller
+        Taller.objects.select_for_update().get(id=taller_id)
+        activo = TrabajoForecast.objects.filter(
+            taller_id=taller_id, estado__in=TrabajoForecast.ESTADOS_ACTIVOS
+        ).first()
+        if activo is not None:
+            return activo, False
+
+        trabajo = TrabajoForecast.objects.create(
+            taller_id=taller_id,
+            fecha_lunes=fecha,
+            solicitado_por=usuario if usuario is not None and getattr(usuario, "pk", None) else None,
+        )
+    return trabajo, True
+
+
+def tomar_siguiente_trabajo(worker: Optional[str] = None) -> Optional[TrabajoForecast]:
+    """
+    Toma el trabajo pendiente más antiguo y lo marca EN_CURSO. Varios workers pueden
+    correr a la vez: skip_locked saltea los que otro worker está tomando.
+    """
+    worker = worker or _nombre_worker()
+    with transaction.atomic():
+        trabajo = (
+            TrabajoForecast.objects.select_for_update(skip_locked=True)
+            .filter(estado=TrabajoForecast.Estado.PENDIENTE)
+            .order_by("fecha_creacion", "id")
+            .first()
+        )
+        if trabajo is None:
+            return None
+
+        ahora = timezone.now()
+        # Update condicional: en motores sin select_for_update gana un solo worker
+        tomado = TrabajoForecast.objects.filter(
+            pk=trabajo.pk, estado=TrabajoForecast.Estado.PENDIENTE
+        ).update(estado=TrabajoForecast.Estado.EN_CURSO, fecha_inicio=ahora, ultimo_latido=ahora, worker=worker)
+        if not tomado:
+            return None
+
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+def marcar_etapa(trabajo: TrabajoForecast, etapa: str):
+    """
+    Registra que el trabajo entró en `etapa` (y cierra la anterior) en `progreso`.
+    """
+    ahora = timezone.now().isoformat()
+    progreso = dict(trabajo.progreso or {})
+    if trabajo.etapa and trabajo.etapa in progreso:
+        progreso[trabajo.etapa]["fin"] = ahora
+    progreso[etapa] = {"inicio": ahora, "fin": None}
+
+    trabajo.etapa = etapa
+    trabajo.progreso = progreso
+    trabajo.save(update_fields=["etapa", "progreso"])
+
+
+def reservar_talleres(taller_ids: Iterable[int], fecha_lunes, worker: Optional[str] = None) -> Dict[int, TrabajoForecast]:
+    """
+    Crea un trabajo ya EN_CURSO para cada taller sin trabajo activo (lo usa forecast_all).
+    Mientras tanto la API devuelve ese trabajo al encolar y la cola no procesa el taller.
+    Los talleres con un trabajo activo quedan afuera: ya los está procesando la cola.
+    """
+    fecha = _a_fecha_lunes(fecha_lunes)
+    worker = worker or _nombre_worker()
+    reservados: Dict[int, TrabajoForecast] = {}
+    for taller_id in taller_ids:
+        with transaction.atomic():
+            Taller.objects.select_for_update().get(id=taller_id)
+            if TrabajoForecast.objects.filter(taller_id=taller_id, estado__in=TrabajoForecast.ESTADOS_ACTIVOS).exists():
+                continue
+            ahora = timezone.now()
+            reservados[taller_id] = TrabajoForecast.objects.create(
+                taller_id=taller_id, fecha_lunes=fecha, estado=TrabajoForecast.Estado.EN_CURSO,
+                fecha_inicio=ahora, ultimo_latido=ahora, worker=worker,
+            )
+    return reservados
+
+
+@contextmanager
+def latidos(trabajos: List[TrabajoForecast]):
+    """
+    Mientras dura el bloque, un hilo actualiza `ultimo_latido` de los trabajos cada
+    FORECAST_TRABAJO_LATIDO_SEGUNDOS (el pipeline corre en C sin soltar este proceso).
+    """
+    segundos = getattr(settings, "FORECAST_TRABAJO_LATIDO_SEGUNDOS", 60)
+    ids = [trabajo.pk for trabajo in trabajos]
+    fin = threading.Event()
+
+    def _latir():
+        try:
+            while not fin.wait(segundos):
+                try:
+                    TrabajoForecast.objects.filter(
+                        pk__in=ids, estado=TrabajoForecast.Estado.EN_CURSO
+                    ).update(ultimo_latido=timezone.now())
+                except Exception as e:
+                    print(f"No se pudo registrar el latido de los trabajos {ids}: {e}")
+        finally:
+            # Las conexiones son por hilo: se cierran las de este
+            connections.close_all()
+
+    hilo = threading.Thread(target=_latir, name="latido-forecast", daemon=True)
+    hilo.start()
+    try:
+        yield
+    finally:
+        fin.set()
+        hilo.join()
+
+
+def _cerrar(trabajo: TrabajoForecast, estado: str, resultado=None, error: Optional[str] = None) -> bool:
+    """
+    Deja el estado final si el trabajo sigue EN_CURSO con este worker. Si otro proceso lo liberó
+    mientras tanto (y el taller pudo volver a encolarse) no se pisa nada. Devuelve si lo cerró.
+    """
+    ahora = timezone.now()
+    progreso = dict(trabajo.progreso or {})
+    if trabajo.etapa and trabajo.etapa in progreso and progreso[trabajo.etapa].get("fin") is None:
+        progreso[trabajo.etapa]["fin"] = ahora.isoformat()
+
+    cerrado = TrabajoForecast.objects.filter(
+        pk=trabajo.pk, estado=TrabajoForecast.Estado.EN_CURSO, worker=trabajo.worker
+    ).update(estado=estado, progreso=progreso, resultado=resultado, error=error, fecha_fin=ahora)
+    if not cerrado:
+        print(f"El trabajo de forecast {trabajo.id} ya no estaba en curso con este worker; no se actualiza.")
+        trabajo.refresh_from_db()
+        return False
+
+    trabajo.estado = estado
+    trabajo.progreso = progreso
+    trabajo.resultado = resultado
+    trabajo.error = error
+    trabajo.fecha_fin = ahora
+    return True
+
+
+def cerrar_reserva(trabajo: TrabajoForecast, resultado: dict):
+    """Cierra el trabajo de reservar_talleres con el resultado de forecast_all para ese taller."""
+    if resultado.get("ok"):
+        _cerrar(trabajo, TrabajoForecast.Estado.COMPLETADO, resultado=json.loads(json.dumps(resultado, default=str)))
+    else:
+        _cerrar(trabajo, TrabajoForecast.Estado.ERROR, error=resultado.get("error"))
+
+
+def _ejecutar_trabajo_en_hijo(trabajo_id: int) -> dict:
+    # Corre en un proceso aparte (ver ejecutar_trabajo); la etapa se registra desde acá
+    trabajo = TrabajoForecast.objects.get(pk=trabajo_id)
+    out = ejecutar_forecast_y_alertas_taller(
+        trabajo.taller_id,
+        trabajo.fecha_lunes,
+        progreso=lambda etapa: marcar_etapa(trabajo, etapa),
+    )
+    # El resultado del pipeline se guarda en JSON (fechas y numpy como texto)
+    return json.loads(json.dumps(out, default=str))
+
+
+def ejecutar_trabajo(trabajo: TrabajoForecast) -> TrabajoForecast:
+    """
+    Corre el forecast + alertas del trabajo (ya tomado) y deja el resultado o el error.
+    El pipeline corre en un proceso hijo: si supera FORECAST_TIMEOUT_POR_TALLER se lo termina
+    desde este proceso (LightGBM no se puede interrumpir desde adentro).
+    """
+    timeout = getattr(settings, "FORECAST_TIMEOUT_POR_TALLER", None)
+    # Pueden correr hasta FORECAST_MAX_WORKERS workers a la vez: se reparten los cores
+    hilos = max(1, (os.cpu_count() or 1) // getattr(settings, "FORECAST_MAX_WORKERS", 1))
+    tarea = (trabajo.pk, f"{__name__}._ejecutar_trabajo_en_hijo", (trabajo.pk,))
+    with latidos([trabajo]):
+        ok, valor, _ = ejecutar_en_procesos([tarea], 1, timeout, hilos_por_worker=hilos)[trabajo.pk]
+
+    # El hijo fue registrando las etapas en la DB
+    trabajo.refresh_from_db(fields=["etapa", "progreso"])
+    if ok:
+        _cerrar(trabajo, TrabajoForecast.Estado.COMPLETADO, resultado=valor)
+    else:
+        print(f"Error en el trabajo de forecast {trabajo.id} (taller {trabajo.taller_id}): {valor}")
+        _cerrar(trabajo, TrabajoForecast.Estado.ERROR, error=valor)
+    return trabajo
+
+
+def liberar_trabajos_colgados(minutos: int) -> int:
+    """
+    Marca como ERROR los trabajos EN_CURSO sin latido hace más de `minutos` (el worker murió sin
+    cerrarlos), para que el taller pueda volver a encolar. Un trabajo largo pero vivo no se toca.
+    """
+    limite = timezone.now() - timedelta(minutes=minutos)
+    sin_latido = Q(ultimo_latido__lt=limite) | Q(ultimo_latido__isnull=True, fecha_inicio__lt=limite)
+    return TrabajoForecast.objects.filter(sin_latido, estado=TrabajoForecast.Estado.EN_CURSO).update(
+        estado=TrabajoForecast.Estado.ERROR,
+        error=f"Trabajo sin latido del worker durante {minutos} minutos (worker caído).",
+        fecha_fin=timezone.now(),
+    )
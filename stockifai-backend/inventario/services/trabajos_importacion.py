@@ -0,0 +1,252 @@
+"""
+Cola de importaciones en la DB (TrabajoImportacion), con el mismo esquema que trabajos_forecast.
+
+- La API guarda el archivo y encola (`encolar_trabajo_importacion`); responde enseguida con el id.
+- El comando `procesar_trabajos_importacion` toma los pendientes y los ejecuta (`ejecutar_trabajo`).
+- Cada importación corre en una sola transacción, igual que desde la API: si falla no queda nada
+  cargado y reintentar el archivo no duplica filas. Los movimientos se leen por bloques y el progreso
+  (filas leídas, insertadas, rechazadas) se informa por bloque. Al terminar movimientos o stock
+  se actualizan las alertas.
+- Mientras corre, un hilo actualiza `ultimo_latido` y el progreso con su propia conexión (lo escrito
+  por la del import no se ve hasta el commit); solo se liberan las importaciones cuyo worker dejó
+  de latir (`liberar_trabajos_colgados`).
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from inventario.models import TrabajoImportacion
+from .actualizar_alertas import actualizar_alertas_para_repuestos
+from .import_catalogo import importar_catalogo
+from .import_movimientos import importar_movimientos
+from .import_precios import importar_precios
+from .import_stock import importar_stock
+
+# Contadores del resultado que se copian al progreso al terminar
+CONTADORES = ("filas_leidas", "insertados", "procesados", "creados", "actualizados", "ignorados", "rechazados")
+
+
+def _nombre_worker() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def encolar_trabajo_importacion(tipo: str, archivo, parametros: Optional[dict] = None,
+                                taller_id: Optional[int] = None, usuario=None) -> TrabajoImportacion:
+    """
+    Guarda el archivo subido y encola su importación.
+    """
+    return TrabajoImportacion.objects.create(
+        tipo=tipo,
+        taller_id=taller_id,
+        archivo=archivo,
+        nombre_archivo=getattr(archivo, "name", "")[:255],
+        # JSON: los parámetros vienen del serializer (dicts, strings, ints)
+        parametros=json.loads(json.dumps(parametros or {}, default=str)),
+        solicitado_por=usuario if usuario is not None and getattr(usuario, "pk", None) else None,
+    )
+
+
+def tomar_siguiente_trabajo(worker: Optional[str] = None) -> Optional[TrabajoImportacion]:
+    """
+    Toma la importación pendiente más antigua y la marca EN_CURSO (skip_locked entre workers).
+    """
+    worker = worker or _nombre_worker()
+    with transaction.atomic():
+        trabajo = (
+            TrabajoImportacion.objects.select_for_update(skip_locked=True)
+            .filter(estado=TrabajoImportacion.Estado.PENDIENTE)
+            .order_by("fecha_creacion", "id")
+            .first()
+        )
+        if trabajo is None:
+            return None
+
+        ahora = timezone.now()
+        # Update condicional: en motores sin select_for_update gana un solo worker
+        tomado = TrabajoImportacion.objects.filter(
+            pk=trabajo.pk, estado=TrabajoImportacion.Estado.PENDIENTE
+        ).update(estado=TrabajoImportacion.Estado.EN_CURSO, fecha_inicio=ahora, ultimo_latido=ahora, worker=worker)
+        if not tomado:
+            return None
+
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+@contextmanager
+def latidos(trabajo: TrabajoImportacion, progreso: dict):
+    """
+    Mientras dura el bloque, un hilo actualiza `ultimo_latido` cada IMPORTACION_TRABAJO_LATIDO_SEGUNDOS
+    y guarda `progreso` apenas el import informa avance (con la función que devuelve el bloque).
+    """
+    segundos = getattr(settings, "IMPORTACION_TRABAJO_LATIDO_SEGUNDOS", 60)
+    fin = threading.Event()
+    aviso = threading.Event()
+    cambios = threading.Lock()
+    pendiente = [False]
+
+    def informar(contadores: dict):
+        with cambios:
+            progreso.update(contadores)
+            pendiente[0] = True
+        aviso.set()
+
+    def _latir():
+        try:
+            while True:
+                aviso.wait(segundos)
+                aviso.clear()
+                if fin.is_set():
+                    break
+                campos = {"ultimo_latido": timezone.now()}
+                with cambios:
+                    if pendiente[0]:
+                        campos["progreso"] = dict(progreso)
+                        pendiente[0] = False
+                try:
+                    TrabajoImportacion.objects.filter(
+                        pk=trabajo.pk, estado=TrabajoImportacion.Estado.EN_CURSO, worker=trabajo.worker
+                    ).update(**campos)
+                except Exception as e:
+                    print(f"No se pudo registrar el latido de la importación {trabajo.id}: {e}")
+        finally:
+            # Las conexiones son por hilo: se cierran las de este
+            connections.close_all()
+
+    hilo = threading.Thread(target=_latir, name="latido-importacion", daemon=True)
+    hilo.start()
+    try:
+        yield informar
+    finally:
+        fin.set()
+        aviso.set()
+        hilo.join()
+
+
+def _importar_movimientos(trabajo: TrabajoImportacion, archivo, progreso: Callable[[dict], None]) -> dict:
+    parametros = trabajo.parametros or {}
+    resultado = importar_movimientos(
+        file=archivo,
+        taller_id=trabajo.taller_id,
+        fields_map=parametros.get("fields_map"),
+        deposito_id=parametros.get("deposito_id"),
+        deposito_nombre=parametros.get("deposito_nombre"),
+        permitir_stock_negativo=getattr(settings, "PERMITIR_STOCK_NEGATIVO", True),
+        progreso=progreso,
+    )
+    if resultado.get("repuestos_afectados_ids"):
+        actualizar_alertas_para_repuestos(resultado["repuestos_afectados_ids"])
+    return resultado
+
+
+def _importar_stock(trabajo: TrabajoImportacion, archivo, progreso: Callable[[dict], None]) -> dict:
+    parametros = trabajo.parametros or {}
+    with transaction.atomic():
+        resultado = importar_stock(
+            file=archivo,
+            taller_id=trabajo.taller_id,
+            fields_map=parametros.get("fields_map") or {},
+            mode=parametros.get("mode", "set"),
+        )
+    if resultado.get("repuestos_afectados_ids"):
+        actualizar_alertas_para_repuestos(resultado["repuestos_afectados_ids"])
+    return resultado
+
+
+def _importar_catalogo(trabajo: TrabajoImportacion, archivo, progreso: Callable[[dict], None]) -> dict:
+    parametros = trabajo.parametros or {}
+    with transaction.atomic():
+        return importar_catalogo(
+            file=archivo,
+            fields_map=parametros.get("fields_map"),
+            default_estado=parametros.get("default_estado", "ACTIVO"),
+            mode=parametros.get("mode", "upsert"),
+        )
+
+
+def _importar_precios(trabajo: TrabajoImportacion, archivo, progreso: Callable[[dict], None]) -> dict:
+    parametros = trabajo.parametros or {}
+    return importar_precios(
+        file=archivo,
+        taller_id=trabajo.taller_id,
+        fields_map=parametros.get("fields_map"),
+    )
+
+
+IMPORTADORES = {
+    TrabajoImportacion.Tipo.MOVIMIENTOS: _importar_movimientos,
+    TrabajoImportacion.Tipo.STOCK: _importar_stock,
+    TrabajoImportacion.Tipo.CATALOGO: _importar_catalogo,
+    TrabajoImportacion.Tipo.PRECIOS: _importar_precios,
+}
+
+
+def _cerrar(trabajo: TrabajoImportacion, estado: str, progreso: dict, resultado=None,
+            error: Optional[str] = None) -> bool:
+    """
+    Deja el estado final si la importación sigue EN_CURSO con este worker. Si otro proceso la
+    liberó mientras tanto no se pisa nada. Devuelve si la cerró.
+    """
+    ahora = timezone.now()
+    cerrado = TrabajoImportacion.objects.filter(
+        pk=trabajo.pk, estado=TrabajoImportacion.Estado.EN_CURSO, worker=trabajo.worker
+    ).update(estado=estado, progreso=progreso, resultado=resultado, error=error, fecha_fin=ahora)
+    if not cerrado:
+        print(f"La importación {trabajo.id} ya no estaba en curso con este worker; no se actualiza.")
+        trabajo.refresh_from_db()
+        return False
+
+    trabajo.estado = estado
+    trabajo.progreso = progreso
+    trabajo.resultado = resultado
+    trabajo.error = error
+    trabajo.fecha_fin = ahora
+    return True
+
+
+def ejecutar_trabajo(trabajo: TrabajoImportacion) -> TrabajoImportacion:
+    """
+    Importa el archivo del trabajo (ya tomado) y deja el resultado o el error.
+    Si terminó bien se borra el archivo guardado; si falló queda para revisarlo o reintentar.
+    """
+    progreso = dict(trabajo.progreso or {})
+    try:
+        with latidos(trabajo, progreso) as informar, trabajo.archivo.open("rb") as archivo:
+            resultado = IMPORTADORES[trabajo.tipo](trabajo, archivo, informar)
+    except Exception as e:
+        print(f"Error en la importación {trabajo.id} ({trabajo.tipo}, {trabajo.nombre_archivo}): {e}")
+        _cerrar(trabajo, TrabajoImportacion.Estado.ERROR, progreso, error=str(e))
+        return trabajo
+
+    progreso.update({k: resultado[k] for k in CONTADORES if k in resultado})
+    cerrado = _cerrar(trabajo, TrabajoImportacion.Estado.COMPLETADO, progreso,
+                      resultado=json.loads(json.dumps(resultado, default=str)))
+    if cerrado:
+        trabajo.archivo.delete(save=False)
+        trabajo.save(update_fields=["archivo"])
+    return trabajo
+
+
+def liberar_trabajos_colgados(minutos: int) -> int:
+    """
+    Marca como ERROR las importaciones EN_CURSO sin latido hace más de `minutos` (el worker murió
+    sin cerrarlas). Una importación larga pero viva no se toca.
+    """
+    limite = timezone.now() - timedelta(minutes=minutos)
+    sin_latido = Q(ultimo_latido__lt=limite) | Q(ultimo_latido__isnull=True, fecha_inicio__lt=limite)
+    return TrabajoImportacion.objects.filter(sin_latido, estado=TrabajoImportacion.Estado.EN_CURSO).update(
+        estado=TrabajoImportacion.Estado.ERROR,
+        error=f"Importación sin latido del worker durante {minutos} minutos (worker caído).",
+        fecha_fin=timezone.now(),
+    )
@@ -0,0 +1,57 @@
+"""
+Mantiene DemandaSemanal al día cuando un Movimiento se guarda o se borra de a uno
+(crear_unico, admin, ediciones). Las altas en bulk del import no disparan señales:
+esas registran los EGRESOS con DemandaSemanalRepo.registrar_egresos.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Movimiento, StockPorDeposito
+from .repositories.demanda_semanal_repo import DemandaSemanalRepo
+
+
+def _egreso_guardado(pk):
+    # (repuesto_taller_id, fecha, cantidad) del movimiento como está en la DB, si es un EGRESO
+    fila = (
+        Movimiento.objects.filter(pk=pk)
+        .values_list("stock_por_deposito__repuesto_taller_id", "fecha", "cantidad", "tipo")
+        .first()
+    )
+    if fila is None or fila[3] != "EGRESO":
+        return None
+    return fila[:3]
+
+
+@receiver(pre_save, sender=Movimiento)
+def recordar_egreso_anterior(sender, instance, raw=False, **kwargs):
+    instance._egreso_anterior = None if raw or instance.pk is None else _egreso_guardado(instance.pk)
+
+
+@receiver(post_save, sender=Movimiento)
+def actualizar_demanda_al_guardar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    repo = DemandaSemanalRepo()
+    anterior = getattr(instance, "_egreso_anterior", None)
+    if anterior is not None:
+        repo.quitar_egresos([anterior])
+    if instance.tipo == "EGRESO":
+        rt_id = (
+            StockPorDeposito.objects.filter(pk=instance.stock_por_deposito_id)
+            .values_list("repuesto_taller_id", flat=True)
+            .first()
+        )
+        repo.registrar_egresos([(rt_id, instance.fecha, instance.cantidad)])
+    instance._egreso_anterior = None
+
+
+@receiver(post_delete, sender=Movimiento)
+def actualizar_demanda_al_borrar(sender, instance, **kwargs):
+    if instance.tipo != "EGRESO":
+        return
+    rt_id = (
+        StockPorDeposito.objects.filter(pk=instance.stock_por_deposito_id)
+        .values_list("repuesto_taller_id", flat=True)
+        .first()
+    )
+    DemandaSemanalRepo().quitar_egresos([(rt_id, instance.fecha, instance.cantidad)])
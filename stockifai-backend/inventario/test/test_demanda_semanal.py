@@ -0,0 +1,107 @@
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from catalogo.models import Repuesto, RepuestoTaller
+from inventario.models import Deposito, DemandaSemanal, Movimiento, StockPorDeposito
+from inventario.repositories.demanda_semanal_repo import DemandaSemanalRepo
+from inventario.services._helpers import batch_calculate_demand, get_historical_demand, get_month_ranges
+from user.api.models.models import Taller
+
+
+def _local(fecha: date, hora: int = 0, minuto: int = 0) -> datetime:
+    return timezone.make_aware(datetime.combine(fecha, time(hora, minuto)))
+
+
+class DemandaSemanalTest(TestCase):
+    def setUp(self):
+        taller = Taller.objects.create(nombre="Taller test")
+        deposito = Deposito.objects.create(taller=taller, nombre="Central")
+        self.rts, self.spds = [], []
+        for numero in ("P1", "P2"):
+            rt = RepuestoTaller.objects.create(
+                repuesto=Repuesto.objects.create(numero_pieza=numero, descripcion=numero), taller=taller
+            )
+            self.rts.append(rt)
+            self.spds.append(StockPorDeposito.objects.create(repuesto_taller=rt, deposito=deposito, cantidad=0))
+
+    def _egreso(self, fecha, cantidad, spd=0):
+        return Movimiento.objects.create(
+            stock_por_deposito=self.spds[spd], tipo="EGRESO", cantidad=cantidad, fecha=fecha
+        )
+
+    def _agregado(self):
+        return {
+            (d.repuesto_taller_id, d.semana): (d.cantidad, d.cantidad_negativa)
+            for d in DemandaSemanal.objects.all()
+            if d.cantidad or d.cantidad_negativa
+        }
+
+    def test_senales_mantienen_el_agregado(self):
+        rt1, rt2 = (rt.pk for rt in self.rts)
+        mov = self._egreso(_local(date(2024, 3, 6), 10), 5)
+        self._egreso(_local(date(2024, 3, 7), 10), -2)
+        self.assertEqual(self._agregado(), {(rt1, date(2024, 3, 4)): (5, -2)})
+
+        mov.fecha = _local(date(2024, 3, 13), 10)
+        mov.save()
+        self.assertEqual(self._agregado(), {(rt1, date(2024, 3, 4)): (0, -2), (rt1, date(2024, 3, 11)): (5, 0)})
+
+        mov.cantidad = 8
+        mov.save()
+        self.assertEqual(self._agregado()[(rt1, date(2024, 3, 11))], (8, 0))
+
+        mov.stock_por_deposito = self.spds[1]
+        mov.save()
+        self.assertEqual(self._agregado(), {(rt1, date(2024, 3, 4)): (0, -2), (rt2, date(2024, 3, 11)): (8, 0)})
+
+        mov.delete()
+        self.assertEqual(self._agregado(), {(rt1, date(2024, 3, 4)): (0, -2)})
+
+        # Lo mantenido por las señales coincide con reconstruirlo desde Movimiento
+        antes = self._agregado()
+        DemandaSemanalRepo().reconstruir()
+        self.assertEqual(self._agregado(), antes)
+
+    def test_demanda_entre_corrige_los_bordes(self):
+        # Domingo 22:00 local ya es lunes en UTC; negativos incluidos, como sumando Movimiento
+        fechas = [
+            (_local(date(2024, 3, 3), 22), 4), (_local(date(2024, 3, 4), 1), 3), (_local(date(2024, 3, 6), 12), 7),
+            (_local(date(2024, 3, 10), 23, 30), 2), (_local(date(2024, 3, 12), 9), -1), (_local(date(2024, 3, 20), 9), 6),
+        ]
+        for fecha, cantidad in fechas:
+            self._egreso(fecha, cantidad)
+
+        rt_id = self.rts[0].pk
+        rangos = [
+            (_local(date(2024, 3, 1)), _local(date(2024, 4, 1))),
+            (_local(date(2024, 3, 4)), _local(date(2024, 3, 11))),
+            (_local(date(2024, 3, 5)), _local(date(2024, 3, 21))),
+            (_local(date(2024, 3, 6), 12), _local(date(2024, 3, 6), 13)),
+        ]
+        for desde, hasta in rangos:
+            esperado = Movimiento.objects.filter(
+                tipo="EGRESO", fecha__gte=desde, fecha__lt=hasta
+            ).aggregate(total=Sum("cantidad"))["total"] or 0
+            self.assertEqual(DemandaSemanalRepo().demanda_entre([rt_id], desde, hasta).get(rt_id, 0), esperado)
+
+    def test_dashboard_igual_que_sumando_movimientos(self):
+        hoy = date.today()
+        lunes = hoy - timedelta(days=hoy.weekday())
+        for semanas in range(1, 8):
+            inicio = lunes - timedelta(weeks=semanas)
+            self._egreso(_local(inicio, 0, 30), semanas)
+            self._egreso(_local(inicio - timedelta(days=1), 22), 10)  # domingo local, lunes UTC
+            self._egreso(_local(inicio + timedelta(days=2), 15), -1)
+            self._egreso(_local(inicio + timedelta(days=3), 12), 2, spd=1)
+        self._egreso(_local(hoy.replace(day=1), 23), 9)
+
+        rt_ids = [rt.pk for rt in self.rts]
+        rangos = get_month_ranges()
+        agregado = (get_historical_demand(rt_ids[0], 6), batch_calculate_demand(rt_ids, rangos))
+        with override_settings(FORECAST_DEMANDA_SEMANAL_AGREGADA=False):
+            por_movimientos = (get_historical_demand(rt_ids[0], 6), batch_calculate_demand(rt_ids, rangos))
+
+        self.assertEqual(agregado, por_movimientos)
@@ -0,0 +1,94 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pandas as pd
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from catalogo.models import Repuesto
+from inventario.models import Deposito, DemandaSemanal, Movimiento, StockPorDeposito
+from inventario.repositories.base import NotFoundError
+from inventario.services.import_movimientos import _preprocess_data, importar_movimientos
+from user.api.models.models import Taller
+
+
+def _planilla_mixta() -> pd.DataFrame:
+    """
+    Planilla como la arman read_df/iterar_df de un Excel con tipos mezclados: fechas en texto y como
+    celdas de fecha, celdas vacías, tipos y cantidades inválidos (también decimales en texto) y depósitos
+    vacíos (toman el por defecto).
+    """
+    return pd.DataFrame({
+        "numero_pieza": [" P1 ", "P2", "P3", "P4", "P5", "P6", "P7", "P8", "P9", "P10", "P11", "P12"],
+        "fecha": [
+            "2024-03-01", datetime(2024, 3, 5, 10, 30), "05/03/2024", "fecha mala", float("nan"),
+            "2024-03-08 14:00:00", datetime(2024, 3, 9), "31/02/2024", "2024-03-10", "10/03/2024 08:15:00",
+            "2024-03-11", "2024-03-12",
+        ],
+        "tipo": ["ingreso", "E", " salida ", "EGRESO", "I", "TRASPASO", "AJUSTE+", "I", "ajuste-", "E", "E", "I"],
+        "cantidad": [10, "3", 2.7, 4, 5, 6, "abc", 1, float("nan"), 8, "2.7", " 7 "],
+        "deposito": ["Central", None, "Norte", "Central", None, "Central", "Sur", None, "Central", "", "Central", "Central"],
+        "externo_id": ["A1", "A2", "A3", "A4", "A5", "A6", "A7", "A8", "A9", " A10 ", "A11", "A12"],
+        "documento": ["F-1", None, "F-3", "", "F-5", "F-6", None, "F-8", "F-9", "F-10", None, None],
+    }, dtype=object)
+
+
+class PreprocesoMovimientosTest(SimpleTestCase):
+    def test_vectorizado_igual_a_por_fila(self):
+        df = _planilla_mixta()
+        deposito_default = SimpleNamespace(nombre="Central")
+
+        vectorizado = _preprocess_data(df, deposito_default)
+        por_fila = _preprocess_data(df, deposito_default, vectorizado=False)
+
+        self.assertEqual(vectorizado["rows"], por_fila["rows"])
+        self.assertEqual([e["fila"] for e in vectorizado["errores"]], [e["fila"] for e in por_fila["errores"]])
+        # Fecha mala, sin fecha, tipo inválido, cantidad no numérica, 31/02, cantidad vacía
+        # y "2.7" como texto (int() no lo acepta, aunque 2.7 como número se trunca)
+        self.assertEqual([e["fila"] for e in vectorizado["errores"]], [5, 6, 7, 8, 9, 10, 12])
+
+
+class ImportarMovimientosTest(TestCase):
+    def setUp(self):
+        self.taller = Taller.objects.create(nombre="Taller test")
+        Repuesto.objects.create(numero_pieza="P1", descripcion="Filtro")
+        Deposito.objects.create(taller=self.taller, nombre="Central")
+
+    def _importar(self, filas):
+        contenido = "numero_pieza,fecha,tipo,cantidad,deposito,externo_id\n" + "\n".join(filas)
+        archivo = SimpleUploadedFile("movimientos.csv", contenido.encode("utf-8"))
+        return importar_movimientos(file=archivo, taller_id=self.taller.id)
+
+    def test_externo_id_repetido_se_ignora(self):
+        # A2 está dos veces en el mismo archivo: la segunda se ignora
+        r = self._importar([
+            "P1,2024-03-01,INGRESO,10,Central,A1",
+            "P1,2024-03-02,EGRESO,3,Central,A2",
+            "P1,2024-03-02,EGRESO,3,Central,A2",
+        ])
+        self.assertEqual((r["insertados"], r["ignorados"], r["rechazados"]), (2, 1, 0))
+
+        # A1 ya estaba cargado: se ignora y solo entra A3
+        r = self._importar([
+            "P1,2024-03-01,INGRESO,10,Central,A1",
+            "P1,2024-03-04,INGRESO,5,Central,A3",
+        ])
+        self.assertEqual((r["insertados"], r["ignorados"], r["rechazados"]), (1, 1, 0))
+
+        self.assertEqual(Movimiento.objects.count(), 3)
+        # El stock solo cuenta los movimientos insertados: 10 - 3 + 5
+        self.assertEqual(StockPorDeposito.objects.get().cantidad, 12)
+
+    @override_settings(IMPORTACION_STREAMING=True, IMPORTACION_FILAS_POR_BLOQUE=2)
+    def test_bloque_con_repuesto_inexistente_no_deja_nada(self):
+        # El primer bloque es válido; el segundo referencia un repuesto que no existe
+        with self.assertRaises(NotFoundError):
+            self._importar([
+                "P1,2024-03-01,INGRESO,10,Central,",
+                "P1,2024-03-02,EGRESO,3,Central,",
+                "P2,2024-03-04,INGRESO,5,Central,",
+            ])
+
+        self.assertFalse(Movimiento.objects.exists())
+        self.assertFalse(DemandaSemanal.objects.exists())
+        self.assertFalse(StockPorDeposito.objects.filter(cantidad__gt=0).exists())
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from catalogo.models import Repuesto, RepuestoTaller
+from inventario.models import Deposito, Movimiento, StockPorDeposito
+from inventario.repositories.movimiento_repo import MovimientoRepo
+from user.api.models.models import Taller
+
+
+def _fecha(dia: int) -> datetime:
+    return timezone.make_aware(datetime(2024, 3, dia, 10))
+
+
+class IterarEgresosTest(TestCase):
+    def setUp(self):
+        self.taller, otro_taller = (Taller.objects.create(nombre=n) for n in ("Taller test", "Otro taller"))
+        spds = []
+        for taller in (self.taller, otro_taller):
+            deposito = Deposito.objects.create(taller=taller, nombre="Central")
+            for numero in ("P1", "P2"):
+                repuesto, _ = Repuesto.objects.get_or_create(numero_pieza=numero, defaults={"descripcion": numero})
+                rt = RepuestoTaller.objects.create(repuesto=repuesto, taller=taller)
+                spds.append(StockPorDeposito.objects.create(repuesto_taller=rt, deposito=deposito, cantidad=0))
+
+        # 7 EGRESOS del taller en rango, intercalados con movimientos que no tienen que aparecer
+        for dia in range(1, 8):
+            Movimiento.objects.create(stock_por_deposito=spds[dia % 2], tipo="EGRESO", cantidad=dia, fecha=_fecha(dia))
+            Movimiento.objects.create(stock_por_deposito=spds[0], tipo="INGRESO", cantidad=50, fecha=_fecha(dia))
+            Movimiento.objects.create(stock_por_deposito=spds[2], tipo="EGRESO", cantidad=60, fecha=_fecha(dia))
+        Movimiento.objects.create(stock_por_deposito=spds[0], tipo="EGRESO", cantidad=70, fecha=_fecha(20))
+
+        self.esperado = [("P2" if dia % 2 else "P1", _fecha(dia), dia) for dia in range(1, 8)]
+
+    def _iterar(self, chunk_size: int) -> list:
+        return list(MovimientoRepo().iterar_egresos(self.taller.id, _fecha(1), _fecha(15), chunk_size=chunk_size))
+
+    def test_pagina_por_id_entre_lotes(self):
+        # Con lotes de 1 y 7 las filas terminan justo en un borde (se pide una página vacía);
+        # con 3 el último lote queda incompleto y con 100 entra todo en uno
+        for chunk_size in (1, 3, 7, 100):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(self._iterar(chunk_size), self.esperado)
@@ -0,0 +1,35 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from catalogo.models import Repuesto, RepuestoTaller
+from inventario.repositories.repuesto_taller_repo import RepuestoTallerRepo
+from user.api.models.models import Taller
+
+
+class UpsertPrediccionesTest(TestCase):
+    def setUp(self):
+        self.taller, self.otro_taller = (Taller.objects.create(nombre=n) for n in ("Taller test", "Otro taller"))
+        self.repuestos = [Repuesto.objects.create(numero_pieza=f"P{i}", descripcion=f"P{i}") for i in range(5)]
+        # P1 y P3 ya están en el taller; P0 solo en el otro taller
+        for i in (1, 3):
+            RepuestoTaller.objects.create(repuesto=self.repuestos[i], taller=self.taller, precio=Decimal("5"), pred_1=99)
+        RepuestoTaller.objects.create(repuesto=self.repuestos[0], taller=self.otro_taller, pred_1=7)
+
+    def test_actualiza_y_crea_en_varios_lotes(self):
+        predicciones = {
+            repuesto.id: {"pred_1": i, "pred_2": i + 1, "pred_3": i + 2, "pred_4": i + 3}
+            for i, repuesto in enumerate(self.repuestos)
+        }
+
+        resultado = RepuestoTallerRepo().upsert_predicciones(self.taller.id, predicciones, batch_size=2)
+
+        self.assertEqual(resultado, {"guardados": 5, "actualizados": 2, "creados": 3})
+        guardadas = {
+            rt.repuesto_id: {"pred_1": rt.pred_1, "pred_2": rt.pred_2, "pred_3": rt.pred_3, "pred_4": rt.pred_4}
+            for rt in RepuestoTaller.objects.filter(taller=self.taller)
+        }
+        self.assertEqual(guardadas, predicciones)
+        # Solo se tocan las predicciones del taller
+        self.assertEqual(RepuestoTaller.objects.get(repuesto=self.repuestos[1], taller=self.taller).precio, Decimal("5"))
+        self.assertEqual(RepuestoTaller.objects.get(taller=self.otro_taller).pred_1, 7)
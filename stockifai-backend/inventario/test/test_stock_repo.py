@@ -0,0 +1,48 @@
+from collections import defaultdict
+from unittest import mock
+
+from django.test import TestCase
+
+from catalogo.models import Repuesto, RepuestoTaller
+from inventario.models import Deposito, StockPorDeposito
+from inventario.repositories import stock_repo as stock_repo_module
+from inventario.repositories.stock_repo import StockRepo
+from user.api.models.models import Taller
+
+# (fila del spd, delta) como llegan del archivo: mezcla de signos y spd repetidos
+FILAS = [(0, 5), (1, -3), (0, -2), (2, 7), (1, 4), (3, -1), (0, 10), (4, 0), (2, -7), (3, -6)]
+
+
+class AplicarDeltasTest(TestCase):
+    def setUp(self):
+        # Mismos repuestos en dos depósitos: uno se actualiza fila por fila y el otro en lote
+        taller = Taller.objects.create(nombre="Taller test")
+        por_fila, en_lote = (Deposito.objects.create(taller=taller, nombre=n) for n in ("Por fila", "En lote"))
+        self.por_fila, self.en_lote = [], []
+        for i in range(5):
+            rt = RepuestoTaller.objects.create(
+                repuesto=Repuesto.objects.create(numero_pieza=f"P{i}", descripcion=f"P{i}"), taller=taller
+            )
+            self.por_fila.append(StockPorDeposito.objects.create(repuesto_taller=rt, deposito=por_fila, cantidad=3))
+            self.en_lote.append(StockPorDeposito.objects.create(repuesto_taller=rt, deposito=en_lote, cantidad=3))
+
+    def _comparar(self):
+        repo = StockRepo()
+        deltas = defaultdict(int)
+        for fila, delta in FILAS:
+            repo.agregar(self.por_fila[fila], delta)
+            deltas[self.en_lote[fila].pk] += delta
+
+        repo.aplicar_deltas(deltas)
+
+        esperado = [spd.cantidad for spd in StockPorDeposito.objects.filter(pk__in=[s.pk for s in self.por_fila]).order_by("pk")]
+        obtenido = [spd.cantidad for spd in StockPorDeposito.objects.filter(pk__in=[s.pk for s in self.en_lote]).order_by("pk")]
+        self.assertEqual(obtenido, esperado)
+        self.assertEqual(esperado, [16, 4, 3, -4, 3])
+
+    def test_igual_que_por_fila(self):
+        self._comparar()
+
+    def test_igual_que_por_fila_en_varios_lotes(self):
+        with mock.patch.object(stock_repo_module, "CHUNK_SIZE", 2):
+            self._comparar()
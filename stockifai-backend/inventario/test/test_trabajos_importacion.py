@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.utils import timezone
+
+from catalogo.models import Repuesto
+from inventario.models import Deposito, Movimiento, TrabajoImportacion
+from inventario.services.trabajos_importacion import (
+    _cerrar,
+    ejecutar_trabajo,
+    encolar_trabajo_importacion,
+    liberar_trabajos_colgados,
+    tomar_siguiente_trabajo,
+)
+from user.api.models.models import Taller
+
+
+class TrabajosImportacionTest(TestCase):
+    def setUp(self):
+        self.taller = Taller.objects.create(nombre="Taller test")
+        Repuesto.objects.create(numero_pieza="P1", descripcion="Filtro")
+        Deposito.objects.create(taller=self.taller, nombre="Central")
+
+    def _encolar(self, filas):
+        contenido = "numero_pieza,fecha,tipo,cantidad,deposito,externo_id\n" + "\n".join(filas)
+        archivo = SimpleUploadedFile("movimientos.csv", contenido.encode("utf-8"))
+        encolar_trabajo_importacion(TrabajoImportacion.Tipo.MOVIMIENTOS, archivo, taller_id=self.taller.id)
+        return tomar_siguiente_trabajo(worker="test:1")
+
+    def test_reintento_despues_de_un_error_no_duplica(self):
+        # P2 no existe: la importación falla entera y no deja movimientos
+        trabajo = ejecutar_trabajo(self._encolar([
+            "P1,2024-03-01,INGRESO,10,Central,",
+            "P2,2024-03-02,INGRESO,5,Central,",
+        ]))
+        self.assertEqual(trabajo.estado, TrabajoImportacion.Estado.ERROR)
+        self.assertFalse(Movimiento.objects.exists())
+
+        trabajo = ejecutar_trabajo(self._encolar(["P1,2024-03-01,INGRESO,10,Central,"]))
+        self.assertEqual(trabajo.estado, TrabajoImportacion.Estado.COMPLETADO)
+        self.assertEqual(trabajo.progreso["insertados"], 1)
+        self.assertEqual(Movimiento.objects.count(), 1)
+
+    def test_no_cierra_un_trabajo_liberado(self):
+        trabajo = self._encolar(["P1,2024-03-01,INGRESO,10,Central,"])
+        TrabajoImportacion.objects.filter(pk=trabajo.pk).update(estado=TrabajoImportacion.Estado.ERROR)
+
+        self.assertFalse(_cerrar(trabajo, TrabajoImportacion.Estado.COMPLETADO, {}))
+        self.assertEqual(trabajo.estado, TrabajoImportacion.Estado.ERROR)
+
+    def test_libera_solo_sin_latido(self):
+        vivo = self._encolar(["P1,2024-03-01,INGRESO,10,Central,"])
+        caido = self._encolar(["P1,2024-03-02,INGRESO,10,Central,"])
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        # Los dos empezaron hace una hora, pero solo el primero sigue latiendo
+        TrabajoImportacion.objects.filter(pk=vivo.pk).update(fecha_inicio=hace_una_hora)
+        TrabajoImportacion.objects.filter(pk=caido.pk).update(fecha_inicio=hace_una_hora, ultimo_latido=hace_una_hora)
+
+        self.assertEqual(liberar_trabajos_colgados(10), 1)
+        vivo.refresh_from_db()
+        caido.refresh_from_db()
+        self.assertEqual(vivo.estado, TrabajoImportacion.Estado.EN_CURSO)
+        self.assertEqual(caido.estado, TrabajoImportacion.Estado.ERROR)
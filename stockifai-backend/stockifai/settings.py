@@ -169,8 +169,22 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
 ]
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Archivos subidos (importaciones encoladas hasta que las procesa el worker)
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(BASE_DIR, 'media'))
 ALLOW_AUTO_CREATE_REPUESTO=os.getenv("ALLOW_AUTO_CREATE_REPUESTO","False").lower() in ("1","true","yes","y")
 PERMITIR_STOCK_NEGATIVO=os.getenv("PERMITIR_STOCK_NEGATIVO","False").lower() in ("1","true","yes","y")
+# Leer los movimientos por bloques (CSV en chunks, Excel con openpyxl read_only) en lugar de todo el archivo;
+# la importación se confirma igual en una sola transacción
+IMPORTACION_STREAMING=os.getenv("IMPORTACION_STREAMING","True").lower() in ("1","true","yes","y")
+IMPORTACION_FILAS_POR_BLOQUE=int(os.getenv("IMPORTACION_FILAS_POR_BLOQUE","20000"))
+# La API guarda el archivo y encola la importación (TrabajoImportacion); la ejecuta procesar_trabajos_importacion
+IMPORTACION_TRABAJOS_ASINCRONOS=os.getenv("IMPORTACION_TRABAJOS_ASINCRONOS","True").lower() in ("1","true","yes","y")
+# Workers de importación a la vez (el cron arranca uno por minuto)
+IMPORTACION_MAX_WORKERS=int(os.getenv("IMPORTACION_MAX_WORKERS","1"))
+# Cada cuántos segundos una importación EN_CURSO registra que su worker sigue vivo (ultimo_latido)
+IMPORTACION_TRABAJO_LATIDO_SEGUNDOS=int(os.getenv("IMPORTACION_TRABAJO_LATIDO_SEGUNDOS","60"))
+# Minutos sin latido tras los cuales una importación EN_CURSO se considera colgada (worker caído)
+IMPORTACION_TRABAJO_MAX_MINUTOS=int(os.getenv("IMPORTACION_TRABAJO_MAX_MINUTOS","10"))
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:4200",
     "http://127.0.0.1:4200",
@@ -303,10 +317,58 @@ AUTH0_MGMT_GRANT_TYPE = env("AUTH0_MGMT_GRANT_TYPE")
 #####
 
 
+# Forecast semanal: procesos en paralelo para forecast_all (1 = secuencial)
+# y segundos máximos por taller (vacío = sin límite). Con FORECAST_MODELO_GLOBAL solo aplican al preproceso
+FORECAST_MAX_WORKERS = _optional_int(os.getenv("FORECAST_MAX_WORKERS")) or 1
+FORECAST_TIMEOUT_POR_TALLER = _optional_int(os.getenv("FORECAST_TIMEOUT_POR_TALLER"))
+# Cantidad de modelos LightGBM que cada proceso mantiene deserializados en memoria (LRU)
+FORECAST_MAX_MODELOS_EN_MEMORIA = _optional_int(os.getenv("FORECAST_MAX_MODELOS_EN_MEMORIA")) or 16
+# Preproceso incremental: reutiliza la demanda semanal y las características ya calculadas
+FORECAST_PREPROCESO_INCREMENTAL = _env_bool(os.getenv("FORECAST_PREPROCESO_INCREMENTAL"), True)
+# Formato de los splits preproceso -> entrenamiento: "npy" (matrices con memmap) o "csv"
+FORECAST_FORMATO_ARTEFACTOS = os.getenv("FORECAST_FORMATO_ARTEFACTOS", "npy")
+# Pipeline en memoria: preproceso -> entrenamiento -> inferencia sin releer de disco/DB
+FORECAST_PIPELINE_EN_MEMORIA = _env_bool(os.getenv("FORECAST_PIPELINE_EN_MEMORIA"), True)
+# Validación rolling del entrenamiento: "rapida" (warm start), "completa" (un modelo por semana) o "ninguna"
+FORECAST_VALIDACION = os.getenv("FORECAST_VALIDACION", "rapida")
+# Motor de entrenamiento: "dataset" (un lgb.Dataset float32 reutilizado) o "sklearn" (LGBMRegressor)
+FORECAST_MOTOR_ENTRENAMIENTO = os.getenv("FORECAST_MOTOR_ENTRENAMIENTO", "dataset")
+# Historia de la inferencia como un blob float32 por taller y segmento (HistorialCompacto)
+# en lugar de una fila ancha por SKU en RegistroEntrenamiento_*
+FORECAST_HISTORIAL_COMPACTO = _env_bool(os.getenv("FORECAST_HISTORIAL_COMPACTO"), True)
+# Datos externos (inflación, IPSA, etc.) calculados una vez y cacheados en el proceso y en models/_cache
+FORECAST_CACHE_EXTERNOS = _env_bool(os.getenv("FORECAST_CACHE_EXTERNOS"), True)
+# Leer los EGRESOS de a lotes (paginados por id) y agregarlos por semana a medida que llegan
+FORECAST_EXTRACCION_STREAMING = _env_bool(os.getenv("FORECAST_EXTRACCION_STREAMING"), True)
+# Omitir la corrida (o hacer solo inferencia) si el taller no tuvo egresos ni datos externos nuevos
+FORECAST_DETECTAR_CAMBIOS = _env_bool(os.getenv("FORECAST_DETECTAR_CAMBIOS"), True)
+# Reentrenar un modelo cuando tiene esta cantidad de semanas (0 = reentrenar en cada corrida)
+FORECAST_SEMANAS_REENTRENAMIENTO = int(os.getenv("FORECAST_SEMANAS_REENTRENAMIENTO", "4"))
+# Reentrenar antes si el MAE en test empeora más que esta fracción respecto del MAE al entrenar
+FORECAST_DEGRADACION_MAX = float(os.getenv("FORECAST_DEGRADACION_MAX", "0.2"))
+# Un modelo por segmento entrenado con los datos de todos los talleres (models/global) en lugar de uno por taller
+FORECAST_MODELO_GLOBAL = _env_bool(os.getenv("FORECAST_MODELO_GLOBAL"), False)
+# Leer la demanda semanal de la tabla agregada (DemandaSemanal) en lugar de sumar los movimientos
+FORECAST_DEMANDA_SEMANAL_AGREGADA = _env_bool(os.getenv("FORECAST_DEMANDA_SEMANAL_AGREGADA"), True)
+# La API encola el forecast (TrabajoForecast) y lo ejecuta el comando procesar_trabajos_forecast
+FORECAST_TRABAJOS_ASINCRONOS = _env_bool(os.getenv("FORECAST_TRABAJOS_ASINCRONOS"), True)
+# Cada cuántos segundos un trabajo EN_CURSO registra que su worker sigue vivo (ultimo_latido)
+FORECAST_TRABAJO_LATIDO_SEGUNDOS = _optional_int(os.getenv("FORECAST_TRABAJO_LATIDO_SEGUNDOS")) or 60
+# Minutos sin latido tras los cuales un trabajo EN_CURSO se considera colgado (worker caído)
+FORECAST_TRABAJO_MAX_MINUTOS = _optional_int(os.getenv("FORECAST_TRABAJO_MAX_MINUTOS")) or 10
+
 CRONJOBS = [
     # Domingo 23:00 → corre el management command 'forecast_all'
     ('0 23 * * 0', 'django.core.management.call_command', ['forecast_all']),
 
+    # Cada minuto → procesa los trabajos de forecast encolados desde la API
+    # (sale enseguida si ya corren FORECAST_MAX_WORKERS workers)
+    ('* * * * *', 'django.core.management.call_command', ['procesar_trabajos_forecast', '--una-vez']),
+
+    # Cada minuto → procesa las importaciones encoladas desde la API
+    # (sale enseguida si ya corren IMPORTACION_MAX_WORKERS workers)
+    ('* * * * *', 'django.core.management.call_command', ['procesar_trabajos_importacion', '--una-vez']),
+
     # TEST CADA 5 MIN PARA PROBAR
     #('*/5 * * * *', 'django.core.management.call_command', ['forecast_all']),
 ]
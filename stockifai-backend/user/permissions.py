@@ -154,6 +154,16 @@ class PermissionChecker:
 
         return False
 
+    @staticmethod
+    def puede_ver_importacion_catalogo(user, trabajo):
+        """¿Puede VER una importación sin taller (catálogo)?"""
+        # Admin del sistema
+        if user.is_staff or user.is_superuser:
+            return True
+
+        # Quien la pidió
+        return trabajo.solicitado_por_id is not None and trabajo.solicitado_por_id == user.id
+
     @staticmethod
     def filter_repuestos_taller_queryset(queryset, user):
         """Filtra RepuestoTaller según permisos"""